@@ -9,12 +9,13 @@ from database import get_db
 from models.ai_algorithm import AIService, ServiceStatus
 from models.camera import Camera
 from rabbitmq_event_task_manager import rabbitmq_event_task_manager as event_task_manager
+from ai_service_runtime import ai_service_runtime
 import aiohttp
 
 logger = logging.getLogger(__name__)
 
 class AIServiceMonitor:
-    """AI服务监控器 - 负责管理AI服务的生命周期和任务分发"""
+    """AI服务监控器 - 负责管理AI服务的生命周期，并驱动 ai_service_runtime 中的取帧推理流水线"""
     
     def __init__(self):
         self.running = False
@@ -35,6 +36,7 @@ class AIServiceMonitor:
     async def stop(self):
         """停止AI服务监控器"""
         self.running = False
+        await ai_service_runtime.stop()
         logger.info("AI服务监控器停止")
         
     async def _monitor_services(self):
@@ -85,6 +87,9 @@ class AIServiceMonitor:
             await db.commit()
             logger.debug(f"检查了 {len(services)} 个运行中的AI服务")
             
+            # 对齐运行时中的取帧推理流水线
+            await ai_service_runtime.sync(await ai_service_runtime.load_specs(db))
+            
         except Exception as e:
             logger.error(f"检查服务状态异常: {str(e)}")
             
@@ -129,13 +134,8 @@ class AIServiceMonitor:
                      'error_count': 0
                  }
                  
-                 # 使用事件任务管理器创建事件任务
-                 task_id = await event_task_manager.create_task_from_service(service_id, user_id)
-                 if task_id:
-                     # 不立即启动事件任务，让Worker来认领PENDING状态的任务
-                     logger.info(f"AI服务 {service_id} 启动成功，创建事件任务 {task_id}，等待Worker认领")
-                 else:
-                     logger.warning(f"AI服务 {service_id} 启动成功，但创建事件任务失败")
+                 # 立即启动该服务的取帧推理流水线，检测结果直接生成事件
+                 await ai_service_runtime.sync(await ai_service_runtime.load_specs(db))
                  
                  logger.info(f"AI服务 {service_id} 启动成功")
                  return True
@@ -160,6 +160,8 @@ class AIServiceMonitor:
                     service.last_heartbeat = datetime.now(timezone.utc)
                     await db.commit()
                 
+                await ai_service_runtime.stop_service(service_id)
+                
                 # 停止相关的事件任务
                 from models.event_task import EventTask, EventTaskStatus
                 task_result = await db.execute(
@@ -201,7 +203,8 @@ class AIServiceMonitor:
                     'total_services': total_count,
                     'running_services': running_count,
                     'active_services': len(self.active_services),
-                    'monitor_status': 'running' if self.running else 'stopped'
+                    'monitor_status': 'running' if self.running else 'stopped',
+                    'runtime': ai_service_runtime.get_stats()
                 }
                 
         except Exception as e:
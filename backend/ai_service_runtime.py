@@ -0,0 +1,528 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from sqlalchemy import func, select, update
+
+from config import settings
+from database import AsyncSessionLocal, minio_client
+from event_task_executor import EventTaskExecutor
+from models.ai_algorithm import AIAlgorithm, AIService, AlgorithmType, ServiceStatus
+from models.camera import Camera, CameraStatus
+from models.event import Event, EventLevel, EventType
+from utils.cache import stats_cache
+from utils.camera_events import camera_status_broadcaster
+from utils.event_rollup import apply_event_change, get_event_bucket
+from utils.event_suppression import SuppressionPolicy, event_suppressor, owns_camera
+from utils.roi import DETECTION_KEYS, roi_engine
+
+logger = logging.getLogger(__name__)
+
+# 算法类型 -> 生成的事件类型
+EVENT_TYPE_BY_ALGORITHM = {
+    AlgorithmType.INTRUSION_DETECTION: EventType.INTRUSION,
+    AlgorithmType.FIRE_DETECTION: EventType.FIRE,
+    AlgorithmType.SMOKE_DETECTION: EventType.SMOKE,
+    AlgorithmType.CROWD_ANALYSIS: EventType.CROWD,
+    AlgorithmType.VEHICLE_DETECTION: EventType.VEHICLE,
+    AlgorithmType.FACE_RECOGNITION: EventType.FACE,
+    AlgorithmType.ABNORMAL_BEHAVIOR: EventType.ABNORMAL_BEHAVIOR,
+    AlgorithmType.BEHAVIOR_ANALYSIS: EventType.ABNORMAL_BEHAVIOR,
+}
+
+class FrameSubscription:
+    """单个AI服务的取帧通道
+
+    解码线程按服务配置的fps投递帧，通道只保留最新一帧: 推理跟不上时旧帧被丢弃，
+    解码线程永远不会因下游变慢而阻塞。
+    """
+
+    def __init__(self, service_id: int, fps: float, loop: asyncio.AbstractEventLoop):
+        self.service_id = service_id
+        self.interval = 1.0 / fps
+        self.next_at = 0.0
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, frame: np.ndarray, captured_at: float):
+        """解码线程调用，切换到事件循环线程入队"""
+        self.loop.call_soon_threadsafe(self._put, (frame, captured_at))
+
+    def _put(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+        self.delivered += 1
+
+
+class FrameSource:
+    """单个摄像头的解码线程，同一摄像头上的多个AI服务共享
+
+    每帧只 grab()（不做色彩转换和拷贝），有订阅者到期时才 retrieve() 得到BGR图像，
+    因此像素转换和内存拷贝的开销只与配置的fps相关，而与码流帧率无关。
+    """
+
+    def __init__(self, camera_id: int, stream_url: str):
+        self.camera_id = camera_id
+        self.stream_url = stream_url
+        self.subscriptions: Dict[int, FrameSubscription] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = False
+        self.frame_size: Optional[Tuple[int, int]] = None
+        self.stats = {'grabbed': 0, 'decoded': 0, 'reconnects': 0}
+
+    def subscribe(self, subscription: FrameSubscription):
+        with self._lock:
+            self.subscriptions[subscription.service_id] = subscription
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"frame-source-{self.camera_id}", daemon=True
+            )
+            self._thread.start()
+
+    def unsubscribe(self, service_id: int) -> bool:
+        """移除订阅，返回是否已无订阅者"""
+        with self._lock:
+            self.subscriptions.pop(service_id, None)
+            return not self.subscriptions
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        delay = 1.0
+        while not self._stop_event.is_set():
+            cap = cv2.VideoCapture(self.stream_url)
+            if not cap.isOpened():
+                cap.release()
+                self.connected = False
+                logger.warning(f"摄像头 {self.camera_id} 视频流打开失败，{delay:.0f}秒后重试")
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, settings.AI_SERVICE_RECONNECT_MAX_DELAY)
+                self.stats['reconnects'] += 1
+                continue
+
+            self.connected = True
+            delay = 1.0
+            try:
+                self._read_loop(cap)
+            except Exception as e:
+                logger.error(f"摄像头 {self.camera_id} 解码异常: {e}")
+            finally:
+                cap.release()
+                self.connected = False
+            if not self._stop_event.is_set():
+                self.stats['reconnects'] += 1
+                self._stop_event.wait(delay)
+        logger.info(f"摄像头 {self.camera_id} 解码线程已退出")
+
+    def _read_loop(self, cap):
+        while not self._stop_event.is_set():
+            if not cap.grab():
+                logger.warning(f"摄像头 {self.camera_id} 读取帧失败，准备重连")
+                return
+            self.stats['grabbed'] += 1
+
+            now = time.monotonic()
+            with self._lock:
+                due = [sub for sub in self.subscriptions.values() if now >= sub.next_at]
+            if not due:
+                continue
+
+            ok, frame = cap.retrieve()
+            if not ok or frame is None:
+                continue
+            self.stats['decoded'] += 1
+            self.frame_size = (frame.shape[1], frame.shape[0])
+            captured_at = time.time()
+            for index, sub in enumerate(due):
+                # 按固定节拍推进，避免因偶发延迟导致帧率漂移
+                sub.next_at = max(sub.next_at + sub.interval, now)
+                # 多个服务同时取帧时各自持有一份，避免算法原地修改互相影响
+                sub.offer(frame if index == 0 else frame.copy(), captured_at)
+
+
+@dataclass
+class ServiceSpec:
+    """运行一个AI服务所需的配置快照（变化时重启该服务的流水线）"""
+    service_id: int
+    name: str
+    camera_id: int
+    camera_name: str
+    camera_location: Optional[str]
+    stream_url: str
+    algorithm_id: int
+    algorithm_name: str
+    algorithm_code: str
+    algorithm_version: str
+    algorithm_type: Optional[AlgorithmType]
+    config: Dict[str, Any] = field(default_factory=dict)
+    roi_areas: List[Dict[str, Any]] = field(default_factory=list)
+    fps: float = 2.0
+    alarm_threshold: float = 0.8
+    alarm_config: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, service: AIService, camera: Camera, algorithm: AIAlgorithm) -> "ServiceSpec":
+        schedule = service.schedule_config or {}
+        fps = float(schedule.get('fps') or settings.AI_SERVICE_DEFAULT_FPS)
+        return cls(
+            service_id=service.id,
+            name=service.name,
+            camera_id=camera.id,
+            camera_name=camera.name,
+            camera_location=camera.location,
+            stream_url=camera.stream_url,
+            algorithm_id=algorithm.id,
+            algorithm_name=algorithm.name,
+            algorithm_code=algorithm.code,
+            algorithm_version=algorithm.version,
+            algorithm_type=algorithm.algorithm_type,
+            config={**(algorithm.default_config or {}), **(service.config or {})},
+            roi_areas=service.roi_areas or [],
+            fps=min(max(fps, 0.1), settings.AI_SERVICE_MAX_FPS),
+            alarm_threshold=service.alarm_threshold if service.alarm_threshold is not None else 0.8,
+            alarm_config=service.alarm_config or {},
+        )
+
+
+def extract_detections(result: Any, threshold: float) -> List[Dict[str, Any]]:
+    """从算法输出中提取置信度达到阈值的检测目标（未给出置信度的视为命中）"""
+    items = result
+    if isinstance(result, dict):
+        items = next((result[key] for key in DETECTION_KEYS if isinstance(result.get(key), list)), [])
+    if not isinstance(items, list):
+        return []
+    return [
+        item for item in items
+        if isinstance(item, dict) and float(item.get('confidence', 1.0) or 0) >= threshold
+    ]
+
+
+class ServicePipeline:
+    """单个AI服务的流水线: 取最新帧 -> ROI裁剪 -> 推理 -> 去重抑制 -> 检测结果交给事件写入"""
+
+    def __init__(self, spec: ServiceSpec, subscription: FrameSubscription, infer, runtime: "AIServiceRuntime"):
+        self.spec = spec
+        self.subscription = subscription
+        self.infer = infer
+        self.runtime = runtime
+        self.task: Optional[asyncio.Task] = None
+        self.event_type = EVENT_TYPE_BY_ALGORITHM.get(spec.algorithm_type, EventType.CUSTOM)
+        self.policy = SuppressionPolicy.from_config(spec.alarm_config)
+        self.stats = {'frames': 0, 'detections': 0, 'events': 0, 'suppressed': 0, 'errors': 0, 'avg_infer_ms': 0.0}
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def _run(self):
+        mask_outside = bool(self.spec.config.get('roi_mask', False))
+        while True:
+            frame, captured_at = await self.subscription.queue.get()
+            roi = roi_engine.for_frame(self.spec.camera_id, self.spec.roi_areas, frame)
+            # 默认只裁剪外接矩形（视图，不复制像素）；roi_mask 开启时把多边形外的像素置零
+            image = roi.masked(frame) if mask_outside else roi.crop(frame)
+
+            start = time.perf_counter()
+            try:
+                result = await self.infer(image)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"AI服务 {self.spec.service_id} 推理失败: {e}")
+                await asyncio.sleep(1)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stats['frames'] += 1
+            self.stats['avg_infer_ms'] += (elapsed - self.stats['avg_infer_ms']) / self.stats['frames']
+
+            detections = roi.map_detections(extract_detections(result, self.spec.alarm_threshold))
+            if not detections:
+                continue
+            self.stats['detections'] += len(detections)
+
+            # 同一目标在冷却时间内只告警一次，合并掉的检测次数记入事件元数据
+            height, width = frame.shape[:2]
+            decision = event_suppressor.evaluate(
+                self.spec.camera_id, self.event_type.value, detections, (width, height), captured_at, self.policy
+            )
+            self.stats['suppressed'] += decision.suppressed
+            if not decision.emit:
+                continue
+            self.stats['events'] += 1
+            self.runtime.submit_event(self.spec, frame, decision.emit, captured_at, elapsed, decision.merged)
+
+
+class AIServiceRuntime:
+    """AI服务运行时
+
+    为每个运行中的AI服务维护一条取帧推理流水线，同一摄像头只解码一次。
+    只有产生检测结果的帧会生成 Event（经后台写入协程批量落库），其余帧不落库。
+    AIServiceMonitor 每轮检查时调用 sync() 对齐应运行的服务，摄像头离线时暂停对应流水线。
+    """
+
+    def __init__(self, event_queue_size: int = 1000, event_batch_size: int = 50):
+        self.executor = EventTaskExecutor()
+        self.sources: Dict[int, FrameSource] = {}
+        self.pipelines: Dict[int, ServicePipeline] = {}
+        self._specs: Dict[int, ServiceSpec] = {}
+        self._offline_cameras: set = set()
+        self._event_queue: Optional[asyncio.Queue] = None
+        self._event_queue_size = event_queue_size
+        self._event_batch_size = event_batch_size
+        self._writer_task: Optional[asyncio.Task] = None
+        self._status_task: Optional[asyncio.Task] = None
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self.stats = {'events_written': 0, 'events_dropped': 0, 'write_failures': 0}
+
+    async def start(self):
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        if self._writer_task is None:
+            self._event_queue = asyncio.Queue(maxsize=self._event_queue_size)
+            self._writer_task = asyncio.create_task(self._write_events())
+            self._status_task = asyncio.create_task(self._watch_camera_status())
+
+    async def stop(self):
+        for service_id in list(self.pipelines):
+            await self._stop_pipeline(service_id)
+        for task in (self._status_task, self._writer_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._writer_task = self._status_task = None
+
+    async def load_specs(self, db) -> Dict[int, ServiceSpec]:
+        """读取应运行的AI服务（运行中、启用，且摄像头和算法可用）"""
+        result = await db.execute(
+            select(AIService, Camera, AIAlgorithm)
+            .join(Camera, AIService.camera_id == Camera.id)
+            .join(AIAlgorithm, AIService.algorithm_id == AIAlgorithm.id)
+            .where(
+                AIService.status == ServiceStatus.RUNNING,
+                AIService.is_active == True,
+                Camera.is_active == True
+            )
+        )
+        specs = {}
+        offline = set()
+        for service, camera, algorithm in result.all():
+            # 多副本部署时只运行分配给本副本的摄像头，保证同一摄像头的抑制状态只在一个进程中
+            if not owns_camera(camera.id):
+                continue
+            if camera.status == CameraStatus.OFFLINE:
+                offline.add(camera.id)
+            specs[service.id] = ServiceSpec.build(service, camera, algorithm)
+        self._offline_cameras = offline
+        return specs
+
+    async def sync(self, specs: Dict[int, ServiceSpec]):
+        """启动新增/配置变化的服务流水线，停止不再运行的服务"""
+        await self.start()
+        # 监控巡检和摄像头状态变化都会调用，串行执行避免同一服务被重复启动
+        async with self._sync_lock:
+            self._specs = specs
+            for service_id in list(self.pipelines):
+                spec = specs.get(service_id)
+                if spec is None or spec != self.pipelines[service_id].spec or spec.camera_id in self._offline_cameras:
+                    await self._stop_pipeline(service_id)
+            for service_id, spec in specs.items():
+                if service_id not in self.pipelines and spec.camera_id not in self._offline_cameras:
+                    await self._start_pipeline(spec)
+
+    async def _start_pipeline(self, spec: ServiceSpec):
+        try:
+            # 加载算法模块和读取 algorithm.json 涉及磁盘IO，放到线程中执行
+            infer = await asyncio.to_thread(
+                self.executor.prepare_algorithm, spec.algorithm_code, spec.algorithm_version, spec.config
+            )
+        except Exception as e:
+            logger.error(f"AI服务 {spec.service_id} 加载算法失败: {e}")
+            return
+
+        source = self.sources.get(spec.camera_id)
+        if source is None or source.stream_url != spec.stream_url:
+            if source:
+                source.stop()
+            source = self.sources[spec.camera_id] = FrameSource(spec.camera_id, spec.stream_url)
+        subscription = FrameSubscription(spec.service_id, spec.fps, asyncio.get_running_loop())
+        source.subscribe(subscription)
+
+        pipeline = ServicePipeline(spec, subscription, infer, self)
+        pipeline.start()
+        self.pipelines[spec.service_id] = pipeline
+        logger.info(f"AI服务 {spec.service_id} 流水线已启动 - 摄像头: {spec.camera_id}, fps: {spec.fps}")
+
+    async def _stop_pipeline(self, service_id: int):
+        pipeline = self.pipelines.pop(service_id, None)
+        if not pipeline:
+            return
+        await pipeline.stop()
+        source = self.sources.get(pipeline.spec.camera_id)
+        if source and source.unsubscribe(service_id):
+            source.stop()
+            del self.sources[pipeline.spec.camera_id]
+            event_suppressor.forget_camera(pipeline.spec.camera_id)
+        logger.info(f"AI服务 {service_id} 流水线已停止")
+
+    async def stop_service(self, service_id: int):
+        self._specs.pop(service_id, None)
+        await self._stop_pipeline(service_id)
+
+    async def _watch_camera_status(self):
+        """摄像头离线时暂停相关流水线，恢复在线后立即重新启动"""
+        queue = camera_status_broadcaster.subscribe()
+        try:
+            while True:
+                events = await queue.get()
+                for event in events or []:
+                    camera_id = event['camera_id']
+                    if event['new_status'] == CameraStatus.OFFLINE.value:
+                        self._offline_cameras.add(camera_id)
+                    else:
+                        self._offline_cameras.discard(camera_id)
+                await self.sync(self._specs)
+        finally:
+            camera_status_broadcaster.unsubscribe(queue)
+
+    def submit_event(self, spec: ServiceSpec, frame: np.ndarray, detections: List[Dict[str, Any]],
+                     captured_at: float, infer_ms: float, merged: int = 0):
+        """提交检测结果，写入队列已满时丢弃（不阻塞推理）"""
+        try:
+            self._event_queue.put_nowait((spec, frame, detections, captured_at, infer_ms, merged))
+        except asyncio.QueueFull:
+            self.stats['events_dropped'] += 1
+
+    @staticmethod
+    def _save_snapshot(camera_id: int, event_id: str, frame: np.ndarray) -> Optional[str]:
+        """编码并上传事件截图，返回预签名URL（在线程池中执行）"""
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            return None
+        data = buffer.tobytes()
+        object_name = f"events/{camera_id}/{datetime.now().strftime('%Y%m%d')}/{event_id}.jpg"
+        minio_client.put_object(
+            settings.MINIO_BUCKET_NAME, object_name, io.BytesIO(data), len(data), content_type='image/jpeg'
+        )
+        return minio_client.presigned_get_object(settings.MINIO_BUCKET_NAME, object_name, expires=timedelta(days=7))
+
+    def _build_event(self, event_id: str, spec: ServiceSpec, detections: List[Dict[str, Any]],
+                     captured_at: float, infer_ms: float, merged: int, image_url: Optional[str]) -> Event:
+        event_time = datetime.fromtimestamp(captured_at, timezone.utc)
+        level_name = str(spec.alarm_config.get('event_level', EventLevel.MEDIUM.value)).lower()
+        event_level = next((level for level in EventLevel if level.value == level_name), EventLevel.MEDIUM)
+        return Event(
+            event_id=event_id,
+            event_type=EVENT_TYPE_BY_ALGORITHM.get(spec.algorithm_type, EventType.CUSTOM),
+            event_level=event_level,
+            title=f"{spec.name}: 检测到{len(detections)}个目标",
+            camera_id=spec.camera_id,
+            camera_name=spec.camera_name,
+            camera_location=spec.camera_location,
+            algorithm_id=spec.algorithm_id,
+            algorithm_name=spec.algorithm_name,
+            confidence_score=max(float(item.get('confidence', 1.0) or 0) for item in detections),
+            detection_area=spec.roi_areas or None,
+            image_urls=[image_url] if image_url else [],
+            thumbnail_url=image_url,
+            detected_objects=detections,
+            object_count=len(detections),
+            event_time=event_time,
+            event_metadata={
+                'ai_service_id': spec.service_id,
+                'inference_ms': round(infer_ms, 2),
+                'merged_detections': merged
+            },
+        )
+
+    async def _write_events(self):
+        """批量写入检测事件并更新服务统计"""
+        while True:
+            batch = [await self._event_queue.get()]
+            while len(batch) < self._event_batch_size and not self._event_queue.empty():
+                batch.append(self._event_queue.get_nowait())
+            try:
+                events = []
+                for spec, frame, detections, captured_at, infer_ms, merged in batch:
+                    event_id = f"EVT-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+                    try:
+                        image_url = await asyncio.to_thread(self._save_snapshot, spec.camera_id, event_id, frame)
+                    except Exception as e:
+                        logger.warning(f"事件截图保存失败: {e}")
+                        image_url = None
+                    events.append(
+                        self._build_event(event_id, spec, detections, captured_at, infer_ms, merged, image_url)
+                    )
+
+                async with AsyncSessionLocal() as db:
+                    db.add_all(events)
+                    await db.flush()
+                    for event in events:
+                        await apply_event_change(db, None, await get_event_bucket(db, event.id))
+
+                    per_service: Dict[int, Tuple[int, datetime]] = {}
+                    for event in events:
+                        service_id = event.event_metadata['ai_service_id']
+                        count, _ = per_service.get(service_id, (0, None))
+                        per_service[service_id] = (count + 1, event.event_time)
+                    for service_id, (count, last_time) in per_service.items():
+                        await db.execute(
+                            update(AIService)
+                            .where(AIService.id == service_id)
+                            .values(
+                                total_detections=func.coalesce(AIService.total_detections, 0) + count,
+                                total_alarms=func.coalesce(AIService.total_alarms, 0) + count,
+                                last_detection_time=last_time
+                            )
+                        )
+                    await db.commit()
+                await stats_cache.invalidate_tags("events")
+                self.stats['events_written'] += len(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['write_failures'] += 1
+                logger.error(f"写入AI服务事件失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'event_queue_depth': self._event_queue.qsize() if self._event_queue else 0,
+            'roi': roi_engine.get_stats(),
+            'suppression': event_suppressor.get_stats(),
+            'sources': {
+                camera_id: {**source.stats, 'connected': source.connected, 'frame_size': source.frame_size}
+                for camera_id, source in self.sources.items()
+            },
+            'services': {
+                service_id: {
+                    **pipeline.stats,
+                    'fps': pipeline.spec.fps,
+                    'frames_delivered': pipeline.subscription.delivered,
+                    'frames_dropped': pipeline.subscription.dropped,
+                }
+                for service_id, pipeline in self.pipelines.items()
+            },
+        }
+
+
+# 全局AI服务运行时实例
+ai_service_runtime = AIServiceRuntime()
@@ -0,0 +1,126 @@
+"""partition_results_logs_and_metrics
+
+Revision ID: d9f3b6a1c8e2
+Revises: c5a8d2e4f1b7
+Create Date: 2026-10-19 14:22:03.918275
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b6a1c8e2'
+down_revision = 'c5a8d2e4f1b7'
+branch_labels = None
+depends_on = None
+
+
+# 表名 -> (分区键, 分区周期, 提前创建的分区数, 需要重建的索引)
+TABLES = {
+    'diagnosis_results': ('created_at', 'month', 3, {
+        'ix_diagnosis_results_id': ['id'],
+        'ix_diagnosis_results_created_at_id': ['created_at', 'id'],
+        'ix_diagnosis_results_task_id_created_at': ['task_id', 'created_at', 'id'],
+        'ix_diagnosis_results_status_created_at': ['diagnosis_status', 'created_at', 'id'],
+    }),
+    'system_logs': ('created_at', 'month', 3, {
+        'ix_system_logs_id': ['id'],
+        'ix_system_logs_created_at_id': ['created_at', 'id'],
+        'ix_system_logs_level_created_at': ['level', 'created_at', 'id'],
+        'ix_system_logs_module_created_at': ['module', 'created_at', 'id'],
+        'ix_system_logs_user_id_created_at': ['user_id', 'created_at', 'id'],
+    }),
+    'system_metrics': ('timestamp', 'day', 7, {
+        'ix_system_metrics_id': ['id'],
+    }),
+}
+
+
+def _period_start(value, interval):
+    if interval == 'month':
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_period(start, interval):
+    if interval == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def _bound(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S+00')
+
+
+def _swap_table(table, column, partitioned):
+    """用结构相同的新表替换原表（分区表 <-> 普通表），保留数据和id序列"""
+    new_table = f"{table}_new"
+    sequence = f"{table}_id_seq"
+    partition_clause = f' PARTITION BY RANGE ("{column}")' if partitioned else ''
+
+    op.execute(f'ALTER SEQUENCE "{sequence}" OWNED BY NONE')
+    op.execute(f'CREATE TABLE "{new_table}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING COMMENTS){partition_clause}')
+    op.execute(f'ALTER TABLE "{new_table}" ALTER COLUMN "{column}" SET NOT NULL')
+    if partitioned:
+        op.execute(f'ALTER TABLE "{new_table}" ADD CONSTRAINT "{table}_pkey_new" PRIMARY KEY (id, "{column}")')
+    else:
+        op.execute(f'ALTER TABLE "{new_table}" ADD CONSTRAINT "{table}_pkey_new" PRIMARY KEY (id)')
+    return new_table
+
+
+def _create_partitions(table, column, interval, ahead):
+    """按已有数据的时间范围创建分区，并提前创建未来分区和默认分区"""
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text(f'SELECT min("{column}") FROM "{table}"')).scalar()
+    now = datetime.now(timezone.utc)
+    start = _period_start((oldest or now).astimezone(timezone.utc), interval)
+
+    last = _period_start(now, interval)
+    for _ in range(ahead):
+        last = _next_period(last, interval)
+
+    while start <= last:
+        end = _next_period(start, interval)
+        op.execute(
+            f'CREATE TABLE "{table}_new_p{start.strftime("%Y%m%d")}" PARTITION OF "{table}_new" '
+            f"FOR VALUES FROM ('{_bound(start)}') TO ('{_bound(end)}')"
+        )
+        start = end
+    op.execute(f'CREATE TABLE "{table}_new_default" PARTITION OF "{table}_new" DEFAULT')
+
+
+def _finish_swap(table, indexes):
+    new_table = f"{table}_new"
+    op.execute(f'INSERT INTO "{new_table}" SELECT * FROM "{table}"')
+    op.execute(f'DROP TABLE "{table}"')
+    op.execute(f'ALTER TABLE "{new_table}" RENAME TO "{table}"')
+    op.execute(f'ALTER TABLE "{table}" RENAME CONSTRAINT "{table}_pkey_new" TO "{table}_pkey"')
+    op.execute(f'ALTER SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+    for name, columns in indexes.items():
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table, (column, interval, ahead, indexes) in TABLES.items():
+        # 分区键不允许为空
+        op.execute(f'UPDATE "{table}" SET "{column}" = now() WHERE "{column}" IS NULL')
+        _swap_table(table, column, partitioned=True)
+        _create_partitions(table, column, interval, ahead)
+        # 分区名随表名一起去掉 _new 后缀
+        partitions = bind.execute(sa.text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table"
+        ), {'table': f"{table}_new"}).scalars().all()
+        _finish_swap(table, indexes)
+        for partition in partitions:
+            op.execute(f'ALTER TABLE "{partition}" RENAME TO "{partition.replace(table + "_new_", table + "_", 1)}"')
+
+
+def downgrade() -> None:
+    for table, (column, interval, ahead, indexes) in TABLES.items():
+        _swap_table(table, column, partitioned=False)
+        _finish_swap(table, indexes)
@@ -3,6 +3,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from redis import Redis
+from redis import asyncio as aioredis
 from minio import Minio
 import aio_pika
 from config import settings
@@ -43,6 +44,9 @@ metadata = MetaData()
 # Redis连接
 redis_client = Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+# 异步Redis连接（请求路径上使用，避免阻塞事件循环）
+async_redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
 # MinIO客户端
 minio_client = Minio(
     settings.MINIO_ENDPOINT,
@@ -66,6 +70,9 @@ async def get_db():
 def get_redis():
     return redis_client
 
+def get_async_redis():
+    return async_redis_client
+
 # MinIO依赖注入
 def get_minio():
     return minio_client
@@ -88,7 +95,7 @@ async def init_db():
         from models.role import Role, Permission, UserRole
         from models.camera import Camera, CameraGroup, CameraGroupMember
         from models.ai_algorithm import AIAlgorithm, AIModel, AIService
-        from models.event import Event, EventRule, EventNotification
+        from models.event import Event, EventRule, EventNotification, EventDailyStats
         from models.event_task import EventTask, EventTaskLog, EventTaskRecovery
         from models.diagnosis import DiagnosisTask, DiagnosisResult, DiagnosisAlarm, DiagnosisTemplate
         from models.system import SystemConfig, SystemVersion, DataRetentionPolicy, MessageCenter, SystemLog, SystemMetrics, License
@@ -98,6 +105,12 @@ async def init_db():
             async with async_engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
             logger.info("Database tables created successfully")
+            
+            # 新建的分区表需要先创建分区才能写入
+            from utils.partitioning import ensure_all_partitions
+            async with AsyncSessionLocal() as session:
+                await ensure_all_partitions(session)
+                await session.commit()
         except Exception as e:
             logger.warning(f"Database connection failed: {e}")
         
@@ -127,4 +140,5 @@ async def init_db():
 async def close_db():
     """关闭数据库连接"""
     await async_engine.dispose()
-    redis_client.close()
\ No newline at end of file
+    redis_client.close()
+    await async_redis_client.close()
\ No newline at end of file
@@ -18,6 +18,9 @@ from models.diagnosis import (
 from models.camera import Camera, CameraStatus
 from utils.minio_client import MinioClient
 from diagnosis.algorithms import get_algorithm
+from diagnosis.rule_engine import alarm_rule_engine
+from notification_dispatcher import notification_dispatcher, render_template
+from utils.roi import roi_engine
 from database import get_db
 
 logger = logging.getLogger(__name__)
@@ -220,9 +223,13 @@ class DiagnosisExecutor:
                         if type_specific_config:
                             algorithm_config['thresholds'].update(type_specific_config)
                     
+                    # 只诊断ROI区域（外接矩形视图，不复制像素）；类型级配置优先于任务级配置
+                    roi_areas = algorithm_config.get('roi_areas') or task.diagnosis_config.get('roi_areas')
+                    roi_image = roi_engine.for_frame(camera.id, roi_areas, image).crop(image) if roi_areas else image
+                    
                     # 执行诊断
                     algorithm = get_algorithm(diagnosis_type, algorithm_config)
-                    diagnosis_result = algorithm.diagnose(image)
+                    diagnosis_result = algorithm.diagnose(roi_image)
                     
                     # 创建诊断结果记录
                     result = await self._create_diagnosis_result(
@@ -241,7 +248,7 @@ class DiagnosisExecutor:
                     
                     # 检查是否需要创建告警
                     if diagnosis_result['status'] in [DiagnosisStatus.WARNING, DiagnosisStatus.ERROR, DiagnosisStatus.CRITICAL]:
-                        await self._create_alarm(result, diagnosis_result, task, db)
+                        await self._create_alarm(result, diagnosis_result, task, db, camera, diagnosis_type_str)
                         
                 except Exception as e:
                     logger.error(f"诊断类型 {diagnosis_type_str} 执行失败: {str(e)}")
@@ -508,14 +515,16 @@ class DiagnosisExecutor:
         
     async def _create_alarm(
         self, result_data: Dict[str, Any], diagnosis_result: Dict[str, Any],
-        task: DiagnosisTask, db: AsyncSession
+        task: DiagnosisTask, db: AsyncSession, camera: Optional[Camera] = None,
+        diagnosis_type: Optional[str] = None
     ):
-        """创建诊断告警"""
+        """创建诊断告警，并匹配告警规则"""
         try:
+            severity = self._get_alarm_severity(diagnosis_result['status'])
             alarm = DiagnosisAlarm(
                 result_id=result_data['id'],
                 alarm_type=diagnosis_result.get('type', 'unknown'),
-                severity=self._get_alarm_severity(diagnosis_result['status']),
+                severity=severity,
                 title=f"摄像头诊断异常: {diagnosis_result.get('message', '未知错误')}",
                 description=f"任务: {task.name}\n" +
                            f"状态: {diagnosis_result['status'].value}\n" +
@@ -532,6 +541,36 @@ class DiagnosisExecutor:
             db.add(alarm)
             await db.commit()
             
+            if camera is not None and diagnosis_type:
+                values = {
+                    **(diagnosis_result.get('metrics') or {}),
+                    'score': diagnosis_result.get('score'),
+                    'threshold': diagnosis_result.get('threshold')
+                }
+                rules = await alarm_rule_engine.evaluate(db, diagnosis_type, camera.id, severity, values)
+                if rules:
+                    logger.info(f"告警 {alarm.id} 触发规则: {[rule.name for rule in rules]}")
+                
+                # 按规则的通知渠道提交通知，由通知调度器异步合并发送
+                context = {
+                    'task_name': task.name,
+                    'camera_id': camera.id,
+                    'camera_name': camera.name,
+                    'camera_location': camera.location or '',
+                    'diagnosis_type': diagnosis_type,
+                    'severity': severity,
+                    'score': diagnosis_result.get('score'),
+                    'threshold': diagnosis_result.get('threshold'),
+                    'message': diagnosis_result.get('message', ''),
+                }
+                content = f"摄像头: {camera.name}\n诊断类型: {diagnosis_type}\n{alarm.description}"
+                for rule in rules:
+                    await notification_dispatcher.notify(
+                        db, rule.notification_channels, alarm.title,
+                        render_template(rule.notification_template, context, content),
+                        rule_id=rule.id, alarm_id=alarm.id
+                    )
+            
         except Exception as e:
             logger.error(f"创建告警失败: {str(e)}")
             
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import operator
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.camera import CameraGroup, CameraGroupMember
+from models.diagnosis import AlarmRule
+
+logger = logging.getLogger(__name__)
+
+# 通配键: 规则未限定诊断类型/摄像头时登记在该键下
+ANY = '*'
+
+# 告警严重程度等级，规则的 severity_level 表示触发所需的最低等级
+SEVERITY_RANK = {
+    'low': 1, 'warning': 1,
+    'medium': 2, 'error': 2,
+    'high': 3,
+    'critical': 4,
+}
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    'lt': operator.lt, 'lte': operator.le, 'le': operator.le,
+    'gt': operator.gt, 'gte': operator.ge, 'ge': operator.ge,
+    'eq': operator.eq, 'ne': operator.ne,
+}
+
+Predicate = Tuple[str, Callable[[Any, Any], bool], float]
+
+
+def compile_thresholds(threshold_config: Optional[Dict[str, Any]]) -> Tuple[Predicate, ...]:
+    """把规则的阈值配置编译为 (字段, 比较函数, 阈值) 列表，全部满足才触发
+
+    支持两种写法:
+    - {"score": {"lt": 60}} 字段可为 score/threshold 或诊断结果 metrics 中的任意指标
+    - {"brightness_min": 40} / {"noise_max": 0.3} 与诊断阈值含义一致，
+      即低于最小值、高于最大值时触发
+    """
+    predicates = []
+    for key, value in (threshold_config or {}).items():
+        if isinstance(value, dict):
+            for op, target in value.items():
+                if op in OPERATORS and isinstance(target, (int, float)):
+                    predicates.append((key, OPERATORS[op], float(target)))
+                else:
+                    logger.warning(f"忽略无效的告警规则阈值: {key}.{op}={target}")
+        elif isinstance(value, (int, float)) and key.endswith('_min'):
+            predicates.append((key[:-4], operator.lt, float(value)))
+        elif isinstance(value, (int, float)) and key.endswith('_max'):
+            predicates.append((key[:-4], operator.gt, float(value)))
+        else:
+            logger.warning(f"忽略无效的告警规则阈值: {key}={value}")
+    return tuple(predicates)
+
+
+@dataclass
+class CompiledRule:
+    """编译后的告警规则"""
+    id: int
+    name: str
+    priority: int
+    min_severity: int
+    predicates: Tuple[Predicate, ...]
+    frequency_limit: int
+    notification_channels: List[int]
+    notification_template: Optional[str]
+    # 规则登记在索引中的 (诊断类型, 摄像头) 键，删除时按键移除
+    keys: List[Tuple[str, Any]] = field(default_factory=list)
+
+    def matches(self, severity_rank: int, values: Dict[str, Any]) -> bool:
+        if severity_rank < self.min_severity:
+            return False
+        for name, compare, target in self.predicates:
+            value = values.get(name)
+            if not isinstance(value, (int, float)) or not compare(value, target):
+                return False
+        return True
+
+
+class AlarmRuleEngine:
+    """告警规则匹配引擎
+
+    启用的规则编译后登记到 诊断类型 -> 摄像头 -> 规则列表 的索引中（未限定的维度登记在
+    通配键下），匹配一条诊断结果只需查 2x2 个索引桶并检查其中的规则。摄像头组在编译时
+    展开为摄像头ID。
+
+    刷新策略:
+    - 本进程的规则增删改由接口调用 refresh_rule/remove_rule 立即生效
+    - 其他进程（诊断Worker）每 refresh_interval 秒比对规则数和最大 updated_at，
+      只重新编译变化的规则，规则数对不上（有删除）时全量重建
+    - 每 full_reload_interval 秒全量重建一次，同步摄像头组成员变化
+    """
+
+    def __init__(self, refresh_interval: float = 30, full_reload_interval: float = 600):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._rules: Dict[int, CompiledRule] = {}
+        self._index: Dict[str, Dict[Any, List[CompiledRule]]] = {}
+        self._triggers: Dict[int, deque] = {}
+        self._lock = asyncio.Lock()
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._row_count = 0
+        self._max_updated_at: Optional[datetime] = None
+        self.stats = {'full_reloads': 0, 'incremental_refreshes': 0, 'evaluations': 0, 'matched': 0, 'rate_limited': 0}
+
+    @staticmethod
+    async def _load_groups(db: AsyncSession) -> Dict[str, Set[int]]:
+        """摄像头组 -> 摄像头ID，组可按名称或ID引用"""
+        groups: Dict[str, Set[int]] = {}
+        result = await db.execute(select(CameraGroup.id, CameraGroup.name, CameraGroup.camera_ids))
+        names = {}
+        for group_id, name, camera_ids in result.all():
+            members = groups.setdefault(str(group_id), set())
+            members.update(int(camera_id) for camera_id in camera_ids or [])
+            names[name] = members
+        result = await db.execute(
+            select(CameraGroupMember.group_id, CameraGroupMember.camera_id)
+            .where(CameraGroupMember.is_active == True)
+        )
+        for group_id, camera_id in result.all():
+            groups.setdefault(str(group_id), set()).add(camera_id)
+        groups.update(names)
+        return groups
+
+    @staticmethod
+    def _compile(rule: AlarmRule, groups: Dict[str, Set[int]]) -> Optional[CompiledRule]:
+        if not rule.is_enabled:
+            return None
+        compiled = CompiledRule(
+            id=rule.id,
+            name=rule.name,
+            priority=rule.priority or 0,
+            min_severity=SEVERITY_RANK.get((rule.severity_level or '').lower(), 0),
+            predicates=compile_thresholds(rule.threshold_config),
+            frequency_limit=rule.frequency_limit or 0,
+            notification_channels=list(rule.notification_channels or []),
+            notification_template=rule.notification_template,
+        )
+        cameras: Set[Any] = {int(camera_id) for camera_id in rule.camera_ids or []}
+        for group in rule.camera_groups or []:
+            cameras |= groups.get(str(group), set())
+        if not rule.camera_ids and not rule.camera_groups:
+            cameras = {ANY}
+        types = rule.diagnosis_types or [ANY]
+        compiled.keys = [(diagnosis_type, camera_id) for diagnosis_type in types for camera_id in cameras]
+        return compiled
+
+    def _put(self, compiled: CompiledRule):
+        self._rules[compiled.id] = compiled
+        for diagnosis_type, camera_id in compiled.keys:
+            bucket = self._index.setdefault(diagnosis_type, {}).setdefault(camera_id, [])
+            bucket.append(compiled)
+            bucket.sort(key=lambda rule: -rule.priority)
+
+    def _remove(self, rule_id: int):
+        compiled = self._rules.pop(rule_id, None)
+        if not compiled:
+            return
+        for diagnosis_type, camera_id in compiled.keys:
+            cameras = self._index.get(diagnosis_type, {})
+            bucket = [rule for rule in cameras.get(camera_id, []) if rule.id != rule_id]
+            if bucket:
+                cameras[camera_id] = bucket
+            else:
+                cameras.pop(camera_id, None)
+                if not cameras:
+                    self._index.pop(diagnosis_type, None)
+
+    async def _fingerprint(self, db: AsyncSession) -> Tuple[int, Optional[datetime]]:
+        result = await db.execute(select(func.count(AlarmRule.id), func.max(AlarmRule.updated_at)))
+        count, max_updated_at = result.one()
+        return count or 0, max_updated_at
+
+    async def reload(self, db: AsyncSession):
+        """全量重建索引"""
+        async with self._lock:
+            groups = await self._load_groups(db)
+            rules = (await db.execute(select(AlarmRule))).scalars().all()
+            self._rules, self._index = {}, {}
+            for rule in rules:
+                compiled = self._compile(rule, groups)
+                if compiled:
+                    self._put(compiled)
+            self._row_count = len(rules)
+            self._max_updated_at = max((rule.updated_at for rule in rules if rule.updated_at), default=None)
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.stats['full_reloads'] += 1
+            logger.info(f"告警规则索引已加载: {len(self._rules)}/{len(rules)} 条启用")
+
+    async def refresh_rule(self, db: AsyncSession, rule_id: int):
+        """重新编译单条规则（创建/更新/启停后调用），规则不存在或已禁用时从索引移除"""
+        async with self._lock:
+            rule = (await db.execute(select(AlarmRule).where(AlarmRule.id == rule_id))).scalar_one_or_none()
+            self._remove(rule_id)
+            if rule is None:
+                return
+            compiled = self._compile(rule, await self._load_groups(db) if rule.camera_groups else {})
+            if compiled:
+                self._put(compiled)
+            if rule.updated_at and (self._max_updated_at is None or rule.updated_at > self._max_updated_at):
+                self._max_updated_at = rule.updated_at
+            self.stats['incremental_refreshes'] += 1
+
+    def remove_rule(self, rule_id: int):
+        """规则删除后调用"""
+        self._remove(rule_id)
+        self._triggers.pop(rule_id, None)
+
+    async def ensure_fresh(self, db: AsyncSession):
+        """按需加载/刷新索引（见类说明中的刷新策略）"""
+        now = time.monotonic()
+        if not self._loaded_at or now - self._loaded_at >= self.full_reload_interval:
+            await self.reload(db)
+            return
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        count, max_updated_at = await self._fingerprint(db)
+        if count < self._row_count:
+            await self.reload(db)
+            return
+        if max_updated_at is None or (self._max_updated_at and max_updated_at <= self._max_updated_at):
+            self._row_count = count
+            return
+
+        async with self._lock:
+            query = select(AlarmRule)
+            if self._max_updated_at:
+                query = query.where(AlarmRule.updated_at > self._max_updated_at)
+            changed = (await db.execute(query)).scalars().all()
+            groups = await self._load_groups(db) if any(rule.camera_groups for rule in changed) else {}
+            for rule in changed:
+                self._remove(rule.id)
+                compiled = self._compile(rule, groups)
+                if compiled:
+                    self._put(compiled)
+            self._row_count = count
+            self._max_updated_at = max_updated_at
+            self.stats['incremental_refreshes'] += len(changed)
+
+    def match(self, diagnosis_type: str, camera_id: int, severity: str,
+              values: Dict[str, Any]) -> List[CompiledRule]:
+        """返回与诊断结果匹配的规则（按优先级从高到低）"""
+        severity_rank = SEVERITY_RANK.get((severity or '').lower(), 0)
+        matched: Dict[int, CompiledRule] = {}
+        for type_key in (diagnosis_type, ANY):
+            cameras = self._index.get(type_key)
+            if not cameras:
+                continue
+            for camera_key in (camera_id, ANY):
+                for rule in cameras.get(camera_key, ()):
+                    if rule.id not in matched and rule.matches(severity_rank, values):
+                        matched[rule.id] = rule
+        return sorted(matched.values(), key=lambda rule: -rule.priority)
+
+    def _allow(self, rule: CompiledRule, now: float) -> bool:
+        """频率限制: 每分钟最多触发 frequency_limit 次（0 表示不限制）"""
+        if rule.frequency_limit <= 0:
+            return True
+        window = self._triggers.setdefault(rule.id, deque())
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= rule.frequency_limit:
+            return False
+        window.append(now)
+        return True
+
+    async def evaluate(self, db: AsyncSession, diagnosis_type: str, camera_id: int, severity: str,
+                       values: Dict[str, Any]) -> List[CompiledRule]:
+        """匹配规则、应用频率限制并更新规则触发统计，返回本次触发的规则"""
+        await self.ensure_fresh(db)
+        self.stats['evaluations'] += 1
+        now = time.monotonic()
+        triggered = []
+        for rule in self.match(diagnosis_type, camera_id, severity, values):
+            if self._allow(rule, now):
+                triggered.append(rule)
+            else:
+                self.stats['rate_limited'] += 1
+        if triggered:
+            self.stats['matched'] += len(triggered)
+            await db.execute(
+                update(AlarmRule)
+                .where(AlarmRule.id.in_([rule.id for rule in triggered]))
+                .values(
+                    trigger_count=func.coalesce(AlarmRule.trigger_count, 0) + 1,
+                    last_triggered_at=func.now(),
+                    # 触发统计不算规则变更，保持 updated_at 不变以免触发索引刷新
+                    updated_at=AlarmRule.updated_at
+                )
+            )
+            await db.commit()
+        return triggered
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'rules': len(self._rules),
+            'index_buckets': sum(len(cameras) for cameras in self._index.values()),
+        }
+
+
+# 全局告警规则引擎实例
+alarm_rule_engine = AlarmRuleEngine()
@@ -1,11 +1,11 @@
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select
 
-from models.event_task import EventTask, EventTaskStatus
+from models.event_task import EventTask
 from models.ai_algorithm import AIAlgorithm, AIService
 from models.camera import Camera
 import cv2
@@ -14,19 +14,36 @@ from io import BytesIO
 import base64
 import importlib
 import importlib.util
+import json
+import hashlib
 from pathlib import Path
+from utils.batch_inference import MicroBatcher
+from utils.roi import roi_engine
 
 logger = logging.getLogger(__name__)
 
 class EventTaskExecutor:
     """事件任务执行器"""
     
-    def __init__(self):
+    def __init__(self, batch_max_size: int = 8, batch_max_wait_ms: int = 20, package_cache=None):
         self.algorithms_dir = Path(__file__).parent / "algorithms"
         self.algorithms_dir.mkdir(exist_ok=True)
+        
+        # Worker本地算法包缓存（AlgorithmPackageCache），未配置时直接读取algorithms目录
+        self.package_cache = package_cache
+        
+        # 支持process_batch的算法包通过微批处理器合并推理
+        self.batcher = MicroBatcher(max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms)
+        # algorithm.json 批处理声明缓存: 路径 -> (修改时间, 声明)
+        self._batch_specs: Dict[Path, Tuple[float, Optional[Dict[str, Any]]]] = {}
     
     async def execute_event_task(self, task_id: int, task_data: Dict, db: AsyncSession) -> Dict[str, Any]:
-        """执行事件检测任务"""
+        """执行事件检测任务
+
+        任务状态由持有租约的调用方维护：领取时置为RUNNING，结束时凭 fencing_token
+        经 utils.task_lease.finish_task 写回，这里只读取任务配置并执行检测。
+        """
+        start_time = datetime.now(timezone.utc)
         try:
             logger.info(f"开始执行事件任务 {task_id}")
             
@@ -39,17 +56,6 @@ class EventTaskExecutor:
             if not task:
                 raise Exception(f"事件任务 {task_id} 不存在")
             
-            # 更新任务状态为执行中
-            await db.execute(
-                update(EventTask)
-                .where(EventTask.id == task_id)
-                .values(
-                    status=EventTaskStatus.RUNNING,
-                    started_at=datetime.now(timezone.utc)
-                )
-            )
-            await db.commit()
-            
             # 获取算法信息
             algorithm_result = await db.execute(
                 select(AIAlgorithm).where(AIAlgorithm.id == task.algorithm_id)
@@ -76,20 +82,10 @@ class EventTaskExecutor:
             # 解码图像
             image = self._decode_image(image_data)
             
-            # 执行算法
-            detection_result = await self._execute_algorithm(algorithm, image, task_data)
-            
-            # 更新任务状态为完成
-            await db.execute(
-                update(EventTask)
-                .where(EventTask.id == task_id)
-                .values(
-                    status=EventTaskStatus.COMPLETED,
-                    completed_at=datetime.now(timezone.utc),
-                    result_data=detection_result
-                )
-            )
-            await db.commit()
+            # 裁剪到任务ROI后执行算法，检测坐标映射回整帧并过滤多边形外的目标
+            roi = roi_engine.for_frame(task.camera_id, task.roi_areas, image)
+            detection_result = await self._execute_algorithm(algorithm, roi.crop(image), task_data, task.detection_config)
+            detection_result = roi.map_result(detection_result)
             
             logger.info(f"事件任务 {task_id} 执行完成")
             
@@ -97,27 +93,11 @@ class EventTaskExecutor:
                 'success': True,
                 'task_id': task_id,
                 'result': detection_result,
-                'execution_time': (datetime.now(timezone.utc) - task.started_at).total_seconds() * 1000
+                'execution_time': (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
             }
             
         except Exception as e:
             logger.error(f"事件任务 {task_id} 执行失败: {str(e)}")
-            
-            # 更新任务状态为失败
-            try:
-                await db.execute(
-                    update(EventTask)
-                    .where(EventTask.id == task_id)
-                    .values(
-                        status=EventTaskStatus.FAILED,
-                        completed_at=datetime.now(timezone.utc),
-                        error_message=str(e)
-                    )
-                )
-                await db.commit()
-            except Exception as update_error:
-                logger.error(f"更新任务状态失败: {str(update_error)}")
-            
             return {
                 'success': False,
                 'task_id': task_id,
@@ -149,8 +129,9 @@ class EventTaskExecutor:
             logger.error(f"图像解码失败: {str(e)}")
             raise Exception(f"图像解码失败: {str(e)}")
     
-    async def _execute_algorithm(self, algorithm: AIAlgorithm, image: np.ndarray, task_data: Dict) -> Dict[str, Any]:
-        """执行AI算法"""
+    async def _execute_algorithm(self, algorithm: AIAlgorithm, image: np.ndarray, task_data: Dict,
+                                 detection_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """执行AI算法，参数为算法默认配置叠加任务的检测配置"""
         try:
             logger.info(f"执行算法: {algorithm.code} v{algorithm.version}")
             
@@ -160,11 +141,23 @@ class EventTaskExecutor:
             if not algorithm_module:
                 raise Exception(f"算法模块 {algorithm.code} v{algorithm.version} 未找到")
             
+            algorithm_config = {**(algorithm.default_config or {}), **(detection_config or {})}
+            batch_spec = self._get_batch_spec(algorithm.code, algorithm.version)
+            
             # 执行算法
-            if hasattr(algorithm_module, 'detect'):
-                result = algorithm_module.detect(image, algorithm.config or {})
+            if batch_spec and hasattr(algorithm_module, batch_spec['entry_point']):
+                batch_entry = getattr(algorithm_module, batch_spec['entry_point'])
+                result = await self.batcher.submit(
+                    self._batch_key(algorithm.code, algorithm.version, algorithm_config),
+                    lambda images: batch_entry(images, algorithm_config),
+                    image,
+                    max_batch_size=batch_spec.get('max_batch_size'),
+                    max_wait_ms=batch_spec.get('max_wait_ms')
+                )
+            elif hasattr(algorithm_module, 'detect'):
+                result = algorithm_module.detect(image, algorithm_config)
             elif hasattr(algorithm_module, 'process'):
-                result = algorithm_module.process(image, algorithm.config or {})
+                result = algorithm_module.process(image, algorithm_config)
             else:
                 raise Exception(f"算法模块 {algorithm.code} 缺少detect或process方法")
             
@@ -175,10 +168,100 @@ class EventTaskExecutor:
             logger.error(f"算法执行失败: {str(e)}")
             raise Exception(f"算法执行失败: {str(e)}")
     
+    def prepare_algorithm(self, algorithm_code: str, version: str, config: Dict[str, Any]):
+        """加载算法模块一次，返回可重复调用的 async infer(image) 函数（供连续帧流使用）
+
+        支持批处理的算法包经微批处理器合并推理，detect/process 入口在线程池中执行，
+        不阻塞事件循环。
+        """
+        algorithm_module = self._get_algorithm_module(algorithm_code, version)
+        if not algorithm_module:
+            raise Exception(f"算法模块 {algorithm_code} v{version} 未找到")
+
+        batch_spec = self._get_batch_spec(algorithm_code, version)
+        if batch_spec and hasattr(algorithm_module, batch_spec['entry_point']):
+            batch_entry = getattr(algorithm_module, batch_spec['entry_point'])
+            batch_key = self._batch_key(algorithm_code, version, config)
+
+            async def infer(image: np.ndarray):
+                return await self.batcher.submit(
+                    batch_key,
+                    lambda images: batch_entry(images, config),
+                    image,
+                    max_batch_size=batch_spec.get('max_batch_size'),
+                    max_wait_ms=batch_spec.get('max_wait_ms')
+                )
+            return infer
+
+        entry = getattr(algorithm_module, 'detect', None) or getattr(algorithm_module, 'process', None)
+        if entry is None:
+            raise Exception(f"算法模块 {algorithm_code} 缺少detect或process方法")
+
+        async def infer(image: np.ndarray):
+            return await asyncio.to_thread(entry, image, config)
+        return infer
+
+    @staticmethod
+    def _batch_key(algorithm_code: str, version: str, config: Dict[str, Any]) -> str:
+        """微批处理键：同一算法版本下配置不同的服务各自成批，互不使用对方的参数"""
+        digest = hashlib.sha1(
+            json.dumps(config or {}, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()[:12]
+        return f"{algorithm_code}:{version}:{digest}"
+
+    def _get_batch_spec(self, algorithm_code: str, version: str) -> Optional[Dict[str, Any]]:
+        """读取algorithm.json中的批处理声明
+        
+        算法包可声明可选的批量入口，例如:
+        "batch": {"entry_point": "process_batch", "max_batch_size": 8, "max_wait_ms": 20}
+        
+        按文件修改时间缓存，算法包未更新时不再重复读取。
+        """
+        spec_path = self._get_algorithm_path(algorithm_code, version) / "algorithm.json"
+        try:
+            mtime = spec_path.stat().st_mtime
+        except OSError:
+            self._batch_specs.pop(spec_path, None)
+            return None
+        
+        cached = self._batch_specs.get(spec_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        batch_spec = self._load_batch_spec(spec_path)
+        self._batch_specs[spec_path] = (mtime, batch_spec)
+        return batch_spec
+    
+    def _load_batch_spec(self, spec_path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(spec_path, 'r', encoding='utf-8') as f:
+                batch_spec = json.load(f).get('batch')
+        except Exception as e:
+            logger.warning(f"读取算法包声明失败 {spec_path}: {str(e)}")
+            return None
+        
+        if not batch_spec:
+            return None
+        if batch_spec is True:
+            batch_spec = {}
+        return {
+            'entry_point': batch_spec.get('entry_point', 'process_batch'),
+            'max_batch_size': batch_spec.get('max_batch_size'),
+            'max_wait_ms': batch_spec.get('max_wait_ms')
+        }
+    
+    def _get_algorithm_path(self, algorithm_code: str, version: str) -> Path:
+        """获取算法包目录，优先使用本地缓存"""
+        if self.package_cache:
+            cached_path = self.package_cache.get_package_path(algorithm_code, version)
+            if cached_path:
+                return cached_path
+        return self.algorithms_dir / algorithm_code / version
+    
     def _get_algorithm_module(self, algorithm_code: str, version: str):
         """获取算法模块"""
         try:
-            algorithm_path = self.algorithms_dir / algorithm_code / version
+            algorithm_path = self._get_algorithm_path(algorithm_code, version)
             
             if not algorithm_path.exists():
                 logger.warning(f"算法路径不存在: {algorithm_path}")
@@ -9,10 +9,14 @@ from routers import diagnosis_rabbitmq as diagnosis
 from database import init_db
 from config import settings
 from utils.camera_monitor import camera_monitor
-from tasks import start_metrics_collection, stop_metrics_collection
+from utils.camera_events import camera_status_broadcaster
+from tasks import start_metrics_collection, stop_metrics_collection, start_data_retention, stop_data_retention
 from ai_service_monitor import AIServiceMonitor
 from middleware.dependency_logging_middleware import DependencyLoggingMiddleware
 from middleware.logging_middleware import SystemLoggingMiddleware
+from middleware.audit_log_writer import audit_log_writer
+from notification_dispatcher import notification_dispatcher
+from utils.cache import stats_cache
 
 # 导入RabbitMQ相关组件
 from diagnosis.rabbitmq_scheduler import RabbitMQTaskScheduler
@@ -72,6 +76,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"系统指标收集器启动失败: {e}")
     
+    # 启动数据保留管理器（提前创建分区、按保留策略删除过期分区）
+    try:
+        asyncio.create_task(start_data_retention())
+        print("数据保留管理器已启动")
+    except Exception as e:
+        print(f"数据保留管理器启动失败: {e}")
+    
     yield
     
     # 关闭时的清理工作
@@ -99,6 +110,35 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"系统指标收集器关闭失败: {e}")
     
+    try:
+        await stop_data_retention()
+        print("数据保留管理器已关闭")
+    except Exception as e:
+        print(f"数据保留管理器关闭失败: {e}")
+    
+    try:
+        await camera_monitor.close()
+        await camera_status_broadcaster.close()
+    except Exception as e:
+        print(f"摄像头监控器关闭失败: {e}")
+    
+    try:
+        await notification_dispatcher.stop()
+        print("通知调度器已关闭")
+    except Exception as e:
+        print(f"通知调度器关闭失败: {e}")
+    
+    try:
+        await audit_log_writer.stop()
+        print("审计日志写入器已关闭")
+    except Exception as e:
+        print(f"审计日志写入器关闭失败: {e}")
+    
+    try:
+        await stats_cache.close()
+    except Exception as e:
+        print(f"统计缓存关闭失败: {e}")
+    
     try:
         await task_queue_manager.close()
         print("RabbitMQ连接已关闭")
@@ -110,8 +150,8 @@ async def periodic_camera_monitor():
     while True:
         try:
             await camera_monitor.monitor_all_cameras()
-            # 每30秒检查一次摄像头状态
-            await asyncio.sleep(30)
+            # 每个摄像头按自适应间隔探测，这里按最短复查间隔轮询到期的摄像头
+            await asyncio.sleep(camera_monitor.min_interval)
         except Exception as e:
             print(f"Camera monitor error: {e}")
             # 出错时等待60秒再重试
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from .logging_config import logging_config
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """请求审计日志批量写入器
+
+    中间件只把日志行放入有界内存队列（同步、不阻塞请求），后台任务攒够
+    batch_size 条或距离上次写入超过 flush_interval 毫秒时，用一条批量INSERT写入
+    system_logs。队列过载时的处理:
+    - 超过高水位（sample_watermark × max_queue_size）: info日志按 1/sample_rate 采样
+    - 队列已满: 新日志直接丢弃
+    error日志不参与采样，只在队列已满时丢弃。应用关闭时 stop() 会写完队列中的剩余日志。
+    """
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200,
+                 flush_interval_ms: float = 1000, sample_watermark: float = 0.8,
+                 sample_rate: int = 10):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.sample_watermark = sample_watermark
+        self.sample_rate = max(1, sample_rate)
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sample_counter = 0
+        self.is_running = False
+
+        # 统计
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_ms: Optional[float] = None
+
+    def start(self):
+        """启动后台写入任务（首次入队时自动调用）"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"审计日志批量写入器已启动 - 队列上限: {self.max_queue_size}, "
+                    f"批量: {self.batch_size}, 间隔: {self.flush_interval * 1000:.0f}ms")
+
+    async def stop(self):
+        """停止后台任务并写入队列中的剩余日志"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._wakeup:
+            self._wakeup.set()
+        if self._task:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"审计日志写入任务异常退出: {e}")
+            self._task = None
+        while self._queue:
+            await self._flush()
+        logger.info(f"审计日志批量写入器已停止 - 累计写入: {self.written}, 丢弃: {self.dropped}, "
+                    f"采样丢弃: {self.sampled_out}")
+
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """放入一条日志（SystemLog 列名到值的字典），返回是否被接收"""
+        if not self.is_running:
+            self.start()
+
+        depth = len(self._queue)
+        if depth >= self.max_queue_size:
+            self.dropped += 1
+            return False
+
+        if row.get('level') != 'error' and depth >= self.max_queue_size * self.sample_watermark:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.sampled_out += 1
+                return False
+
+        self._queue.append(row)
+        self.enqueued += 1
+        depth += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._queue:
+                await self._flush()
+                # 积压未达到一个批次时等下一个周期，避免小批量频繁写入
+                if len(self._queue) < self.batch_size:
+                    break
+
+    async def _flush(self):
+        """取出至多一个批次的日志并批量写入"""
+        batch: List[Dict[str, Any]] = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        if not batch:
+            return
+
+        from models.system import SystemLog
+
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(SystemLog), batch)
+                await session.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"批量写入审计日志失败（{len(batch)} 条已丢弃）: {e}")
+        finally:
+            self.flushes += 1
+            self.last_flush_at = time.time()
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def get_stats(self) -> Dict[str, Any]:
+        """队列深度与写入统计"""
+        return {
+            'running': self.is_running,
+            'queue_depth': len(self._queue),
+            'max_queue_depth': self.max_depth,
+            'max_queue_size': self.max_queue_size,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_ms': self.last_flush_ms,
+        }
+
+
+# 全局审计日志写入器实例
+audit_log_writer = AuditLogWriter(
+    max_queue_size=logging_config.db_log_queue_size,
+    batch_size=logging_config.db_log_batch_size,
+    flush_interval_ms=logging_config.db_log_flush_interval_ms,
+    sample_watermark=logging_config.db_log_sample_watermark,
+    sample_rate=logging_config.db_log_sample_rate
+)
@@ -1,8 +1,26 @@
+import asyncio
+import json
 import logging
 import logging.handlers
 import os
+import random
+import re
+import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 高频接口的默认采样率（路径前缀，* 匹配一个路径段），可通过系统配置 log.sampling.route_rates 覆盖
+DEFAULT_ROUTE_SAMPLE_RATES = {
+    "/api/v1/messages/unread-count": 0.05,
+    "/api/v1/event-tasks/worker/tasks/*/heartbeat": 0.01,
+    "/api/v1/diagnosis/worker/heartbeat": 0.01,
+    "/api/v1/dashboard": 0.1,
+}
+
+# 运行时可调整的采样配置项（SystemConfig.key）
+SAMPLING_CONFIG_PREFIX = "log.sampling."
 
 # 日志配置类
 class LoggingConfig:
@@ -24,6 +42,29 @@ class LoggingConfig:
         self.slow_request_threshold = float(os.getenv("SLOW_REQUEST_THRESHOLD", "1000"))  # 毫秒
         self.very_slow_request_threshold = float(os.getenv("VERY_SLOW_REQUEST_THRESHOLD", "5000"))  # 毫秒
         
+        # 数据库日志批量写入配置
+        self.db_log_queue_size = int(os.getenv("DB_LOG_QUEUE_SIZE", "10000"))
+        self.db_log_batch_size = int(os.getenv("DB_LOG_BATCH_SIZE", "200"))
+        self.db_log_flush_interval_ms = float(os.getenv("DB_LOG_FLUSH_INTERVAL_MS", "1000"))
+        self.db_log_sample_watermark = float(os.getenv("DB_LOG_SAMPLE_WATERMARK", "0.8"))  # 队列占用比例
+        self.db_log_sample_rate = int(os.getenv("DB_LOG_SAMPLE_RATE", "10"))  # 超过水位后每N条保留1条
+        
+        # 采样与限流配置（运行时从系统配置刷新，见 refresh_sampling_policy）
+        self.default_sample_rate = float(os.getenv("LOG_DEFAULT_SAMPLE_RATE", "1.0"))
+        self.client_rate_limit = int(os.getenv("LOG_CLIENT_RATE_LIMIT", "600"))  # 每个用户/IP每分钟最多记录条数，0为不限制
+        self.sampling_refresh_interval = float(os.getenv("LOG_SAMPLING_REFRESH_INTERVAL", "30"))  # 秒
+        self._env_sampling_defaults = {
+            "default_rate": self.default_sample_rate,
+            "client_rate_limit": self.client_rate_limit,
+        }
+        self.route_sample_rates: Dict[str, float] = dict(DEFAULT_ROUTE_SAMPLE_RATES)
+        self._compiled_route_rates: List[Tuple[Pattern, float]] = self._compile_route_rates(self.route_sample_rates)
+        self._last_policy_refresh = 0.0
+        self._policy_refreshing = False
+        self._rate_window_start = 0.0
+        self._client_counts: Dict[str, int] = {}
+        self.sampling_stats = {"sampled_out": 0, "rate_limited": 0, "always_logged": 0}
+        
         # 排除路径配置
         self.excluded_paths = [
             "/docs", "/redoc", "/openapi.json", "/favicon.ico",
@@ -82,6 +123,103 @@ class LoggingConfig:
         
         return True
     
+    @staticmethod
+    def _compile_route_rates(route_rates: Dict[str, float]) -> List[Tuple[Pattern, float]]:
+        """将路径前缀编译为正则，按长度倒序排列，匹配时取最具体的规则"""
+        compiled = []
+        for prefix in sorted(route_rates, key=len, reverse=True):
+            pattern = re.compile("^" + re.escape(prefix).replace(r"\*", "[^/]+"))
+            compiled.append((pattern, max(0.0, min(1.0, float(route_rates[prefix])))))
+        return compiled
+    
+    def get_route_sample_rate(self, path: str) -> float:
+        """获取路径的采样率"""
+        for pattern, rate in self._compiled_route_rates:
+            if pattern.match(path):
+                return rate
+        return self.default_sample_rate
+    
+    def _allow_client(self, client_key: str) -> bool:
+        """按用户/IP的每分钟记录上限（固定窗口计数）"""
+        now = time.monotonic()
+        if now - self._rate_window_start >= 60:
+            self._rate_window_start = now
+            self._client_counts.clear()
+        count = self._client_counts.get(client_key, 0)
+        if count >= self.client_rate_limit:
+            return False
+        self._client_counts[client_key] = count + 1
+        return True
+    
+    def should_persist_request(self, path: str, status_code: int, response_time: float,
+                               client_key: Optional[str] = None) -> bool:
+        """请求完成后判断是否写入数据库日志
+        
+        - 错误响应（状态码>=400）和慢请求（性能级别非NORMAL）总是记录
+        - 其他请求按路径采样率采样，再按用户/IP的每分钟上限限流
+        """
+        if status_code >= 400 or self.get_performance_level(response_time) != "NORMAL":
+            self.sampling_stats["always_logged"] += 1
+            return True
+        
+        rate = self.get_route_sample_rate(path)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampling_stats["sampled_out"] += 1
+            return False
+        
+        if self.client_rate_limit > 0 and client_key and not self._allow_client(client_key):
+            self.sampling_stats["rate_limited"] += 1
+            return False
+        
+        return True
+    
+    def apply_sampling_policy(self, values: Dict[str, str]):
+        """应用系统配置中的采样参数（键为去掉 log.sampling. 前缀的配置名），未配置的项恢复为环境变量默认值"""
+        try:
+            default_rate = float(values.get("default_rate", self._env_sampling_defaults["default_rate"]))
+            client_rate_limit = int(values.get("client_rate_limit", self._env_sampling_defaults["client_rate_limit"]))
+            route_rates = dict(DEFAULT_ROUTE_SAMPLE_RATES)
+            route_rates.update(json.loads(values.get("route_rates") or "{}"))
+            compiled = self._compile_route_rates(route_rates)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"日志采样配置无效，保留原配置: {e}")
+            return
+        
+        self.default_sample_rate = max(0.0, min(1.0, default_rate))
+        self.client_rate_limit = client_rate_limit
+        self.route_sample_rates = route_rates
+        self._compiled_route_rates = compiled
+    
+    async def refresh_sampling_policy(self):
+        """从系统配置表加载 log.sampling.* 配置"""
+        from sqlalchemy import select
+        from database import AsyncSessionLocal
+        from models.system import SystemConfig
+        
+        self._policy_refreshing = True
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(SystemConfig.key, SystemConfig.value)
+                    .where(SystemConfig.key.like(f"{SAMPLING_CONFIG_PREFIX}%"))
+                )
+                values = {key[len(SAMPLING_CONFIG_PREFIX):]: value for key, value in result.all()}
+            self.apply_sampling_policy(values)
+        except Exception as e:
+            logger.warning(f"加载日志采样配置失败: {e}")
+        finally:
+            self._last_policy_refresh = time.monotonic()
+            self._policy_refreshing = False
+    
+    def maybe_refresh_sampling_policy(self):
+        """超过刷新间隔时在后台刷新采样配置（不阻塞请求）"""
+        if self._policy_refreshing:
+            return
+        if time.monotonic() - self._last_policy_refresh < self.sampling_refresh_interval:
+            return
+        self._policy_refreshing = True
+        asyncio.create_task(self.refresh_sampling_policy())
+    
     def filter_sensitive_data(self, headers: Dict[str, str]) -> Dict[str, str]:
         """过滤敏感信息"""
         filtered_headers = {}
@@ -110,6 +248,14 @@ class LoggingConfig:
             "log_level": self.log_level,
             "slow_request_threshold": self.slow_request_threshold,
             "very_slow_request_threshold": self.very_slow_request_threshold,
+            "db_log_queue_size": self.db_log_queue_size,
+            "db_log_batch_size": self.db_log_batch_size,
+            "db_log_flush_interval_ms": self.db_log_flush_interval_ms,
+            "db_log_sample_watermark": self.db_log_sample_watermark,
+            "db_log_sample_rate": self.db_log_sample_rate,
+            "default_sample_rate": self.default_sample_rate,
+            "route_sample_rates": self.route_sample_rates,
+            "client_rate_limit": self.client_rate_limit,
             "excluded_paths": self.excluded_paths
         }
 
@@ -1,15 +1,16 @@
-import asyncio
 import time
 import uuid
 import re
 import json
 import logging
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request as StarletteRequest
 from .logging_config import LoggingConfig, logging_config
-from database import AsyncSessionLocal
+from .audit_log_writer import audit_log_writer
 
 # 配置日志
 logger = logging.getLogger()
@@ -110,14 +111,94 @@ API_ROUTE_MAPPING = {
     }
 }
 
+# 路径参数段（如 ([0-9]+)）在路由树中的匹配规则
+_PARAM_SEGMENTS = {'([0-9]+)'}
+_LITERAL_SEGMENT = re.compile(r'[\w\-]+')
+
+
+class _RouteNode:
+    """路由树节点"""
+    __slots__ = ('children', 'param', 'config', 'optional_slash')
+
+    def __init__(self):
+        self.children: Dict[str, '_RouteNode'] = {}
+        self.param: Optional['_RouteNode'] = None
+        self.config = None
+        self.optional_slash = False
+
+
+def _compile_route_tree(mapping: Dict[str, Any]) -> _RouteNode:
+    """启动时将 API_ROUTE_MAPPING 的正则编译为按路径段匹配的前缀树
+
+    支持的模式形如 ^/a/b/([0-9]+)/c/?$：字面量路径段、数字参数段和可选的结尾斜杠。
+    同一路径上字面量段优先于参数段；无法编译的模式直接报错，避免静默漏匹配。
+    """
+    root = _RouteNode()
+    for pattern, config in mapping.items():
+        if not (pattern.startswith('^/') and pattern.endswith('$')):
+            raise ValueError(f"不支持的路由模式: {pattern}")
+        body = pattern[1:-1]
+        optional_slash = body.endswith('/?')
+        if optional_slash:
+            body = body[:-2]
+
+        node = root
+        for segment in body.strip('/').split('/'):
+            if segment in _PARAM_SEGMENTS:
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            elif _LITERAL_SEGMENT.fullmatch(segment):
+                node = node.children.setdefault(segment, _RouteNode())
+            else:
+                raise ValueError(f"不支持的路由模式: {pattern}")
+
+        # 与原先按字典顺序匹配一致，重复的模式以先出现的为准
+        if node.config is None:
+            node.config = config
+            node.optional_slash = optional_slash
+    return root
+
+
+_ROUTE_TREE = _compile_route_tree(API_ROUTE_MAPPING)
+
+
+def _find_route_node(node: _RouteNode, segments, index: int) -> Optional[_RouteNode]:
+    if index == len(segments):
+        return node if node.config is not None else None
+    segment = segments[index]
+    child = node.children.get(segment)
+    if child is not None:
+        found = _find_route_node(child, segments, index + 1)
+        if found is not None:
+            return found
+    if node.param is not None and segment.isdigit():
+        return _find_route_node(node.param, segments, index + 1)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _match_route(path: str):
+    """按具体路径查找路由配置（LRU缓存最近访问的具体路径）"""
+    if not path.startswith('/'):
+        return None
+    trailing_slash = len(path) > 1 and path.endswith('/')
+    segments = (path[1:-1] if trailing_slash else path[1:]).split('/')
+    node = _find_route_node(_ROUTE_TREE, segments, 0)
+    if node is None or (trailing_slash and not node.optional_slash):
+        return None
+    return node.config
+
+
 def get_route_info(path: str, method: str) -> Optional[Dict[str, str]]:
     """根据路径和方法获取路由信息"""
-    for pattern, config in API_ROUTE_MAPPING.items():
-        if re.match(pattern, path):
-            if isinstance(config, dict) and method in config:
-                return config[method]
-            elif isinstance(config, dict) and 'module' in config:
-                return config
+    config = _match_route(path)
+    if config is None:
+        return None
+    if method in config:
+        return config[method]
+    if 'module' in config:
+        return config
     return None
 
 class SystemLoggingMiddleware(BaseHTTPMiddleware):
@@ -150,6 +231,32 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
         
         return "unknown"
     
+    async def _resolve_user(self, request: Request):
+        """获取请求的用户ID和用户名
+        
+        端点依赖get_current_user时用户已写入request.state，直接复用；
+        否则从Bearer token解析（走认证缓存）。
+        """
+        user_id = getattr(request.state, 'user_id', None)
+        username = getattr(request.state, 'username', None)
+        if user_id is not None:
+            return user_id, username
+        
+        try:
+            from routers.auth import get_current_user_from_token
+            auth_header = request.headers.get("authorization")
+            if auth_header and auth_header.startswith("Bearer "):
+                token = auth_header.split(" ")[1]
+                user = await get_current_user_from_token(token)
+                if user:
+                    # 设置到request.state供其他地方使用
+                    request.state.user_id = user.id
+                    request.state.username = user.username
+                    return user.id, user.username
+        except Exception as e:
+            logger.debug(f"Failed to get user from token: {e}")
+        return None, None
+    
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
         request_id = str(uuid.uuid4())
@@ -158,6 +265,9 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
         if not self.config.should_log_request(request.url.path, request.method):
             return await call_next(request)
         
+        # 采样配置过期时在后台从系统配置刷新
+        self.config.maybe_refresh_sampling_policy()
+        
         # 获取客户端信息
         client_ip = self._get_client_ip(request)
         user_agent = request.headers.get("user-agent", "")
@@ -178,28 +288,16 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
         logger.debug(f"请求参数: {request_params}")
         logger.debug(f"条件判断: request_params={bool(request_params and len(request_params) > 0)}, request_body={bool(request_body)}")
         
-        # 获取用户信息（从JWT token）
         user_id = None
         username = None
-        try:
-            from routers.auth import get_current_user_from_token
-            auth_header = request.headers.get("authorization")
-            if auth_header and auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-                user = await get_current_user_from_token(token)
-                if user:
-                    user_id = user.id
-                    username = user.username
-                    # 设置到request.state供其他地方使用
-                    request.state.user_id = user_id
-                    request.state.username = username
-        except Exception as e:
-            logger.debug(f"Failed to get user from token: {e}")
         
         try:
             # 处理请求
             response = await call_next(request)
             
+            # 获取用户信息（优先使用get_current_user已解析的用户）
+            user_id, username = await self._resolve_user(request)
+            
             # 在请求处理完成后获取已解析的请求体
             if hasattr(request.state, 'parsed_body'):
                 request_body = request.state.parsed_body
@@ -224,23 +322,24 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
             else:
                 logger.info(log_message)
             
-            # 异步记录到数据库
-            if self.enable_db_logging:
-                asyncio.create_task(
-                    self._log_to_database(
-                        request_id=request_id,
-                        method=request.method,
-                        url=str(request.url),
-                        status_code=response.status_code,
-                        response_time=process_time,
-                        client_ip=client_ip,
-                        user_agent=user_agent,
-                        user_id=user_id,
-                        username=username,
-                        route_info=route_info,
-                        request_params=request_params,
-                        request_body=request_body
-                    )
+            # 按采样策略决定是否入库（错误和慢请求总是记录），放入批量写入队列（不阻塞响应）
+            client_key = f"user:{user_id}" if user_id is not None else f"ip:{client_ip}"
+            if self.enable_db_logging and self.config.should_persist_request(
+                request.url.path, response.status_code, process_time, client_key
+            ):
+                self._log_to_database(
+                    request_id=request_id,
+                    method=request.method,
+                    url=str(request.url),
+                    status_code=response.status_code,
+                    response_time=process_time,
+                    client_ip=client_ip,
+                    user_agent=user_agent,
+                    user_id=user_id,
+                    username=username,
+                    route_info=route_info,
+                    request_params=request_params,
+                    request_body=request_body
                 )
             
             return response
@@ -248,6 +347,7 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
         except Exception as e:
             # 计算响应时间
             process_time = (time.time() - start_time) * 1000
+            user_id, username = await self._resolve_user(request)
             
             # 记录错误日志
             logger.error(
@@ -258,91 +358,74 @@ class SystemLoggingMiddleware(BaseHTTPMiddleware):
                 f"RequestID: {request_id}"
             )
             
-            # 异步记录错误到数据库
+            # 错误日志同样走批量写入队列
             if self.enable_db_logging:
-                asyncio.create_task(
-                    self._log_error_to_database(
-                        request_id=request_id,
-                        method=request.method,
-                        url=str(request.url),
-                        error_message=str(e),
-                        response_time=process_time,
-                        client_ip=client_ip,
-                        user_agent=user_agent,
-                        user_id=user_id,
-                        username=username,
-                        route_info=route_info,
-                        request_params=request_params,
-                        request_body=request_body
-                    )
+                self._log_error_to_database(
+                    request_id=request_id,
+                    method=request.method,
+                    url=str(request.url),
+                    error_message=str(e),
+                    response_time=process_time,
+                    client_ip=client_ip,
+                    user_agent=user_agent,
+                    user_id=user_id,
+                    username=username,
+                    route_info=route_info,
+                    request_params=request_params,
+                    request_body=request_body
                 )
             
             raise
     
-    async def _log_to_database(self, **kwargs):
-        """异步记录请求日志到数据库"""
-        try:
-            async with AsyncSessionLocal() as session:
-                from models.system import SystemLog
-                
-                log_entry = SystemLog(
-                    request_id=kwargs['request_id'],
-                    request_method=kwargs['method'],
-                    request_url=kwargs['url'],
-                    response_status=kwargs['status_code'],
-                    response_time=kwargs['response_time'],
-                    ip_address=kwargs['client_ip'],
-                    user_agent=kwargs['user_agent'],
-                    user_id=kwargs.get('user_id'),
-                    username=kwargs.get('username'),
-                    module=kwargs['route_info']['module'] if kwargs['route_info'] else None,
-                    action=kwargs['route_info']['action'] if kwargs['route_info'] else None,
-                    page_function=kwargs['route_info']['function'] if kwargs['route_info'] else None,
-                    level="info",
-                    message=f"{kwargs['method']} {kwargs['url']} - {kwargs['status_code']}",
-                    extra_data={
-                        'request_params': kwargs['request_params'],
-                        'request_body': kwargs['request_body'],
-                        'debug_info': f"params_exist: {bool(kwargs.get('request_params'))}, body_exist: {bool(kwargs.get('request_body'))}"
-                    }
-                )
-                
-                session.add(log_entry)
-                await session.commit()
-                
-        except Exception as e:
-            logger.error(f"Failed to log to database: {e}")
+    @staticmethod
+    def _build_log_row(level: str, status_code: int, message: str, extra_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """构造一条 system_logs 行（所有行的列集合一致，便于批量INSERT）"""
+        route_info = kwargs['route_info']
+        return {
+            'request_id': kwargs['request_id'],
+            'request_method': kwargs['method'],
+            'request_url': kwargs['url'][:500],
+            'response_status': status_code,
+            'response_time': kwargs['response_time'],
+            'ip_address': kwargs['client_ip'],
+            'user_agent': kwargs['user_agent'],
+            'user_id': kwargs.get('user_id'),
+            'username': kwargs.get('username'),
+            'module': route_info['module'] if route_info else None,
+            'action': route_info['action'] if route_info else None,
+            'page_function': route_info['function'] if route_info else None,
+            'level': level,
+            'message': message,
+            'extra_data': extra_data,
+            # 显式写入请求完成时间，批量写入的延迟不影响日志时间和分区归属
+            'created_at': datetime.now(timezone.utc),
+        }
     
-    async def _log_error_to_database(self, **kwargs):
-        """异步记录错误日志到数据库"""
-        try:
-            async with AsyncSessionLocal() as session:
-                from models.system import SystemLog
-                
-                log_entry = SystemLog(
-                    request_id=kwargs['request_id'],
-                    request_method=kwargs['method'],
-                    request_url=kwargs['url'],
-                    response_status=500,  # 错误状态码
-                    response_time=kwargs['response_time'],
-                    ip_address=kwargs['client_ip'],
-                    user_agent=kwargs['user_agent'],
-                    user_id=kwargs.get('user_id'),
-                    username=kwargs.get('username'),
-                    module=kwargs['route_info']['module'] if kwargs['route_info'] else None,
-                    action=kwargs['route_info']['action'] if kwargs['route_info'] else None,
-                    page_function=kwargs['route_info']['function'] if kwargs['route_info'] else None,
-                    level="error",
-                    message=f"{kwargs['method']} {kwargs['url']} - Error: {kwargs['error_message']}",
-                    extra_data={
-                        'request_params': kwargs['request_params'],
-                        'request_body': kwargs['request_body'],
-                        'error_message': kwargs['error_message']
-                    }
-                )
-                
-                session.add(log_entry)
-                await session.commit()
-                
-        except Exception as e:
-            logger.error(f"Failed to log error to database: {e}")
\ No newline at end of file
+    def _log_to_database(self, **kwargs):
+        """将请求日志放入批量写入队列"""
+        status_code = kwargs.pop('status_code')
+        audit_log_writer.enqueue(self._build_log_row(
+            level="info",
+            status_code=status_code,
+            message=f"{kwargs['method']} {kwargs['url']} - {status_code}",
+            extra_data={
+                'request_params': kwargs['request_params'],
+                'request_body': kwargs['request_body'],
+                'debug_info': f"params_exist: {bool(kwargs.get('request_params'))}, body_exist: {bool(kwargs.get('request_body'))}"
+            },
+            **kwargs
+        ))
+    
+    def _log_error_to_database(self, **kwargs):
+        """将错误日志放入批量写入队列"""
+        audit_log_writer.enqueue(self._build_log_row(
+            level="error",
+            status_code=500,  # 错误状态码
+            message=f"{kwargs['method']} {kwargs['url']} - Error: {kwargs['error_message']}",
+            extra_data={
+                'request_params': kwargs['request_params'],
+                'request_body': kwargs['request_body'],
+                'error_message': kwargs['error_message']
+            },
+            **kwargs
+        ))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Enum, Index, Sequence, text
 from sqlalchemy.sql import func
 from database import Base
 import enum
@@ -168,8 +168,17 @@ class NotificationLog(Base):
 
 class DiagnosisResult(Base):
     __tablename__ = "diagnosis_results"
-    
-    id = Column(Integer, primary_key=True, index=True)
+    # 与诊断结果列表筛选条件匹配的复合索引，末尾的 (created_at, id) 支持排序和游标分页
+    __table_args__ = (
+        Index('ix_diagnosis_results_created_at_id', 'created_at', 'id'),
+        Index('ix_diagnosis_results_task_id_created_at', 'task_id', 'created_at', 'id'),
+        Index('ix_diagnosis_results_status_created_at', 'diagnosis_status', 'created_at', 'id'),
+        # 按月范围分区，分区由 utils.partitioning 提前创建并按保留策略整体删除
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    
+    # 分区表的主键必须包含分区键；复合主键不会自动使用SERIAL，id 由显式序列生成（SQLite等不支持序列的库忽略）
+    id = Column(Integer, Sequence('diagnosis_results_id_seq'), primary_key=True, index=True)
     task_id = Column(Integer, nullable=False, comment="诊断任务ID")
     camera_id = Column(Integer, comment="摄像头ID")
     camera_name = Column(String(100), comment="摄像头名称")
@@ -195,13 +204,21 @@ class DiagnosisResult(Base):
     # 检测结果
     result_data = Column(JSON, default=dict, comment="详细结果数据")
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), comment="创建时间")
     
     def __repr__(self):
         return f"<DiagnosisResult(id={self.id}, camera_id={self.camera_id}, type='{self.diagnosis_type}', status='{self.diagnosis_status}')>"
 
 class DiagnosisAlarm(Base):
     __tablename__ = "diagnosis_alarms"
+    __table_args__ = (
+        Index('ix_diagnosis_alarms_created_at_id', 'created_at', 'id'),
+        Index('ix_diagnosis_alarms_severity_created_at', 'severity', 'created_at', 'id'),
+        # 未确认告警是最常用的筛选，部分索引只包含未确认的行
+        Index('ix_diagnosis_alarms_unacknowledged', 'created_at', 'id',
+              postgresql_where=text('is_acknowledged = false'),
+              sqlite_where=text('is_acknowledged = 0')),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     result_id = Column(Integer, nullable=False, comment="诊断结果ID")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Text, JSON, Float, Enum, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from database import Base
 import enum
@@ -35,6 +35,13 @@ class EventStatus(enum.Enum):
 
 class Event(Base):
     __tablename__ = "events"
+    # 与事件列表筛选条件匹配的复合索引，末尾的 (created_at, id) 支持排序和游标分页
+    __table_args__ = (
+        Index('ix_events_created_at_id', 'created_at', 'id'),
+        Index('ix_events_status_created_at', 'status', 'created_at', 'id'),
+        Index('ix_events_event_level_created_at', 'event_level', 'created_at', 'id'),
+        Index('ix_events_camera_id_created_at', 'camera_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(String(50), unique=True, index=True, nullable=False, comment="事件唯一标识")
@@ -159,4 +166,23 @@ class EventStatistics(Base):
     avg_response_time = Column(Float, comment="平均响应时间(分钟)")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+class EventDailyStats(Base):
+    """事件按日汇总表（随事件增删改增量维护，可通过脚本从events表重建）"""
+    __tablename__ = "event_daily_stats"
+    __table_args__ = (
+        UniqueConstraint('stat_date', 'event_type', 'event_level', 'status', name='uq_event_daily_stats_bucket'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    stat_date = Column(Date, nullable=False, index=True, comment="统计日期(事件创建日期)")
+
+    # 统计维度（存储枚举名称，与events表中的枚举取值一致）
+    event_type = Column(String(50), nullable=False, comment="事件类型")
+    event_level = Column(String(20), nullable=False, comment="事件级别")
+    status = Column(String(20), nullable=False, comment="事件状态")
+
+    event_count = Column(Integer, nullable=False, default=0, comment="事件数")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -53,6 +53,8 @@ class EventTask(Base):
     # Worker分配
     assigned_worker = Column(String(100), comment="分配的Worker节点ID")
     worker_heartbeat = Column(DateTime(timezone=True), comment="Worker心跳时间")
+    lease_expires_at = Column(DateTime(timezone=True), comment="执行租约到期时间")
+    fencing_token = Column(Integer, default=0, server_default="0", nullable=False, comment="租约令牌(每次领取递增)")
     
     # 执行统计
     total_detections = Column(Integer, default=0, comment="总检测次数")
@@ -87,6 +89,11 @@ class EventTask(Base):
     task_metadata = Column(JSON, default=dict, comment="扩展元数据")
     tags = Column(JSON, default=list, comment="标签列表")
     
+    __table_args__ = (
+        Index('ix_event_tasks_status_lease_expires_at', 'status', 'lease_expires_at'),
+        Index('ix_event_tasks_status_next_retry_at', 'status', 'next_retry_at'),
+    )
+    
     def __repr__(self):
         return f"<EventTask(id={self.id}, task_id='{self.task_id}', name='{self.name}', status='{self.status}')>"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, JSON, Index, Sequence
 from sqlalchemy.sql import func
 from database import Base
 from enum import Enum
@@ -112,8 +112,18 @@ class MessageCenter(Base):
 
 class SystemLog(Base):
     __tablename__ = "system_logs"
-    
-    id = Column(Integer, primary_key=True, index=True)
+    # 与日志列表筛选条件匹配的复合索引，末尾的 (created_at, id) 支持排序和游标分页
+    __table_args__ = (
+        Index('ix_system_logs_created_at_id', 'created_at', 'id'),
+        Index('ix_system_logs_level_created_at', 'level', 'created_at', 'id'),
+        Index('ix_system_logs_module_created_at', 'module', 'created_at', 'id'),
+        Index('ix_system_logs_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # 按月范围分区，分区由 utils.partitioning 提前创建并按保留策略整体删除
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    
+    # 分区表的主键必须包含分区键；复合主键不会自动使用SERIAL，id 由显式序列生成（SQLite等不支持序列的库忽略）
+    id = Column(Integer, Sequence('system_logs_id_seq'), primary_key=True, index=True)
     level = Column(String(20), nullable=False, comment="日志级别")
     module = Column(String(50), comment="模块名称")
     action = Column(String(100), comment="操作动作")
@@ -137,12 +147,17 @@ class SystemLog(Base):
     response_status = Column(Integer, comment="响应状态码")
     response_time = Column(Float, comment="响应时间(ms)")
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), comment="创建时间")
 
 class SystemMetrics(Base):
     __tablename__ = "system_metrics"
+    # 按天范围分区，分区由 utils.partitioning 提前创建并按保留策略整体删除
+    __table_args__ = (
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    # 分区表的主键必须包含分区键；复合主键不会自动使用SERIAL，id 由显式序列生成（SQLite等不支持序列的库忽略）
+    id = Column(Integer, Sequence('system_metrics_id_seq'), primary_key=True, index=True)
     metric_name = Column(String(100), nullable=False, comment="指标名称")
     metric_value = Column(Float, nullable=False, comment="指标值")
     metric_unit = Column(String(20), comment="指标单位")
@@ -151,7 +166,7 @@ class SystemMetrics(Base):
     dimensions = Column(JSON, default=dict, comment="维度信息")
     
     # 时间信息
-    timestamp = Column(DateTime(timezone=True), nullable=False, comment="时间戳")
+    timestamp = Column(DateTime(timezone=True), primary_key=True, comment="时间戳")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
 
 class License(Base):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -62,6 +62,13 @@ class User(Base):
 class UserMessage(Base):
     """用户消息模型"""
     __tablename__ = "user_messages"
+    __table_args__ = (
+        Index('ix_user_messages_receiver_id_created_at', 'receiver_id', 'created_at', 'id'),
+        # 未读数统计只扫描未读消息
+        Index('ix_user_messages_receiver_id_unread', 'receiver_id',
+              postgresql_where=text('is_read = false'),
+              sqlite_where=text('is_read = 0')),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, comment="消息标题")
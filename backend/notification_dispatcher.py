@@ -0,0 +1,702 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import smtplib
+import ssl
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationError(Exception):
+    """通知发送失败，retryable 为 False 时不再重试（配置错误、4xx等）"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+@dataclass
+class Notification:
+    """一条待发送的告警通知"""
+    title: str
+    content: str
+    rule_id: Optional[int] = None
+    alarm_id: Optional[int] = None
+    recipients: List[str] = field(default_factory=list)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class ChannelConfig:
+    """通知渠道配置快照（与数据库会话解耦，可跨协程长期持有）"""
+    id: int
+    name: str
+    type: str
+    config: Dict[str, Any]
+    is_enabled: bool = True
+
+    @classmethod
+    def from_model(cls, channel) -> "ChannelConfig":
+        return cls(
+            id=channel.id,
+            name=channel.name,
+            type=channel.type,
+            config=dict(channel.config or {}),
+            is_enabled=bool(channel.is_enabled),
+        )
+
+    def option(self, name: str, default: Any) -> Any:
+        """渠道级参数，未配置时使用全局默认值"""
+        value = self.config.get(name)
+        return default if value is None else value
+
+
+class _SafeDict(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def render_template(template: Optional[str], context: Dict[str, Any], default: str) -> str:
+    """按 {字段} 渲染通知模板，未配置模板时使用默认内容，未知字段和无效模板原样保留"""
+    if not template:
+        return default
+    try:
+        return template.format_map(_SafeDict(context))
+    except (ValueError, IndexError, AttributeError):
+        return template
+
+
+def build_digest(items: Sequence[Notification]) -> Tuple[str, str]:
+    """把一批通知合并为一条摘要消息"""
+    if len(items) == 1:
+        return items[0].title, items[0].content
+    title = f"{items[0].title} 等{len(items)}条告警"
+    content = "\n\n".join(
+        f"{index}. [{item.created_at.astimezone().strftime('%H:%M:%S')}] {item.title}\n{item.content}"
+        for index, item in enumerate(items, start=1)
+    )
+    return title, content
+
+
+def _recipients(configured: Any, items: Sequence[Notification]) -> List[str]:
+    """渠道配置的接收人（列表或逗号分隔字符串）与通知自带接收人的并集"""
+    if isinstance(configured, str):
+        configured = [value.strip() for value in configured.split(',')]
+    result = []
+    for value in list(configured or []) + [r for item in items for r in item.recipients]:
+        if value and value not in result:
+            result.append(value)
+    return result
+
+
+class TokenBucket:
+    """令牌桶限速，rate_per_minute 为持续速率，burst 为允许的突发条数"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = float(rate_per_minute) / 60.0
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """取一个令牌，不足时等待（速率为0表示不限速）"""
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class BaseSender:
+    """渠道发送器，每个渠道一个实例，HTTP类渠道共享调度器的连接池"""
+
+    def __init__(self, channel: ChannelConfig, http: httpx.AsyncClient):
+        self.channel = channel
+        self.config = channel.config
+        self.http = http
+
+    async def send(self, title: str, content: str, items: Sequence[Notification]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def _check_response(response: httpx.Response):
+        if response.status_code == 429 or response.status_code >= 500:
+            raise NotificationError(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise NotificationError(f"HTTP {response.status_code}: {response.text[:200]}", retryable=False)
+
+    def _require(self, *names: str):
+        missing = [name for name in names if not self.config.get(name)]
+        if missing:
+            raise NotificationError(f"{self.channel.type}渠道缺少配置: {', '.join(missing)}", retryable=False)
+
+
+class WebhookSender(BaseSender):
+    """通用Webhook: POST/PUT 发送JSON，GET 以查询参数发送标题和内容"""
+
+    async def send(self, title, content, items):
+        self._require('url')
+        method = str(self.config.get('method') or 'POST').upper()
+        headers = self.config.get('headers') or None
+        if method == 'GET':
+            response = await self.http.get(self.config['url'], params={'title': title, 'content': content},
+                                           headers=headers)
+        else:
+            payload = {
+                'title': title,
+                'content': content,
+                'count': len(items),
+                'items': [
+                    {
+                        'title': item.title,
+                        'content': item.content,
+                        'rule_id': item.rule_id,
+                        'alarm_id': item.alarm_id,
+                        'created_at': item.created_at.isoformat(),
+                    }
+                    for item in items
+                ],
+            }
+            response = await self.http.request(method, self.config['url'], json=payload, headers=headers)
+        self._check_response(response)
+
+
+class DingTalkSender(BaseSender):
+    """钉钉群机器人（加签方式）"""
+
+    # 发送过于频繁
+    RETRYABLE_ERRCODES = {130101}
+
+    async def send(self, title, content, items):
+        self._require('webhook_url')
+        params = {}
+        secret = self.config.get('secret')
+        if secret:
+            timestamp = str(int(time.time() * 1000))
+            digest = hmac.new(secret.encode(), f"{timestamp}\n{secret}".encode(), hashlib.sha256).digest()
+            params = {'timestamp': timestamp, 'sign': base64.b64encode(digest).decode()}
+        payload = {
+            'msgtype': 'markdown',
+            'markdown': {'title': title, 'text': f"### {title}\n\n{content}"},
+            'at': {
+                'atMobiles': self.config.get('at_mobiles') or [],
+                'isAtAll': bool(self.config.get('at_all', False)),
+            },
+        }
+        response = await self.http.post(self.config['webhook_url'], params=params, json=payload)
+        self._check_response(response)
+        data = response.json()
+        if data.get('errcode', 0) != 0:
+            raise NotificationError(f"钉钉返回错误 {data.get('errcode')}: {data.get('errmsg')}",
+                                    retryable=data.get('errcode') in self.RETRYABLE_ERRCODES)
+
+
+class WeChatSender(BaseSender):
+    """企业微信应用消息，access_token 在过期前复用"""
+
+    # access_token 无效或过期
+    TOKEN_ERRCODES = {40014, 42001}
+
+    def __init__(self, channel, http):
+        super().__init__(channel, http)
+        self.api_base = str(self.config.get('api_base') or 'https://qyapi.weixin.qq.com').rstrip('/')
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+
+    async def _access_token(self, refresh: bool = False) -> str:
+        if self._token and not refresh and time.monotonic() < self._token_expires_at:
+            return self._token
+        response = await self.http.get(
+            f"{self.api_base}/cgi-bin/gettoken",
+            params={'corpid': self.config['corp_id'], 'corpsecret': self.config['corp_secret']}
+        )
+        self._check_response(response)
+        data = response.json()
+        if data.get('errcode', 0) != 0:
+            raise NotificationError(f"企业微信获取token失败: {data.get('errmsg')}", retryable=False)
+        self._token = data['access_token']
+        # 提前5分钟刷新
+        self._token_expires_at = time.monotonic() + int(data.get('expires_in', 7200)) - 300
+        return self._token
+
+    async def send(self, title, content, items):
+        self._require('corp_id', 'corp_secret', 'agent_id')
+        payload = {
+            'touser': self.config.get('to_user') or '@all',
+            'msgtype': 'text',
+            'agentid': self.config['agent_id'],
+            'text': {'content': f"{title}\n\n{content}"},
+        }
+        for refresh in (False, True):
+            response = await self.http.post(
+                f"{self.api_base}/cgi-bin/message/send",
+                params={'access_token': await self._access_token(refresh)},
+                json=payload
+            )
+            self._check_response(response)
+            data = response.json()
+            if data.get('errcode', 0) in self.TOKEN_ERRCODES and not refresh:
+                continue
+            if data.get('errcode', 0) != 0:
+                raise NotificationError(f"企业微信返回错误 {data.get('errcode')}: {data.get('errmsg')}")
+            return
+
+
+class SmsSender(BaseSender):
+    """短信网关: 向 api_url 发送JSON，请求以 api_secret 做 HMAC-SHA256 签名"""
+
+    async def send(self, title, content, items):
+        self._require('api_url', 'api_key', 'api_secret')
+        phone_numbers = _recipients(self.config.get('phone_numbers'), items)
+        if not phone_numbers:
+            raise NotificationError("短信渠道没有接收号码", retryable=False)
+        body = json.dumps({
+            'phone_numbers': phone_numbers,
+            'sign_name': self.config.get('sign_name'),
+            'template_code': self.config.get('template_code'),
+            'content': f"{title}\n{content}"[:int(self.config.get('max_length', 500))],
+        }, ensure_ascii=False).encode()
+        timestamp = str(int(time.time()))
+        signature = hmac.new(self.config['api_secret'].encode(), timestamp.encode() + body, hashlib.sha256).hexdigest()
+        response = await self.http.post(self.config['api_url'], content=body, headers={
+            'Content-Type': 'application/json',
+            'X-Api-Key': self.config['api_key'],
+            'X-Timestamp': timestamp,
+            'X-Signature': signature,
+        })
+        self._check_response(response)
+
+
+class EmailSender(BaseSender):
+    """SMTP邮件，连接在多次发送间复用，被服务器关闭时自动重连
+
+    smtplib 是阻塞接口，发送在线程池中执行；同一渠道的发送由渠道协程串行调用，
+    不会并发使用同一连接。
+    """
+
+    def __init__(self, channel, http):
+        super().__init__(channel, http)
+        self._smtp: Optional[smtplib.SMTP] = None
+        self.connections = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        host = self.config['smtp_server']
+        port = int(self.config.get('smtp_port') or 25)
+        timeout = settings.NOTIFICATION_HTTP_TIMEOUT
+        if self.config.get('use_ssl') or port == 465:
+            smtp = smtplib.SMTP_SSL(host, port, timeout=timeout, context=ssl.create_default_context())
+            smtp.ehlo()
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=timeout)
+            smtp.ehlo()
+            if self.config.get('use_tls', True) and smtp.has_extn('starttls'):
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+        if self.config.get('username') and self.config.get('password') and smtp.has_extn('auth'):
+            smtp.login(self.config['username'], self.config['password'])
+        self.connections += 1
+        return smtp
+
+    def _close_sync(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send_sync(self, message: EmailMessage, recipients: List[str]):
+        for attempt in range(2):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(message, to_addrs=recipients)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # 空闲连接被服务器关闭，重连后再发一次
+                self._smtp = None
+                if attempt:
+                    raise
+
+    async def send(self, title, content, items):
+        self._require('smtp_server')
+        recipients = _recipients(self.config.get('recipients'), items)
+        if not recipients:
+            raise NotificationError("邮件渠道没有收件人", retryable=False)
+        message = EmailMessage()
+        message['Subject'] = title
+        message['From'] = self.config.get('from_addr') or self.config.get('username')
+        message['To'] = ', '.join(recipients)
+        message['Date'] = formatdate(localtime=True)
+        message['Message-ID'] = make_msgid()
+        message.set_content(content)
+        try:
+            await asyncio.to_thread(self._send_sync, message, recipients)
+        except smtplib.SMTPResponseException as e:
+            await asyncio.to_thread(self._close_sync)
+            raise NotificationError(f"SMTP {e.smtp_code}: {e.smtp_error!r}", retryable=400 <= e.smtp_code < 500)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise NotificationError(f"收件人被拒绝: {list(e.recipients)}", retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            await asyncio.to_thread(self._close_sync)
+            raise NotificationError(f"SMTP发送失败: {e}")
+
+    async def close(self):
+        await asyncio.to_thread(self._close_sync)
+
+
+SENDERS = {
+    'email': EmailSender,
+    'webhook': WebhookSender,
+    'dingtalk': DingTalkSender,
+    'wechat': WeChatSender,
+    'sms': SmsSender,
+}
+
+
+class ChannelWorker:
+    """单个渠道的发送协程
+
+    通知先进入渠道自己的有界队列；距上次发送不足摘要间隔时继续攒批，到期后把队列中
+    的通知（至多 digest_max_items 条）合并为一条消息，取得令牌桶令牌后发送，失败按
+    指数退避重试。发送期间新到的通知留在队列中进入下一条摘要，慢渠道不影响其他渠道。
+    """
+
+    def __init__(self, channel: ChannelConfig, sender: BaseSender, dispatcher: "NotificationDispatcher"):
+        self.dispatcher = dispatcher
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=int(channel.option('queue_size', settings.NOTIFICATION_QUEUE_SIZE))
+        )
+        self.last_sent_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+        # 已出队、等待摘要间隔或令牌的通知，以及正在发送的批次（停止时不能丢失）
+        self._held: List[Notification] = []
+        self._inflight: Optional[asyncio.Future] = None
+        self.stats = {'queued': 0, 'dropped': 0, 'messages': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+        self.configure(channel, sender)
+
+    def configure(self, channel: ChannelConfig, sender: BaseSender):
+        """应用渠道配置（配置变更时保留队列，只替换发送器和参数）"""
+        self.channel = channel
+        self.sender = sender
+        self.digest_seconds = float(channel.option('digest_seconds', settings.NOTIFICATION_DIGEST_SECONDS))
+        self.max_items = max(1, int(channel.option('digest_max_items', settings.NOTIFICATION_DIGEST_MAX_ITEMS)))
+        self.max_retries = int(channel.option('max_retries', settings.NOTIFICATION_MAX_RETRIES))
+        self.retry_base_delay = float(channel.option('retry_base_delay', settings.NOTIFICATION_RETRY_BASE_DELAY))
+        self.bucket = TokenBucket(
+            channel.option('rate_limit_per_minute', settings.NOTIFICATION_RATE_LIMIT_PER_MINUTE),
+            channel.option('rate_limit_burst', settings.NOTIFICATION_RATE_LIMIT_BURST)
+        )
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def submit(self, notification: Notification) -> bool:
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['queued'] += 1
+        return True
+
+    def _take_batch(self, items: List[Notification]) -> List[Notification]:
+        while len(items) < self.max_items and not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+    async def _run(self):
+        while True:
+            self._held = [await self.queue.get()]
+            # 距上次发送不足摘要间隔时等待，期间到达的通知合并进同一条消息
+            delay = self.last_sent_at + self.digest_seconds - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._take_batch(self._held)
+            await self.bucket.acquire()
+            items, self._held = self._held, []
+            # 发送不随协程取消而中断，stop() 会等待当前批次完成
+            self._inflight = asyncio.ensure_future(self.deliver(items))
+            await asyncio.shield(self._inflight)
+            self.last_sent_at = time.monotonic()
+
+    async def deliver(self, items: List[Notification], max_retries: Optional[int] = None):
+        """发送一条摘要消息并记录每条通知的发送结果"""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        title, content = build_digest(items)
+        attempt = 0
+        while True:
+            try:
+                await self.sender.send(title, content, items)
+                error = None
+                break
+            except NotificationError as e:
+                error = e
+            except Exception as e:
+                error = NotificationError(f"{e.__class__.__name__}: {e}")
+            if not error.retryable or attempt >= max_retries:
+                break
+            attempt += 1
+            self.stats['retries'] += 1
+            await asyncio.sleep(min(60.0, self.retry_base_delay * 2 ** (attempt - 1)))
+
+        self.stats['messages'] += 1
+        self.stats['failed' if error else 'sent'] += len(items)
+        if error:
+            logger.warning(f"通知渠道 {self.channel.name} 发送失败（{len(items)} 条，重试 {attempt} 次）: {error}")
+        self.dispatcher.record(self.channel.id, items, error, attempt)
+
+    async def stop(self):
+        """停止发送协程，队列中剩余的通知合并后立即发送一次（不重试）"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self._inflight:
+            await asyncio.gather(self._inflight, return_exceptions=True)
+            self._inflight = None
+        items, self._held = self._held, []
+        while items or not self.queue.empty():
+            await self.deliver(self._take_batch(items), max_retries=0)
+            items = []
+        await self.sender.close()
+
+
+LogWriter = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+class NotificationDispatcher:
+    """告警通知调度器
+
+    - 每个渠道一个 ChannelWorker（独立队列、摘要合并、令牌桶限速、退避重试）
+    - HTTP类渠道共享一个带连接池的 httpx.AsyncClient，邮件渠道各自复用SMTP连接
+    - 发送结果先缓存在内存中，攒够 log_batch_size 条或每 log_flush_interval 秒
+      批量写入 notification_logs 并累加渠道统计
+    首次提交通知时自动启动；渠道配置按 channel_ttl 秒缓存，接口修改渠道后调用 forget_channel。
+    """
+
+    def __init__(self, log_writer: Optional[LogWriter] = None, log_batch_size: int = 200,
+                 log_flush_interval: float = 1.0, channel_ttl: float = 60):
+        self._log_writer = log_writer or self._write_logs
+        self.log_batch_size = log_batch_size
+        self.log_flush_interval = log_flush_interval
+        self.channel_ttl = channel_ttl
+        self._http: Optional[httpx.AsyncClient] = None
+        self._workers: Dict[int, ChannelWorker] = {}
+        self._channels: Dict[int, Tuple[ChannelConfig, float]] = {}
+        self._log_rows: List[Dict[str, Any]] = []
+        self._log_wakeup: Optional[asyncio.Event] = None
+        self._log_task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self.stats = {'submitted': 0, 'dropped': 0, 'logs_written': 0, 'logs_failed': 0}
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._http = httpx.AsyncClient(
+            timeout=settings.NOTIFICATION_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self._log_wakeup = asyncio.Event()
+        self._log_task = asyncio.create_task(self._log_loop())
+
+    async def stop(self):
+        """停止所有渠道（剩余通知各发送一次）并写入剩余日志"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        for worker in list(self._workers.values()):
+            await worker.stop()
+        self._workers.clear()
+        if self._log_task:
+            self._log_task.cancel()
+            await asyncio.gather(self._log_task, return_exceptions=True)
+            self._log_task = None
+        while self._log_rows:
+            await self._flush_logs()
+        await self._http.aclose()
+        self._http = None
+
+    def _make_sender(self, channel: ChannelConfig) -> BaseSender:
+        sender_class = SENDERS.get(channel.type)
+        if sender_class is None:
+            raise NotificationError(f"不支持的通知渠道类型: {channel.type}", retryable=False)
+        return sender_class(channel, self._http)
+
+    def _get_worker(self, channel: ChannelConfig) -> ChannelWorker:
+        worker = self._workers.get(channel.id)
+        if worker is None:
+            worker = ChannelWorker(channel, self._make_sender(channel), self)
+            self._workers[channel.id] = worker
+        elif worker.channel.type != channel.type or worker.channel.config != channel.config:
+            old_sender = worker.sender
+            worker.configure(channel, self._make_sender(channel))
+            asyncio.create_task(old_sender.close())
+        worker.start()
+        return worker
+
+    def submit(self, channel: ChannelConfig, notification: Notification) -> bool:
+        """提交一条通知（不阻塞），渠道禁用或队列已满时返回False"""
+        self.start()
+        if not channel.is_enabled:
+            return False
+        try:
+            worker = self._get_worker(channel)
+        except NotificationError as e:
+            self.record(channel.id, [notification], e, 0)
+            return False
+        self.stats['submitted'] += 1
+        if not worker.submit(notification):
+            self.stats['dropped'] += 1
+            self.record(channel.id, [notification], NotificationError("发送队列已满"), 0)
+            return False
+        return True
+
+    async def _load_channels(self, db, channel_ids: Sequence[int]) -> List[ChannelConfig]:
+        from sqlalchemy import select
+        from models.diagnosis import NotificationChannel
+
+        now = time.monotonic()
+        stale = [cid for cid in channel_ids
+                 if cid not in self._channels or now - self._channels[cid][1] >= self.channel_ttl]
+        if stale:
+            result = await db.execute(select(NotificationChannel).where(NotificationChannel.id.in_(stale)))
+            found = {channel.id: ChannelConfig.from_model(channel) for channel in result.scalars().all()}
+            for cid in stale:
+                if cid in found:
+                    self._channels[cid] = (found[cid], now)
+                else:
+                    self._channels.pop(cid, None)
+        return [self._channels[cid][0] for cid in channel_ids if cid in self._channels]
+
+    async def notify(self, db, channel_ids: Sequence[int], title: str, content: str,
+                     rule_id: Optional[int] = None, alarm_id: Optional[int] = None) -> int:
+        """向多个渠道提交同一条通知，返回成功入队的渠道数"""
+        if not channel_ids:
+            return 0
+        submitted = 0
+        for channel in await self._load_channels(db, channel_ids):
+            if self.submit(channel, Notification(title, content, rule_id=rule_id, alarm_id=alarm_id)):
+                submitted += 1
+        return submitted
+
+    def forget_channel(self, channel_id: int):
+        """渠道被修改或删除后调用，下次提交时重新读取配置"""
+        self._channels.pop(channel_id, None)
+
+    async def send_test(self, channel: ChannelConfig, title: str, content: str,
+                        recipients: Optional[List[str]] = None):
+        """立即发送一条测试通知（不经过队列、不重试），失败时抛出 NotificationError"""
+        self.start()
+        sender = self._make_sender(channel)
+        try:
+            await sender.send(title, content, [Notification(title, content, recipients=recipients or [])])
+        finally:
+            await sender.close()
+
+    def record(self, channel_id: int, items: Sequence[Notification], error: Optional[Exception], retries: int):
+        """缓存发送结果，由后台任务批量写入"""
+        sent_at = None if error else datetime.now(timezone.utc)
+        for item in items:
+            self._log_rows.append({
+                'channel_id': channel_id,
+                'rule_id': item.rule_id,
+                'alarm_id': item.alarm_id,
+                'title': item.title[:200],
+                'content': item.content,
+                'recipients': item.recipients,
+                'status': 'failed' if error else 'sent',
+                'error_message': str(error) if error else None,
+                'retry_count': retries,
+                'sent_at': sent_at,
+            })
+        if self._log_wakeup and len(self._log_rows) >= self.log_batch_size:
+            self._log_wakeup.set()
+
+    async def _log_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._log_wakeup.wait(), timeout=self.log_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._log_wakeup.clear()
+            while self._log_rows:
+                await self._flush_logs()
+
+    async def _flush_logs(self):
+        batch = self._log_rows[:self.log_batch_size]
+        del self._log_rows[:len(batch)]
+        try:
+            await self._log_writer(batch)
+            self.stats['logs_written'] += len(batch)
+        except Exception as e:
+            self.stats['logs_failed'] += len(batch)
+            logger.error(f"批量写入通知日志失败（{len(batch)} 条已丢弃）: {e}")
+
+    @staticmethod
+    async def _write_logs(rows: List[Dict[str, Any]]):
+        """批量插入通知日志并按渠道累加发送统计"""
+        from sqlalchemy import func, insert, update
+        from database import AsyncSessionLocal
+        from models.diagnosis import NotificationChannel, NotificationLog
+
+        per_channel: Dict[int, List[int]] = {}
+        for row in rows:
+            counts = per_channel.setdefault(row['channel_id'], [0, 0])
+            counts[0] += 1
+            counts[1] += row['status'] == 'sent'
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(NotificationLog), rows)
+            for channel_id, (total, success) in per_channel.items():
+                await db.execute(
+                    update(NotificationChannel)
+                    .where(NotificationChannel.id == channel_id)
+                    .values(
+                        send_count=func.coalesce(NotificationChannel.send_count, 0) + total,
+                        success_count=func.coalesce(NotificationChannel.success_count, 0) + success,
+                        last_used_at=func.now()
+                    )
+                )
+            await db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'running': self.is_running,
+            'pending_logs': len(self._log_rows),
+            'channels': {
+                channel_id: {**worker.stats, 'queue_depth': worker.queue.qsize(), 'type': worker.channel.type}
+                for channel_id, worker in self._workers.items()
+            },
+        }
+
+
+# 全局通知调度器实例
+notification_dispatcher = NotificationDispatcher()
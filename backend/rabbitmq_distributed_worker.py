@@ -18,10 +18,14 @@ sys.path.append(str(Path(__file__).parent))
 
 from diagnosis.executor import DiagnosisExecutor
 from event_task_executor import EventTaskExecutor
+from notification_dispatcher import notification_dispatcher
 from task_queue_manager import TaskQueueManager
-from database import get_db
+from database import get_db, minio_client
+from config import settings
+from utils.package_cache import AlgorithmPackageCache
 from models.diagnosis import TaskStatus
 from models.event_task import EventTask, EventTaskStatus
+from utils.task_lease import DEFAULT_LEASE_SECONDS
 from worker_config import WorkerConfig
 
 logger = logging.getLogger(__name__)
@@ -33,18 +37,35 @@ class RabbitMQDistributedWorker:
         self.worker_id = worker_id or f"worker-{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
         self.config = config or WorkerConfig()
         
+        # 算法包本地缓存
+        cache_dir = Path(self.config.algorithm_cache_dir)
+        if not cache_dir.is_absolute():
+            cache_dir = Path(__file__).parent / cache_dir
+        self.package_cache = AlgorithmPackageCache(
+            cache_dir,
+            minio_client,
+            settings.MINIO_BUCKET_NAME,
+            max_bytes=self.config.algorithm_cache_max_mb * 1024 * 1024,
+            max_concurrent_downloads=self.config.algorithm_sync_concurrency
+        )
+        
         # 任务执行器
         self.diagnosis_executor = DiagnosisExecutor()
-        self.event_executor = EventTaskExecutor()
-        
-        # RabbitMQ管理器
-        self.task_queue_manager = TaskQueueManager()
+        self.event_executor = EventTaskExecutor(
+            batch_max_size=self.config.batch_max_size,
+            batch_max_wait_ms=self.config.batch_max_wait_ms,
+            package_cache=self.package_cache
+        )
         
         # Worker状态
         self.running = False
         self.registered = False
         self.current_tasks: Dict[str, asyncio.Task] = {}
         self.max_concurrent_tasks = self.config.max_concurrent_tasks
+        self.event_lease_seconds = DEFAULT_LEASE_SECONDS  # 事件任务执行租约时长
+        
+        # RabbitMQ管理器
+        self.task_queue_manager = TaskQueueManager(prefetch_count=self.max_concurrent_tasks)
         
         # 统计信息
         self.stats = {
@@ -80,6 +101,10 @@ class RabbitMQDistributedWorker:
             # 注册到主服务
             await self._register_worker()
             
+            # 同步算法包后再开始消费任务
+            await self._sync_algorithm_packages()
+            asyncio.create_task(self._algorithm_sync_loop())
+            
             # 启动任务消费者
             await self._start_consumers()
             
@@ -104,6 +129,12 @@ class RabbitMQDistributedWorker:
             logger.info(f"Waiting for {len(self.current_tasks)} tasks to complete")
             await asyncio.gather(*self.current_tasks.values(), return_exceptions=True)
         
+        # 停止批量推理循环
+        await self.event_executor.batcher.close()
+        
+        # 发送剩余告警通知并写入通知日志
+        await notification_dispatcher.stop()
+        
         # 注销Worker（在关闭会话之前）
         if self.registered and self.session and not self.session.closed:
             await self._unregister_worker()
@@ -288,27 +319,30 @@ class RabbitMQDistributedWorker:
             self.current_tasks.pop(f"event_{task_id}", None)
     
     async def _execute_event_task(self, task_id: int, task_data: Dict[str, Any]) -> Dict[str, Any]:
-        """执行事件任务"""
+        """执行事件任务（先领取租约，执行期间续约，结束时凭令牌回传结果）"""
+        token = await self._claim_event_task(task_id)
+        if token is None:
+            logger.info(f"Event task {task_id} already claimed elsewhere, skipped by worker {self.worker_id}")
+            return {'success': True, 'skipped': True, 'task_id': task_id}
+        
+        start_time = time.time()
+        renewer = asyncio.create_task(self._renew_event_task_lease(task_id, token))
         try:
-            # 更新任务状态为RUNNING
-            await self._update_event_task_status(task_id, EventTaskStatus.RUNNING)
-            
-            # 执行任务
-            result = await self.event_executor.execute_task(task_id)
-            
-            # 更新任务状态
-            if result.get('success', False):
-                await self._update_event_task_status(task_id, EventTaskStatus.COMPLETED, result)
-            else:
-                await self._update_event_task_status(task_id, EventTaskStatus.FAILED, result)
-            
+            async for db in get_db():
+                try:
+                    result = await self.event_executor.execute_event_task(task_id, task_data, db)
+                    break
+                finally:
+                    await db.close()
             logger.info(f"Event task {task_id} completed by worker {self.worker_id}")
-            return result
-            
         except Exception as e:
             logger.error(f"Error executing event task {task_id}: {e}")
-            await self._update_event_task_status(task_id, EventTaskStatus.FAILED, {'error': str(e)})
-            return {'success': False, 'error': str(e)}
+            result = {'success': False, 'error': str(e)}
+        finally:
+            renewer.cancel()
+        
+        await self._complete_event_task(task_id, token, result, (time.time() - start_time) * 1000)
+        return result
     
     async def _process_ai_service_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
         """处理AI服务任务"""
@@ -343,28 +377,94 @@ class RabbitMQDistributedWorker:
         except Exception as e:
             logger.error(f"Error updating task status: {e}")
     
-    async def _update_event_task_status(self, task_id: int, status: EventTaskStatus, result: Optional[Dict] = None):
-        """更新事件任务状态"""
+    async def _claim_event_task(self, task_id: int) -> Optional[int]:
+        """向主服务领取事件任务，返回租约令牌（已被其他执行者领取时返回None）"""
+        async with self.session.post(
+            f"{self.main_service_url}/api/v1/event-tasks/worker/tasks/{task_id}/claim",
+            params={'node_id': self.worker_id, 'lease_seconds': self.event_lease_seconds}
+        ) as response:
+            if response.status == 409:
+                return None
+            response.raise_for_status()
+            data = await response.json()
+            return data['fencing_token']
+    
+    async def _renew_event_task_lease(self, task_id: int, token: int):
+        """执行期间按租约时长的1/3续约，租约被接管后停止"""
+        while True:
+            await asyncio.sleep(self.event_lease_seconds / 3)
+            try:
+                async with self.session.post(
+                    f"{self.main_service_url}/api/v1/event-tasks/worker/tasks/{task_id}/heartbeat",
+                    params={'node_id': self.worker_id, 'fencing_token': token,
+                            'lease_seconds': self.event_lease_seconds}
+                ) as response:
+                    if response.status == 409:
+                        logger.warning(f"Lease of event task {task_id} was taken over, stop renewing")
+                        return
+                    if response.status != 200:
+                        logger.error(f"Failed to renew event task lease: {response.status}")
+            except Exception as e:
+                logger.error(f"Error renewing event task lease: {e}")
+    
+    async def _complete_event_task(self, task_id: int, token: int, result: Dict[str, Any], processing_time: float):
+        """凭租约令牌回传事件任务执行结果"""
         try:
-            update_data = {
-                'task_id': task_id,
-                'status': status.value,
-                'worker_id': self.worker_id,
-                'updated_at': datetime.now(timezone.utc).isoformat()
+            payload = {
+                'success': bool(result.get('success', False)),
+                'error_message': result.get('error'),
+                'processing_time': processing_time,
+                'detection_result': result.get('result') or {},
+                'events_detected': result.get('events_detected', 0)
             }
-            
-            if result:
-                update_data['result'] = result
-            
             async with self.session.post(
-                f"{self.main_service_url}/api/v1/event-tasks/{task_id}/status",
-                json=update_data
+                f"{self.main_service_url}/api/v1/event-tasks/worker/tasks/{task_id}/complete",
+                params={'node_id': self.worker_id, 'fencing_token': token},
+                json=payload
             ) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to update event task status: {response.status}")
+                if response.status == 409:
+                    logger.warning(f"Lease of event task {task_id} was lost, result discarded")
+                elif response.status != 200:
+                    logger.error(f"Failed to complete event task: {response.status}")
                     
         except Exception as e:
-            logger.error(f"Error updating event task status: {e}")
+            logger.error(f"Error completing event task: {e}")
+    
+    async def _fetch_worker_algorithms(self) -> List[Dict[str, Any]]:
+        """从主服务分页获取启用的算法列表"""
+        algorithms = []
+        page = 1
+        while True:
+            async with self.session.get(
+                f"{self.main_service_url}/api/v1/ai/worker/algorithms/",
+                params={'page': page, 'page_size': 100}
+            ) as response:
+                if response.status != 200:
+                    logger.error(f"Failed to fetch algorithms: {response.status}")
+                    break
+                data = await response.json()
+            
+            algorithms.extend(data.get('data', []))
+            if not data.get('data') or len(algorithms) >= data.get('total', 0):
+                break
+            page += 1
+        return algorithms
+    
+    async def _sync_algorithm_packages(self):
+        """同步算法包到本地缓存"""
+        try:
+            algorithms = await self._fetch_worker_algorithms()
+            stats = await self.package_cache.sync(algorithms)
+            self.stats['algorithm_sync'] = stats
+        except Exception as e:
+            logger.error(f"Error syncing algorithm packages: {e}")
+    
+    async def _algorithm_sync_loop(self):
+        """定期同步算法包"""
+        while self.running:
+            await asyncio.sleep(self.config.algorithm_sync_interval)
+            if self.running:
+                await self._sync_algorithm_packages()
     
     async def _heartbeat_loop(self):
         """心跳循环"""
@@ -442,7 +542,8 @@ class RabbitMQDistributedWorker:
             'registered': self.registered,
             'current_tasks': len(self.current_tasks),
             'max_tasks': self.max_concurrent_tasks,
-            'stats': self.stats
+            'stats': self.stats,
+            'batch_stats': self.event_executor.batcher.get_stats()
         }
 
 async def main():
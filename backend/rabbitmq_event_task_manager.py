@@ -1,15 +1,21 @@
 import asyncio
 import logging
-from datetime import datetime, timezone, timedelta
+import os
+import socket
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_db, AsyncSessionLocal
 from models.event_task import EventTask, EventTaskStatus
 from models.ai_algorithm import AIService
 from task_queue_manager import task_queue_manager
 from event_task_executor import EventTaskExecutor
+from utils.task_lease import (
+    DEFAULT_LEASE_SECONDS, claim_task, defer_retries, finish_task,
+    reclaim_expired, renew_lease, take_due_retries
+)
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +26,10 @@ class RabbitMQEventTaskManager:
         self.running = False
         self.executor = EventTaskExecutor()
         self.check_interval = 30  # 检查间隔30秒
-        self.task_timeout = 1800  # 30分钟超时
+        self.lease_seconds = DEFAULT_LEASE_SECONDS  # 执行租约时长，执行期间每1/3时长续约一次
+        self.sweep_batch_size = 500  # 回收/重试每批处理的任务数
+        self.missed_retry_grace = 300  # 重试时间已过该秒数仍未执行的任务视为延迟消息丢失，补发
+        self.worker_id = f"event-manager-{socket.gethostname()}-{os.getpid()}"
         
     async def start(self):
         """启动事件任务管理器"""
@@ -61,7 +70,7 @@ class RabbitMQEventTaskManager:
         while self.running:
             try:
                 await self._recover_stuck_tasks()
-                await self._check_retry_tasks()
+                await self._requeue_missed_retries()
                 await asyncio.sleep(self.check_interval)
             except Exception as e:
                 logger.error(f"Error in monitor loop: {e}")
@@ -142,180 +151,145 @@ class RabbitMQEventTaskManager:
                 await db.close()
     
     async def _process_event_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理事件任务"""
+        """处理事件任务
+
+        先以租约方式领取任务，同一任务的重复投递（重试重发、多副本消费）只有一个能领取成功；
+        执行期间定期续约，结束时凭 fencing_token 写回结果，租约已被回收时结果丢弃。
+        """
         task_id = task_data.get('task_id')
         logger.info(f"Processing event task {task_id}")
         
-        async for db in get_db():
-            try:
-                # 获取任务
-                task = await db.get(EventTask, task_id)
-                if not task:
-                    logger.error(f"Event task {task_id} not found")
-                    return {'success': False, 'error': 'Task not found'}
-                
-                # 更新任务状态为RUNNING
-                task.status = EventTaskStatus.RUNNING
-                task.started_at = datetime.now(timezone.utc)
-                task.assigned_worker = f"rabbitmq-worker-{task_id}"  # 临时worker标识
-                task.worker_heartbeat = datetime.now(timezone.utc)
-                await db.commit()
-                
-                # 执行任务
-                result = await self.executor.execute_task(task_id)
-                
-                # 更新任务状态
-                if result.get('success', False):
-                    task.status = EventTaskStatus.COMPLETED
-                    task.result = result.get('result')
-                else:
-                    task.status = EventTaskStatus.FAILED
-                    task.error_message = result.get('error', 'Unknown error')
-                    
-                    # 检查是否需要重试
-                    if task.retry_count < 3:  # 最多重试3次
-                        task.retry_count += 1
-                        task.status = EventTaskStatus.PENDING
-                        task.next_retry_at = datetime.now(timezone.utc) + timedelta(minutes=5 * task.retry_count)
-                        logger.info(f"Event task {task_id} will be retried (attempt {task.retry_count})")
-                
-                task.completed_at = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            task = await claim_task(db, task_id, self.worker_id, self.lease_seconds)
+            await db.commit()
+        
+        if not task:
+            logger.info(f"Event task {task_id} is not claimable (already claimed or not pending), skipped")
+            return {'success': True, 'skipped': True, 'task_id': task_id}
+        
+        token = task.fencing_token
+        renewer = asyncio.create_task(self._keep_lease(task_id, token))
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await self.executor.execute_event_task(task_id, task_data, db)
+        except Exception as e:
+            logger.error(f"Error processing event task {task_id}: {e}")
+            result = {'success': False, 'error': str(e)}
+        finally:
+            renewer.cancel()
+        
+        success = bool(result.get('success', False))
+        try:
+            async with AsyncSessionLocal() as db:
+                finished = await finish_task(db, task_id, token, success, result.get('error', 'Unknown error'))
                 await db.commit()
-                
-                logger.info(f"Event task {task_id} completed with status: {task.status}")
-                return result
-                
-            except Exception as e:
-                logger.error(f"Error processing event task {task_id}: {e}")
-                
-                # 更新任务状态为失败
-                try:
-                    task = await db.get(EventTask, task_id)
-                    if task:
-                        task.status = EventTaskStatus.FAILED
-                        task.error_message = str(e)
-                        task.completed_at = datetime.now(timezone.utc)
-                        
-                        # 检查是否需要重试
-                        if task.retry_count < 3:
-                            task.retry_count += 1
-                            task.status = EventTaskStatus.PENDING
-                            task.next_retry_at = datetime.now(timezone.utc) + timedelta(minutes=5 * task.retry_count)
-                        
-                        await db.commit()
-                except Exception as update_error:
-                    logger.error(f"Error updating event task status: {update_error}")
-                
-                return {'success': False, 'error': str(e)}
-            finally:
-                await db.close()
+        except Exception as e:
+            logger.error(f"Error updating event task {task_id} status: {e}")
+            finished = False
+        
+        if finished:
+            logger.info(f"Event task {task_id} finished, success: {success}")
+            if not success:
+                await self.schedule_retry(finished, result.get('error'))
+        else:
+            logger.warning(f"Lease of event task {task_id} was lost (token {token}), result discarded")
+        return result
     
-    async def _recover_stuck_tasks(self):
-        """恢复卡住的事件任务"""
-        async for db in get_db():
+    async def _keep_lease(self, task_id: int, token: int):
+        """执行期间按租约时长的1/3续约"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
             try:
-                current_time = datetime.now(timezone.utc)
-                timeout_time = current_time - timedelta(seconds=self.task_timeout)
-                
-                # 查找运行时间过长的任务
-                result = await db.execute(
-                    select(EventTask)
-                    .where(
-                        and_(
-                            EventTask.status == EventTaskStatus.RUNNING,
-                            EventTask.started_at < timeout_time
-                        )
-                    )
-                )
-                
-                stuck_tasks = result.scalars().all()
-                
-                for task in stuck_tasks:
-                    logger.warning(f"Recovering stuck event task {task.id}")
-                    
-                    # 检查是否需要重试
-                    if task.retry_count < 3:
-                        task.retry_count += 1
-                        task.status = EventTaskStatus.PENDING
-                        task.next_retry_at = current_time + timedelta(minutes=5 * task.retry_count)
-                        task.error_message = f"Task timeout - retry attempt {task.retry_count}"
-                        
-                        # 重新发布到队列
-                        task_data = {
-                            'task_id': task.id,
-                            'service_id': task.service_id,
-                            'event_data': task.event_data,
-                            'retry_attempt': task.retry_count
-                        }
-                        
-                        await task_queue_manager.publish_task(
-                            'event', task_data, priority=task.priority + 2  # 提高重试任务优先级
-                        )
-                    else:
-                        task.status = EventTaskStatus.FAILED
-                        task.error_message = "Task timeout - max retries exceeded"
-                        task.completed_at = current_time
-                    
-                    task.assigned_worker = None
-                    task.worker_heartbeat = None
-                
-                if stuck_tasks:
+                async with AsyncSessionLocal() as db:
+                    renewed = await renew_lease(db, task_id, token, self.lease_seconds)
                     await db.commit()
-                    logger.info(f"Recovered {len(stuck_tasks)} stuck event tasks")
-                    
+                if not renewed:
+                    logger.warning(f"Lease of event task {task_id} was taken over, stop renewing")
+                    return
             except Exception as e:
-                logger.error(f"Error recovering stuck event tasks: {e}")
-            finally:
-                await db.close()
+                logger.error(f"Error renewing lease of event task {task_id}: {e}")
     
-    async def _check_retry_tasks(self):
-        """检查需要重试的任务"""
-        async for db in get_db():
-            try:
-                current_time = datetime.now(timezone.utc)
+    async def _recover_stuck_tasks(self):
+        """回收租约过期的事件任务（分批 SKIP LOCKED，多副本可同时运行）"""
+        recovered = failed = 0
+        try:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows = await reclaim_expired(db, self.sweep_batch_size)
+                    await db.commit()
                 
-                # 查找需要重试的任务
-                result = await db.execute(
-                    select(EventTask)
-                    .where(
-                        and_(
-                            EventTask.status == EventTaskStatus.PENDING,
-                            EventTask.next_retry_at.isnot(None),
-                            EventTask.next_retry_at <= current_time
-                        )
-                    )
-                )
+                for row in rows:
+                    if row.status == EventTaskStatus.FAILED:
+                        failed += 1
+                        logger.warning(f"Event task {row.id} lease expired, max retries exceeded")
+                    else:
+                        recovered += 1
+                        logger.warning(f"Event task {row.id} lease expired, will retry (attempt {row.retry_count})")
+                    await self.schedule_retry(row, "执行租约过期")
                 
-                retry_tasks = result.scalars().all()
+                if len(rows) < self.sweep_batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"Error recovering stuck event tasks: {e}")
+        
+        if recovered or failed:
+            logger.info(f"Recovered {recovered} stuck event tasks, {failed} marked failed")
+    
+    async def schedule_retry(self, row, error: Optional[str] = None) -> bool:
+        """按任务结束后的状态安排重试: PENDING 经延迟队列按退避时间重新投递，FAILED 写入死信队列
+
+        row 为 finish_task/reclaim_expired 返回的 (id, status, retry_count)。
+        延迟消息发布失败时任务保留 next_retry_at，由 _requeue_missed_retries 补发。
+        """
+        task_data = {'task_id': row.id, 'retry_attempt': row.retry_count}
+        if row.status == EventTaskStatus.FAILED:
+            return await task_queue_manager.publish_dead_letter('event', task_data, row.retry_count, error)
+        if row.status != EventTaskStatus.PENDING:
+            return False
+        return await task_queue_manager.publish_task(
+            'event', task_data, priority=7,  # 提高重试任务优先级
+            delay=task_queue_manager.retry_delay(row.retry_count), attempt=row.retry_count
+        )
+    
+    async def _requeue_missed_retries(self):
+        """补发延迟消息遗漏的重试任务（重试时间已过宽限期仍为PENDING）
+
+        按 (status, next_retry_at) 索引取数，正常情况下没有结果；取出时原子清除
+        next_retry_at，其他副本不会重复投递，消费方仍需领取成功才会执行。
+        """
+        republished = 0
+        try:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows = await take_due_retries(db, self.sweep_batch_size, self.missed_retry_grace)
+                    await db.commit()
                 
-                for task in retry_tasks:
-                    logger.info(f"Retrying event task {task.id} (attempt {task.retry_count})")
-                    
-                    # 重新发布到队列
-                    task_data = {
-                        'task_id': task.id,
-                        'service_id': task.service_id,
-                        'event_data': task.event_data,
-                        'retry_attempt': task.retry_count
-                    }
-                    
+                failed_ids = []
+                for row in rows:
+                    logger.info(f"Requeueing missed retry of event task {row.id} (attempt {row.retry_count})")
                     success = await task_queue_manager.publish_task(
-                        'event', task_data, priority=task.priority + 2
+                        'event', {'task_id': row.id, 'retry_attempt': row.retry_count},
+                        priority=7, attempt=row.retry_count
                     )
-                    
                     if success:
-                        task.next_retry_at = None  # 清除重试时间
+                        republished += 1
                     else:
-                        logger.error(f"Failed to republish retry task {task.id}")
+                        failed_ids.append(row.id)
                 
-                if retry_tasks:
-                    await db.commit()
-                    logger.info(f"Republished {len(retry_tasks)} retry event tasks")
-                    
-            except Exception as e:
-                logger.error(f"Error checking retry tasks: {e}")
-            finally:
-                await db.close()
+                if failed_ids:
+                    logger.error(f"Failed to requeue {len(failed_ids)} retry event tasks, deferred")
+                    async with AsyncSessionLocal() as db:
+                        await defer_retries(db, failed_ids)
+                        await db.commit()
+                    break
+                
+                if len(rows) < self.sweep_batch_size:
+                    break
+        except Exception as e:
+            logger.error(f"Error requeueing missed retry tasks: {e}")
+        
+        if republished:
+            logger.info(f"Requeued {republished} missed retry event tasks")
     
     async def schedule_immediate_task(self, service_id: int, event_data: Dict[str, Any], priority: int = 8) -> Optional[int]:
         """立即调度事件任务"""
@@ -13,6 +13,7 @@ from database import get_db, get_minio
 from models.ai_algorithm import AIAlgorithm, AIService, AIModel, AIServiceLog, AlgorithmType, ServiceStatus, ModelType
 from models.user import User
 from routers.auth import get_current_user
+from utils.cache import stats_cache
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -39,6 +40,10 @@ class AIAlgorithmCreate(BaseModel):
     supported_platforms: List[str] = []
     tags: List[str] = []
     is_active: bool = True
+    # 算法包文件信息（来自算法包上传接口），Worker据此同步本地缓存
+    file_path: Optional[str] = None
+    file_size: Optional[int] = None
+    file_hash: Optional[str] = None
 
 class AIAlgorithmUpdate(BaseModel):
     name: Optional[str] = None
@@ -350,6 +355,7 @@ async def create_algorithm(
     algorithm = AIAlgorithm(**algorithm_dict)
     db.add(algorithm)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(algorithm)
     
     return AIAlgorithmResponse(
@@ -430,6 +436,7 @@ async def update_algorithm(
         setattr(algorithm, field, value)
     
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(algorithm)
     
     return AIAlgorithmResponse(
@@ -493,6 +500,7 @@ async def delete_algorithm(
     
     await db.delete(algorithm)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     
     return {"message": "算法删除成功"}
 
@@ -633,6 +641,7 @@ async def create_service(
     service = AIService(**service_data.dict())
     db.add(service)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(service)
     
     return AIServiceResponse(
@@ -802,6 +811,7 @@ async def create_model(
     
     db.add(model)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(model)
     
     return AIModelResponse(
@@ -894,6 +904,7 @@ async def update_algorithm(
         setattr(algorithm, field, value)
     
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(algorithm)
     
     return AIAlgorithmResponse(
@@ -957,6 +968,7 @@ async def delete_algorithm(
     
     await db.delete(algorithm)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     
     return {"message": "算法删除成功"}
 
@@ -1059,7 +1071,16 @@ async def get_ai_stats(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取AI统计信息"""
+    """获取AI统计信息（共享缓存）"""
+    return await stats_cache.get_or_set(
+        "ai:stats",
+        lambda: _compute_ai_stats(db),
+        ttl=30,
+        tags=["ai"]
+    )
+
+async def _compute_ai_stats(db: AsyncSession) -> AIStats:
+    """计算AI统计信息"""
     # 算法统计
     total_algorithms_result = await db.execute(select(func.count(AIAlgorithm.id)))
     total_algorithms = total_algorithms_result.scalar()
@@ -1184,6 +1205,7 @@ async def update_service(
         setattr(service, field, value)
     
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(service)
     
     # 获取算法和模型信息
@@ -1240,6 +1262,7 @@ async def delete_service(
     
     await db.delete(service)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     
     return {"message": "服务删除成功"}
 
@@ -1268,6 +1291,7 @@ async def start_service(
         service.status = ServiceStatus.STARTING
         service.is_active = True
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         
         # 通过AI服务监控器启动服务
         from main import ai_service_monitor
@@ -1281,6 +1305,7 @@ async def start_service(
             service.is_running = False
             
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         
         return {"message": "服务启动成功" if success else "服务启动失败"}
         
@@ -1289,6 +1314,7 @@ async def start_service(
         service.status = ServiceStatus.ERROR
         service.is_running = False
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"服务启动失败: {str(e)}"
@@ -1318,6 +1344,7 @@ async def stop_service(
         # 更新服务状态为停止中
         service.status = ServiceStatus.STOPPING
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         
         # 通过AI服务监控器停止服务
         from main import ai_service_monitor
@@ -1331,6 +1358,7 @@ async def stop_service(
             service.status = ServiceStatus.ERROR
             
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         
         return {"message": "服务停止成功" if success else "服务停止失败"}
         
@@ -1338,6 +1366,7 @@ async def stop_service(
         logger.error(f"停止服务失败: {e}")
         service.status = ServiceStatus.ERROR
         await db.commit()
+        await stats_cache.invalidate_tags("ai")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"服务停止失败: {str(e)}"
@@ -1434,6 +1463,7 @@ async def update_model(
             setattr(model, field, value)
     
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     await db.refresh(model)
     
     # 获取算法信息
@@ -1513,6 +1543,7 @@ async def delete_model(
     
     await db.delete(model)
     await db.commit()
+    await stats_cache.invalidate_tags("ai")
     
     return {"message": "模型删除成功"}
 
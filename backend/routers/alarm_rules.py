@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 
 from database import get_db
+from diagnosis.rule_engine import alarm_rule_engine
 from models.diagnosis import AlarmRule, NotificationChannel, NotificationLog, DiagnosisAlarm
 from models.user import User
 from routers.auth import get_current_user
@@ -135,9 +136,17 @@ async def create_alarm_rule(
     db.add(rule)
     await db.commit()
     await db.refresh(rule)
+    await alarm_rule_engine.refresh_rule(db, rule.id)
     
     return rule
 
+@router.get("/engine/stats")
+async def get_rule_engine_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取告警规则匹配引擎状态"""
+    return alarm_rule_engine.get_stats()
+
 @router.get("/{rule_id}", response_model=AlarmRuleResponse)
 async def get_alarm_rule(
     rule_id: int,
@@ -213,6 +222,7 @@ async def update_alarm_rule(
     
     await db.commit()
     await db.refresh(rule)
+    await alarm_rule_engine.refresh_rule(db, rule.id)
     
     return rule
 
@@ -236,6 +246,7 @@ async def delete_alarm_rule(
     
     await db.delete(rule)
     await db.commit()
+    alarm_rule_engine.remove_rule(rule_id)
     
     return {"message": "告警规则删除成功"}
 
@@ -260,6 +271,7 @@ async def toggle_alarm_rule(
     rule.is_enabled = not rule.is_enabled
     await db.commit()
     await db.refresh(rule)
+    await alarm_rule_engine.refresh_rule(db, rule.id)
     
     return {"message": f"告警规则已{'启用' if rule.is_enabled else '禁用'}"}
 
@@ -12,6 +12,7 @@ from models.user import User, UserSession, UserLoginLog
 from models.role import Role, UserRole
 from config import settings
 from request_body_parser import parse_and_store_request_body
+from utils.auth_cache import auth_cache
 
 router = APIRouter()
 security = HTTPBearer()
@@ -67,7 +68,13 @@ class UserInfo(BaseModel):
 
 # Helper function to get user roles and permissions
 async def get_user_roles_and_permissions(user: User, db: AsyncSession):
-    """获取用户的角色和页面权限"""
+    """获取用户的角色和页面权限（短TTL缓存，角色或分配变更时失效）"""
+    return await auth_cache.get_roles_and_permissions(
+        user, lambda: _load_user_roles_and_permissions(user, db)
+    )
+
+async def _load_user_roles_and_permissions(user: User, db: AsyncSession):
+    """从数据库查询用户的角色和页面权限"""
     # 查询用户的角色
     query = select(Role).join(UserRole).where(
         and_(
@@ -122,18 +129,16 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user_from_token(token: str) -> Optional[User]:
-    """从token获取用户信息（用于中间件）"""
+    """从token获取用户信息（用于中间件，命中缓存时不访问数据库）"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
         
-        # 获取数据库会话
+        # 会话只在缓存未命中时才会获取连接
         async with AsyncSessionLocal() as db:
-            result = await db.execute(select(User).where(User.username == username))
-            user = result.scalar_one_or_none()
-            return user
+            return await auth_cache.get_user(db, username)
     except JWTError:
         return None
     except Exception:
@@ -170,10 +175,14 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
+    user = await auth_cache.get_user(db, username)
     if user is None:
         raise credentials_exception
+    
+    # 共享给日志中间件，避免同一请求再次解析用户
+    request.state.current_user = user
+    request.state.user_id = user.id
+    request.state.username = user.username
     return user
 
 @router.post("/login", response_model=LoginResponse)
@@ -247,6 +256,7 @@ async def login(login_request: LoginRequest, request: Request, db: AsyncSession
     db.add(login_log)
     
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     
     return LoginResponse(
         access_token=access_token,
@@ -352,6 +362,8 @@ async def change_password(
     db: AsyncSession = Depends(get_db)
 ):
     """修改密码"""
+    # 缓存的用户不含密码哈希，校验前从数据库加载
+    await db.refresh(current_user, ["hashed_password"])
     if not current_user.verify_password(request.old_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -360,6 +372,7 @@ async def change_password(
     
     current_user.set_password(request.new_password)
     await db.commit()
+    await auth_cache.invalidate_user(current_user.username)
     
     return {"message": "密码修改成功"}
 
@@ -390,6 +403,7 @@ async def update_current_user_profile(
         current_user.department = request.department
     
     await db.commit()
+    await auth_cache.invalidate_user(current_user.username)
     await db.refresh(current_user)
     
     # 获取用户的角色和权限信息
@@ -442,6 +456,7 @@ async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db))
     
     db.add(user)
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     await db.refresh(user)
     
     # 获取用户角色和权限信息
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+import asyncio
+import json
 
-from database import get_db
+from database import get_db, AsyncSessionLocal
 from models.camera import Camera, CameraGroup, MediaProxy, CameraPreset, CameraStatus, CameraType
 from models.user import User
-from routers.auth import get_current_user
+from routers.auth import get_current_user, get_current_user_from_token
+from utils.cache import stats_cache
+from utils.camera_monitor import camera_monitor
+from utils.camera_events import camera_status_broadcaster
 from utils.request_body_parser import parse_and_store_request_body
 
 router = APIRouter()
@@ -318,6 +325,7 @@ async def create_camera(
     camera = Camera(**camera_data.dict())
     db.add(camera)
     await db.commit()
+    await stats_cache.invalidate_tags("cameras")
     await db.refresh(camera)
     
     # 获取媒体代理名称
@@ -447,12 +455,18 @@ async def update_camera(
             )
     
     # 更新摄像头信息
+    old_status = camera.status
     update_data = camera_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(camera, field, value)
     
     await db.commit()
+    await stats_cache.invalidate_tags("cameras")
     await db.refresh(camera)
+    if camera.status != old_status:
+        await camera_status_broadcaster.publish([
+            camera_status_broadcaster.make_event(camera.id, camera.code, old_status, camera.status)
+        ])
     
     # 获取媒体代理名称
     media_proxy_name = None
@@ -513,6 +527,7 @@ async def delete_camera(
     
     await db.delete(camera)
     await db.commit()
+    await stats_cache.invalidate_tags("cameras")
     
     return {"message": "摄像头删除成功"}
 
@@ -521,7 +536,16 @@ async def get_camera_stats(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取摄像头统计信息"""
+    """获取摄像头统计信息（共享缓存）"""
+    return await stats_cache.get_or_set(
+        "cameras:stats",
+        lambda: _compute_camera_stats(db),
+        ttl=30,
+        tags=["cameras"]
+    )
+
+async def _compute_camera_stats(db: AsyncSession) -> CameraStats:
+    """计算摄像头统计信息"""
     # 总摄像头数
     total_result = await db.execute(select(func.count(Camera.id)))
     total_cameras = total_result.scalar()
@@ -566,6 +590,80 @@ async def get_camera_stats(
         by_status=by_status
     )
 
+async def _authenticate_stream(request: Request) -> User:
+    """事件流鉴权：EventSource无法设置请求头，与 get_current_user 一样回退到 easysight_token cookie
+    
+    不接受查询参数中的令牌，避免令牌随URL写入访问日志。
+    不使用 get_db 依赖，避免长连接期间一直占用数据库会话。
+    """
+    token = None
+    auth_header = request.headers.get("authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ", 1)[1]
+    elif "easysight_token" in request.cookies:
+        token = request.cookies["easysight_token"]
+    user = await get_current_user_from_token(token) if token else None
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+async def _camera_status_snapshot() -> Dict[str, Any]:
+    """事件流的初始快照：统计信息和所有摄像头的当前状态"""
+    async with AsyncSessionLocal() as db:
+        stats = await stats_cache.get_or_set(
+            "cameras:stats",
+            lambda: _compute_camera_stats(db),
+            ttl=30,
+            tags=["cameras"]
+        )
+        result = await db.execute(select(Camera.id, Camera.code, Camera.status, Camera.is_active))
+        cameras = [
+            {"camera_id": row.id, "code": row.code, "status": row.status.value if row.status else None,
+             "is_active": row.is_active}
+            for row in result.all()
+        ]
+    return {"stats": jsonable_encoder(stats), "cameras": cameras}
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.get("/status/stream")
+async def stream_camera_status(request: Request):
+    """摄像头状态变化事件流（Server-Sent Events）
+    
+    连接后先推送 snapshot（统计信息和全部摄像头状态），之后推送 status 事件（状态变化列表），
+    每15秒发送一次心跳注释。客户端消费过慢丢失消息时会收到新的 snapshot。
+    """
+    await _authenticate_stream(request)
+    queue = camera_status_broadcaster.subscribe()
+    
+    async def event_generator():
+        try:
+            yield _sse("snapshot", await _camera_status_snapshot())
+            while not await request.is_disconnected():
+                try:
+                    events = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if events is None:
+                    # 消费过慢丢失了消息，重发快照保证客户端状态一致
+                    yield _sse("snapshot", await _camera_status_snapshot())
+                    continue
+                yield _sse("status", events)
+        finally:
+            camera_status_broadcaster.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # 媒体代理管理
 @router.get("/media-proxies/", response_model=List[MediaProxyResponse])
 async def get_media_proxies(
@@ -947,6 +1045,25 @@ async def get_group_cameras(
         total_pages=total_pages
     )
 
+@router.get("/{camera_id}/probe-stats")
+async def get_camera_probe_stats(
+    camera_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取摄像头RTSP探测的连接/DESCRIBE延迟直方图"""
+    result = await db.execute(select(Camera.id, Camera.status).where(Camera.id == camera_id))
+    camera = result.first()
+    
+    if not camera:
+        raise HTTPException(status_code=404, detail="摄像头不存在")
+    
+    return {
+        "camera_id": camera.id,
+        "status": camera.status,
+        "probe": camera_monitor.get_probe_metrics(camera_id)
+    }
+
 @router.get("/{camera_id}/preview")
 async def get_camera_preview(
     camera_id: int,
@@ -4,17 +4,17 @@ from sqlalchemy import select, func, and_, desc, case
 from pydantic import BaseModel
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
-import psutil
-import time
 import asyncio
 
 from database import get_db
 from models.user import User
 from models.camera import Camera, CameraStatus
-from models.event import Event, EventStatus
+from models.event import Event, EventStatus, EventDailyStats
 from models.diagnosis import DiagnosisTask, TaskStatus
 from models.ai_algorithm import AIAlgorithm
 from routers.auth import get_current_user
+from utils.cache import stats_cache
+from utils.system_sampler import system_sampler
 
 router = APIRouter()
 
@@ -69,50 +69,31 @@ async def get_dashboard_overview(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取仪表盘概览数据（优化版本，带缓存）"""
+    """获取仪表盘概览数据（优化版本，带共享缓存）"""
     
-    global _dashboard_cache
-    
-    # 生成缓存键
-    cache_key = f"dashboard_overview_{days}"
-    current_time = time.time()
-    
-    # 检查缓存是否有效
-    if (cache_key in _dashboard_cache and 
-        current_time - _dashboard_cache[cache_key]['timestamp'] < _cache_timeout):
-        return _dashboard_cache[cache_key]['data']
-    
-    # 并发执行所有数据获取操作以提升性能
-    stats, event_trend, camera_status, recent_events = await asyncio.gather(
-        get_dashboard_stats(db),
-        get_event_trend_data(db, days),
-        get_camera_status_data(db),
-        get_recent_events(db, limit=10)
-    )
+    async def load_overview() -> DashboardResponse:
+        # 并发执行所有数据获取操作以提升性能
+        stats, event_trend, camera_status, recent_events = await asyncio.gather(
+            get_dashboard_stats(db),
+            get_event_trend_data(db, days),
+            get_camera_status_data(db),
+            get_recent_events(db, limit=10)
+        )
+        
+        return DashboardResponse(
+            stats=stats,
+            event_trend=event_trend,
+            camera_status=camera_status,
+            recent_events=recent_events,
+            last_updated=datetime.now()
+        )
     
-    response = DashboardResponse(
-        stats=stats,
-        event_trend=event_trend,
-        camera_status=camera_status,
-        recent_events=recent_events,
-        last_updated=datetime.now()
+    return await stats_cache.get_or_set(
+        f"dashboard:overview:{days}",
+        load_overview,
+        ttl=_cache_timeout,
+        tags=["dashboard", "events", "cameras", "diagnosis", "ai"]
     )
-    
-    # 更新缓存
-    _dashboard_cache[cache_key] = {
-        'data': response,
-        'timestamp': current_time
-    }
-    
-    # 清理过期缓存（简单的清理策略）
-    expired_keys = [
-        key for key, value in _dashboard_cache.items()
-        if current_time - value['timestamp'] > _cache_timeout * 2
-    ]
-    for key in expired_keys:
-        del _dashboard_cache[key]
-    
-    return response
 
 async def get_dashboard_stats(db: AsyncSession) -> DashboardStats:
     """获取仪表盘统计数据（优化版本）"""
@@ -134,16 +115,16 @@ async def get_dashboard_stats(db: AsyncSession) -> DashboardStats:
         return total, online, total - online
     
     async def get_event_stats():
-        """获取事件统计"""
+        """获取事件统计（读取事件日汇总表）"""
         result = await db.execute(
             select(
-                func.count(Event.id).label('total'),
-                func.sum(case((func.date(Event.created_at) == today, 1), else_=0)).label('today'),
-                func.sum(case((Event.status == EventStatus.PENDING, 1), else_=0)).label('unhandled')
+                func.sum(EventDailyStats.event_count).label('total'),
+                func.sum(case((EventDailyStats.stat_date == today, EventDailyStats.event_count), else_=0)).label('today'),
+                func.sum(case((EventDailyStats.status == EventStatus.PENDING.name, EventDailyStats.event_count), else_=0)).label('unhandled')
             )
         )
         row = result.first()
-        return row.total or 0, row.today or 0, row.unhandled or 0
+        return int(row.total or 0), int(row.today or 0), int(row.unhandled or 0)
     
     async def get_task_stats():
         """获取诊断任务统计"""
@@ -212,46 +193,31 @@ async def get_dashboard_stats(db: AsyncSession) -> DashboardStats:
     )
 
 async def get_event_trend_data(db: AsyncSession, days: int) -> List[EventTrendData]:
-    """获取事件趋势数据（优化版本）"""
+    """获取事件趋势数据（读取事件日汇总表，按天数线性增长）
+    
+    handled_count 为当日创建且目前已处理（已解决/误报/已忽略）的事件数
+    """
     
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=days-1)
     
-    # 并发获取事件创建和处理数据
-    async def get_event_counts():
-        result = await db.execute(
-            select(
-                func.date(Event.created_at).label('date'),
-                func.count(Event.id).label('event_count')
-            ).where(
-                func.date(Event.created_at).between(start_date, end_date)
-            ).group_by(
-                func.date(Event.created_at)
-            )
-        )
-        return {row.date: row.event_count for row in result.all()}
-    
-    async def get_handled_counts():
-        result = await db.execute(
-            select(
-                func.date(Event.updated_at).label('date'),
-                func.count(Event.id).label('handled_count')
-            ).where(
-                and_(
-                    func.date(Event.updated_at).between(start_date, end_date),
-                    Event.status.in_([EventStatus.RESOLVED, EventStatus.FALSE_ALARM, EventStatus.IGNORED])
-                )
-            ).group_by(
-                func.date(Event.updated_at)
-            )
+    handled_statuses = [EventStatus.RESOLVED.name, EventStatus.FALSE_ALARM.name, EventStatus.IGNORED.name]
+    result = await db.execute(
+        select(
+            EventDailyStats.stat_date,
+            func.sum(EventDailyStats.event_count).label('event_count'),
+            func.sum(case(
+                (EventDailyStats.status.in_(handled_statuses), EventDailyStats.event_count), else_=0
+            )).label('handled_count')
+        ).where(
+            EventDailyStats.stat_date.between(start_date, end_date)
+        ).group_by(
+            EventDailyStats.stat_date
         )
-        return {row.date: row.handled_count for row in result.all()}
-    
-    # 并发执行两个查询
-    event_count_map, handled_count_map = await asyncio.gather(
-        get_event_counts(),
-        get_handled_counts()
     )
+    rows = result.all()
+    event_count_map = {row.stat_date: int(row.event_count or 0) for row in rows}
+    handled_count_map = {row.stat_date: int(row.handled_count or 0) for row in rows}
     
     # 生成完整的日期序列
     trend_data = []
@@ -314,56 +280,23 @@ async def get_recent_events(db: AsyncSession, limit: int = 10) -> List[RecentEve
     
     return recent_events
 
-# 全局变量用于存储上次网络统计数据
-_last_network_stats = None
-_last_network_time = None
-
-# 缓存变量用于优化仪表盘性能
-_dashboard_cache = {}
+# 仪表盘缓存有效期
 _cache_timeout = 30  # 缓存30秒
 
 def get_system_health() -> Dict[str, Any]:
-    """获取系统健康状态"""
-    global _last_network_stats, _last_network_time
-    
+    """获取系统健康状态（读取后台采样线程的最新快照，不阻塞事件循环）"""
     try:
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # 内存使用率
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        
-        # 磁盘使用率
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
-        
-        # 网络状态 - 计算实时速度
-        current_network = psutil.net_io_counters()
-        current_time = time.time()
-        
-        network_sent_rate = 0.0  # KB/s
-        network_recv_rate = 0.0  # KB/s
-        
-        if _last_network_stats and _last_network_time:
-            time_diff = current_time - _last_network_time
-            if time_diff > 0:
-                # 计算速度 (字节/秒 -> KB/s)
-                sent_diff = current_network.bytes_sent - _last_network_stats.bytes_sent
-                recv_diff = current_network.bytes_recv - _last_network_stats.bytes_recv
-                network_sent_rate = (sent_diff / time_diff) / 1024  # KB/s
-                network_recv_rate = (recv_diff / time_diff) / 1024  # KB/s
-        
-        # 更新上次统计数据
-        _last_network_stats = current_network
-        _last_network_time = current_time
+        sample = system_sampler.latest()
+        cpu_percent = sample.cpu_percent
+        memory_percent = sample.memory_percent
+        disk_percent = sample.disk_percent
         
         return {
             "cpu_percent": round(cpu_percent, 2),
             "memory_percent": round(memory_percent, 2),
             "disk_percent": round(disk_percent, 2),
-            "network_sent": round(network_sent_rate, 2),  # KB/s
-            "network_recv": round(network_recv_rate, 2),  # KB/s
+            "network_sent": round(sample.network_sent_rate, 2),  # KB/s
+            "network_recv": round(sample.network_recv_rate, 2),  # KB/s
             "status": "healthy" if cpu_percent < 80 and memory_percent < 80 and disk_percent < 90 else "warning"
         }
     except Exception as e:
@@ -11,6 +11,7 @@ from schemas.diagnosis import (
     WorkerHeartbeatRequest, WorkerRegistrationRequest, WorkerRegistrationResponse
 )
 from routers.auth import get_current_user
+from utils.pagination import paginate
 from models.user import User
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -470,6 +471,51 @@ async def get_queue_status(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取队列状态失败: {str(e)}")
 
+@router.get("/queue/dead-letters")
+async def get_dead_letters(
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """查看延迟重试队列积压和死信队列中的任务（查看不会消费消息）"""
+    try:
+        if not task_queue_manager or not task_queue_manager.is_connected():
+            raise HTTPException(status_code=503, detail="RabbitMQ服务不可用")
+        
+        return {
+            "retry_stats": await task_queue_manager.get_retry_stats(),
+            "dead_letters": await task_queue_manager.peek_dead_letters(min(max(limit, 1), 500))
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取死信队列失败: {str(e)}")
+
+@router.post("/queue/dead-letters/requeue")
+async def requeue_dead_letters(
+    limit: int = 100,
+    task_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """将死信队列中的任务重新投递（可按task_id过滤），重试次数清零
+    
+    事件任务已删除、停用或不再是失败状态时不投递，消息保留在死信队列并在 refused 中返回。
+    """
+    try:
+        if not task_queue_manager or not task_queue_manager.is_connected():
+            raise HTTPException(status_code=503, detail="RabbitMQ服务不可用")
+        
+        result = await task_queue_manager.requeue_dead_letters(min(max(limit, 1), 1000), task_id)
+        message = f"已重新投递 {result['requeued']} 个任务"
+        if result['refused']:
+            message += f"，{len(result['refused'])} 个任务状态不允许重新投递"
+        return {"message": message, **result}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新投递死信失败: {str(e)}")
+
 # Worker无认证API路由
 @no_auth_router.post("/register", response_model=WorkerRegistrationResponse)
 async def register_worker(
@@ -699,10 +745,12 @@ async def get_diagnosis_results(
     status: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    use_cursor: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取诊断结果列表"""
+    """获取诊断结果列表（支持游标分页: 传入use_cursor=true或上一页的next_cursor）"""
     try:
         # 构建查询条件
         conditions = []
@@ -729,19 +777,11 @@ async def get_diagnosis_results(
             query = query.where(and_(*conditions))
         
         # 排序和分页
-        query = query.order_by(desc(DiagnosisResult.created_at))
-        offset = (page - 1) * page_size
-        query = query.offset(offset).limit(page_size)
-        
-        result = await db.execute(query)
-        results = result.scalars().all()
-        
-        # 获取总数
-        count_query = select(func.count(DiagnosisResult.id))
-        if conditions:
-            count_query = count_query.where(and_(*conditions))
-        count_result = await db.execute(count_query)
-        total = count_result.scalar()
+        page_result = await paginate(
+            db, query, DiagnosisResult,
+            page=page, page_size=page_size, cursor=cursor, use_cursor=use_cursor
+        )
+        results = page_result.items
         
         # 转换结果格式以匹配前端期望
         formatted_results = []
@@ -787,12 +827,17 @@ async def get_diagnosis_results(
         
         return {
             "results": formatted_results,
-            "total": total,
+            "total": page_result.total,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": page_result.total_pages(page_size),
+            "total_is_exact": page_result.total_is_exact,
+            "has_more": page_result.has_more,
+            "next_cursor": page_result.next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取诊断结果失败: {str(e)}")
 
@@ -1153,10 +1198,12 @@ async def get_diagnosis_alarms(
     page_size: int = 20,
     severity: Optional[str] = None,
     is_acknowledged: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    use_cursor: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取诊断告警列表"""
+    """获取诊断告警列表（支持游标分页: 传入use_cursor=true或上一页的next_cursor）"""
     try:
         # 构建查询条件
         conditions = []
@@ -1173,20 +1220,11 @@ async def get_diagnosis_alarms(
             query = query.where(and_(*conditions))
         
         # 分页
-        offset = (page - 1) * page_size
-        query = query.order_by(desc(DiagnosisAlarm.created_at))
-        query = query.offset(offset).limit(page_size)
-        
-        result = await db.execute(query)
-        alarms = result.scalars().all()
-        
-        # 查询总数
-        count_query = select(func.count(DiagnosisAlarm.id))
-        if conditions:
-            count_query = count_query.where(and_(*conditions))
-        
-        count_result = await db.execute(count_query)
-        total = count_result.scalar() or 0
+        page_result = await paginate(
+            db, query, DiagnosisAlarm,
+            page=page, page_size=page_size, cursor=cursor, use_cursor=use_cursor
+        )
+        alarms = page_result.items
         
         # 转换为响应格式，包含关联的诊断结果信息
         alarm_list = []
@@ -1233,12 +1271,17 @@ async def get_diagnosis_alarms(
         
         return {
             "items": alarm_list,
-            "total": total,
+            "total": page_result.total,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": page_result.total_pages(page_size),
+            "total_is_exact": page_result.total_is_exact,
+            "has_more": page_result.has_more,
+            "next_cursor": page_result.next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取告警列表失败: {str(e)}")
 
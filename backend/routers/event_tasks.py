@@ -10,6 +10,9 @@ from models.event_task import EventTask, EventTaskStatus, EventTaskType, EventTa
 from models.user import User
 from routers.auth import get_current_user
 from rabbitmq_event_task_manager import rabbitmq_event_task_manager as event_task_manager
+from utils.task_lease import (
+    DEFAULT_LEASE_SECONDS, claim_task, claim_tasks, finish_task, finish_worker_task, renew_lease, renew_worker_lease
+)
 
 router = APIRouter()
 
@@ -578,56 +581,45 @@ async def get_running_tasks(
         )
 
 # Worker节点任务获取API（无认证）
+def _worker_task_payload(task: EventTask, node_id: str) -> Dict[str, Any]:
+    return {
+        "id": task.id,
+        "task_id": task.task_id,
+        "name": task.name,
+        "task_type": task.task_type.value,
+        "ai_service_id": task.ai_service_id,
+        "camera_id": task.camera_id,
+        "camera_name": task.camera_name,
+        "algorithm_id": task.algorithm_id,
+        "algorithm_name": task.algorithm_name,
+        "model_id": task.model_id,
+        "model_name": task.model_name,
+        "detection_config": task.detection_config,
+        "roi_areas": task.roi_areas,
+        "alarm_threshold": task.alarm_threshold,
+        "check_interval": task.check_interval,
+        "assigned_node": node_id,
+        "fencing_token": task.fencing_token,
+        "lease_expires_at": task.lease_expires_at
+    }
+
 @router.get("/worker/tasks/fetch", dependencies=[])
 async def fetch_event_tasks_for_worker(
     node_id: str = Query(..., description="Worker节点ID"),
     batch_size: int = Query(1, ge=1, le=10, description="批量获取任务数量"),
+    lease_seconds: int = Query(DEFAULT_LEASE_SECONDS, ge=10, le=3600, description="租约时长(秒)"),
     db: AsyncSession = Depends(get_db)
 ):
-    """为分布式Worker节点获取待执行的事件任务"""
+    """为分布式Worker节点领取待执行的事件任务
+
+    通过 FOR UPDATE SKIP LOCKED 原子领取，并发拉取的Worker不会拿到同一任务。
+    返回的 fencing_token 需在心跳和完成回调中回传。
+    """
     try:
-        # 查找状态为PENDING且分配给该worker或未分配的事件任务
-        query = select(EventTask).where(
-            and_(
-                EventTask.is_active == True,
-                EventTask.status == EventTaskStatus.PENDING,
-                or_(
-                    EventTask.assigned_worker == node_id,
-                    EventTask.assigned_worker.is_(None)
-                )
-            )
-        ).limit(batch_size)
-        
-        result = await db.execute(query)
-        tasks = result.scalars().all()
-        
-        # 将任务标记为运行中并分配给该worker
-        task_list = []
-        for task in tasks:
-            task.status = EventTaskStatus.RUNNING
-            task.assigned_worker = node_id
-            task.worker_heartbeat = datetime.now()
-            task_list.append({
-                "id": task.id,
-                "task_id": task.task_id,
-                "name": task.name,
-                "task_type": task.task_type.value,
-                "ai_service_id": task.ai_service_id,
-                "camera_id": task.camera_id,
-                "camera_name": task.camera_name,
-                "algorithm_id": task.algorithm_id,
-                "algorithm_name": task.algorithm_name,
-                "model_id": task.model_id,
-                "model_name": task.model_name,
-                "detection_config": task.detection_config,
-                "roi_areas": task.roi_areas,
-                "alarm_threshold": task.alarm_threshold,
-                "check_interval": task.check_interval,
-                "assigned_node": node_id
-            })
-        
+        tasks = await claim_tasks(db, node_id, batch_size, lease_seconds)
         await db.commit()
         
+        task_list = [_worker_task_payload(task, node_id) for task in tasks]
         return {
             "tasks": task_list,
             "total_available": len(task_list)
@@ -640,15 +632,57 @@ async def fetch_event_tasks_for_worker(
             detail=f"获取事件任务失败: {str(e)}"
         )
 
+@router.post("/worker/tasks/{task_id}/claim")
+async def claim_event_task_for_worker(
+    task_id: int,
+    node_id: str = Query(..., description="Worker节点ID"),
+    lease_seconds: int = Query(DEFAULT_LEASE_SECONDS, ge=10, le=3600, description="租约时长(秒)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Worker收到队列投递后领取指定任务，已被领取或不可执行时返回409"""
+    try:
+        task = await claim_task(db, task_id, node_id, lease_seconds)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"领取事件任务失败: {str(e)}"
+        )
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="事件任务已被领取或当前不可执行"
+        )
+    return _worker_task_payload(task, node_id)
+
 @router.post("/worker/tasks/{task_id}/complete")
 async def complete_event_task(
     task_id: int,
     result_data: Dict[str, Any],
     node_id: str = Query(..., description="Worker节点ID"),
+    fencing_token: Optional[int] = Query(None, description="领取任务时返回的租约令牌"),
     db: AsyncSession = Depends(get_db)
 ):
-    """分布式Worker节点完成事件任务后的回调"""
+    """分布式Worker节点完成事件任务后的回调
+
+    携带 fencing_token 时按令牌结束租约，未携带时要求任务仍由该Worker持有；
+    租约已失效（任务已被回收或重新领取）时返回409且不记录结果。
+    """
     try:
+        success = bool(result_data.get("success", False))
+        if fencing_token is not None:
+            finished = await finish_task(db, task_id, fencing_token, success, result_data.get("error_message"))
+        else:
+            finished = await finish_worker_task(db, task_id, node_id, success, result_data.get("error_message"))
+        if not finished:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="任务租约已失效，结果未记录"
+            )
+        
         # 查询任务
         result = await db.execute(
             select(EventTask).where(EventTask.id == task_id)
@@ -661,8 +695,7 @@ async def complete_event_task(
                 detail="事件任务不存在"
             )
         
-        # 更新任务状态和统计信息
-        task.status = EventTaskStatus.COMPLETED if result_data.get("success", False) else EventTaskStatus.FAILED
+        # 更新统计信息
         task.last_detection_time = datetime.now()
         
         # 更新检测统计
@@ -703,6 +736,10 @@ async def complete_event_task(
         
         await db.commit()
         
+        # 失败时经延迟队列按退避时间安排重试（重试次数用尽进入死信队列）
+        if not success:
+            await event_task_manager.schedule_retry(finished, result_data.get("error_message"))
+        
         return {"message": "事件任务完成状态已更新"}
         
     except HTTPException:
@@ -718,30 +755,27 @@ async def complete_event_task(
 async def update_event_task_heartbeat(
     task_id: int,
     node_id: str = Query(..., description="Worker节点ID"),
+    fencing_token: Optional[int] = Query(None, description="领取任务时返回的租约令牌"),
+    lease_seconds: int = Query(DEFAULT_LEASE_SECONDS, ge=10, le=3600, description="租约时长(秒)"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Worker节点更新事件任务心跳"""
+    """Worker节点更新事件任务心跳并续约
+
+    携带 fencing_token 时按令牌续约，未携带时（旧版Worker）按 assigned_worker 续约；
+    租约已失效返回409，执行者应停止执行。
+    """
     try:
-        result = await db.execute(
-            select(EventTask).where(
-                and_(
-                    EventTask.id == task_id,
-                    EventTask.assigned_worker == node_id
-                )
-            )
-        )
-        task = result.scalar_one_or_none()
-        
-        if not task:
+        if fencing_token is not None:
+            renewed = await renew_lease(db, task_id, fencing_token, lease_seconds)
+        else:
+            renewed = await renew_worker_lease(db, task_id, node_id, lease_seconds)
+        await db.commit()
+        if not renewed:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="事件任务不存在或未分配给该Worker"
+                status_code=status.HTTP_409_CONFLICT,
+                detail="任务租约已失效，请停止执行"
             )
-        
-        task.worker_heartbeat = datetime.now()
-        await db.commit()
-        
-        return {"message": "心跳更新成功"}
+        return {"message": "心跳更新成功", "lease_renewed": True}
         
     except HTTPException:
         raise
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, desc
+from sqlalchemy import select, func, and_, or_, desc, case
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date, timedelta
 
 from database import get_db
-from models.event import Event, EventRule, EventNotification, EventStatistics, EventType, EventLevel, EventStatus
+from models.event import Event, EventRule, EventNotification, EventStatistics, EventDailyStats, EventType, EventLevel, EventStatus
 from models.user import User
 from routers.auth import get_current_user
+from utils.cache import stats_cache
+from utils.event_rollup import get_event_bucket, apply_event_change
+from utils.pagination import paginate
 
 router = APIRouter()
 
@@ -112,6 +115,9 @@ class EventListResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    total_is_exact: bool = True
+    has_more: bool = False
+    next_cursor: Optional[str] = None
 
 class EventRuleCreate(BaseModel):
     name: str
@@ -202,6 +208,8 @@ async def get_events(
     is_ongoing: Optional[bool] = Query(None, description="是否正在进行中筛选"),
     start_date: Optional[date] = Query(None, description="开始日期"),
     end_date: Optional[date] = Query(None, description="结束日期"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor）"),
+    use_cursor: bool = Query(False, description="使用游标分页（总数最多统计到上限）"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -251,26 +259,15 @@ async def get_events(
         end_datetime = datetime.combine(end_date, datetime.max.time())
         conditions.append(Event.created_at <= end_datetime)
     
-    # 计算总数
-    count_query = select(func.count(Event.id))
-    if conditions:
-        count_query = count_query.where(and_(*conditions))
-    
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    
-    # 查询事件列表
-    query = select(Event).order_by(desc(Event.created_at))
+    query = select(Event)
     if conditions:
         query = query.where(and_(*conditions))
     
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
-    
-    result = await db.execute(query)
-    events = result.scalars().all()
-    
-    total_pages = (total + page_size - 1) // page_size
+    page_result = await paginate(
+        db, query, Event,
+        page=page, page_size=page_size, cursor=cursor, use_cursor=use_cursor
+    )
+    events = page_result.items
     
     return EventListResponse(
         events=[EventResponse(
@@ -309,10 +306,13 @@ async def get_events(
             event_metadata=event.event_metadata or {},
             tags=event.tags or []
         ) for event in events],
-        total=total,
+        total=page_result.total,
         page=page,
         page_size=page_size,
-        total_pages=total_pages
+        total_pages=page_result.total_pages(page_size),
+        total_is_exact=page_result.total_is_exact,
+        has_more=page_result.has_more,
+        next_cursor=page_result.next_cursor
     )
 
 @router.post("/", response_model=EventResponse)
@@ -333,7 +333,10 @@ async def create_event(
     
     event = Event(**event_dict)
     db.add(event)
+    await db.flush()
+    await apply_event_change(db, None, await get_event_bucket(db, event.id))
     await db.commit()
+    await stats_cache.invalidate_tags("events")
     await db.refresh(event)
     
     return EventResponse(
@@ -451,10 +454,14 @@ async def update_event(
         update_data['processed_by'] = current_user.username
         update_data['processed_at'] = datetime.utcnow()
     
+    old_bucket = await get_event_bucket(db, event.id)
     for field, value in update_data.items():
         setattr(event, field, value)
     
+    await db.flush()
+    await apply_event_change(db, old_bucket, await get_event_bucket(db, event.id))
     await db.commit()
+    await stats_cache.invalidate_tags("events")
     await db.refresh(event)
     
     return EventResponse(
@@ -510,8 +517,11 @@ async def delete_event(
             detail="事件不存在"
         )
     
+    old_bucket = await get_event_bucket(db, event.id)
     await db.delete(event)
+    await apply_event_change(db, old_bucket, None)
     await db.commit()
+    await stats_cache.invalidate_tags("events")
     
     return {"message": "事件删除成功"}
 
@@ -542,13 +552,17 @@ async def confirm_event(
             detail="只能确认待处理状态的事件"
         )
     
+    old_bucket = await get_event_bucket(db, event.id)
     event.status = EventStatus.CONFIRMED
     event.processed_by = current_user.username
     event.processed_at = datetime.utcnow()
     if status_data.resolution_notes:
         event.resolution_notes = status_data.resolution_notes
     
+    await db.flush()
+    await apply_event_change(db, old_bucket, await get_event_bucket(db, event.id))
     await db.commit()
+    await stats_cache.invalidate_tags("events")
     await db.refresh(event)
     
     return EventResponse(
@@ -611,13 +625,17 @@ async def mark_false_alarm(
             detail="只能标记待处理状态的事件为误报"
         )
     
+    old_bucket = await get_event_bucket(db, event.id)
     event.status = EventStatus.FALSE_ALARM
     event.processed_by = current_user.username
     event.processed_at = datetime.utcnow()
     if status_data.resolution_notes:
         event.resolution_notes = status_data.resolution_notes
     
+    await db.flush()
+    await apply_event_change(db, old_bucket, await get_event_bucket(db, event.id))
     await db.commit()
+    await stats_cache.invalidate_tags("events")
     await db.refresh(event)
     
     return EventResponse(
@@ -766,113 +784,99 @@ async def get_event_stats(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取事件统计信息"""
-    # 总事件数
-    total_result = await db.execute(select(func.count(Event.id)))
-    total_events = total_result.scalar()
-    
-    # 待处理事件数
-    pending_result = await db.execute(select(func.count(Event.id)).where(Event.status == EventStatus.PENDING))
-    pending_events = pending_result.scalar()
-    
-    # 已处理事件数
-    handled_result = await db.execute(select(func.count(Event.id)).where(Event.status == EventStatus.HANDLED))
-    handled_events = handled_result.scalar()
-    
-    # 各级别事件数
-    critical_result = await db.execute(select(func.count(Event.id)).where(Event.level == EventLevel.CRITICAL))
-    critical_events = critical_result.scalar()
-    
-    warning_result = await db.execute(select(func.count(Event.id)).where(Event.level == EventLevel.WARNING))
-    warning_events = warning_result.scalar()
-    
-    info_result = await db.execute(select(func.count(Event.id)).where(Event.level == EventLevel.INFO))
-    info_events = info_result.scalar()
-    
-    # 今日事件数
-    today = date.today()
-    today_result = await db.execute(
-        select(func.count(Event.id))
-        .where(func.date(Event.created_at) == today)
-    )
-    today_events = today_result.scalar()
-    
-    # 按类型统计
-    type_result = await db.execute(
-        select(Event.event_type, func.count(Event.id))
-        .group_by(Event.event_type)
-    )
-    by_type = {str(row[0].value): row[1] for row in type_result.all()}
-    
-    # 按级别统计
-    level_result = await db.execute(
-        select(Event.level, func.count(Event.id))
-        .group_by(Event.level)
+    """获取事件统计信息（共享缓存）"""
+    return await stats_cache.get_or_set(
+        f"events:stats:{days}",
+        lambda: _compute_event_stats(db, days),
+        ttl=30,
+        tags=["events"]
     )
-    by_level = {str(row[0].value): row[1] for row in level_result.all()}
-    
-    # 按状态统计
-    status_result = await db.execute(
-        select(Event.status, func.count(Event.id))
-        .group_by(Event.status)
+
+# 统计口径: 已处理 = 已解决/误报/已忽略；告警 = 高/中级，提示 = 低级
+HANDLED_STATUSES = {EventStatus.RESOLVED.name, EventStatus.FALSE_ALARM.name, EventStatus.IGNORED.name}
+WARNING_LEVELS = {EventLevel.HIGH.name, EventLevel.MEDIUM.name}
+INFO_LEVELS = {EventLevel.LOW.name}
+
+def _enum_value(enum_cls, name: str) -> str:
+    """将汇总表中的枚举名称转换为接口返回的枚举值"""
+    try:
+        return enum_cls[name].value
+    except KeyError:
+        return name
+
+async def _compute_event_stats(db: AsyncSession, days: int) -> EventStatsResponse:
+    """计算事件统计信息（单次聚合查询日汇总表）"""
+    today = date.today()
+    start_date = today - timedelta(days=days - 1)
+    
+    # 趋势窗口内按日期分组，窗口外的日期合并为一组，结果行数与天数成正比
+    window_date = case((EventDailyStats.stat_date >= start_date, EventDailyStats.stat_date), else_=None)
+    result = await db.execute(
+        select(
+            window_date.label('stat_date'),
+            EventDailyStats.event_type,
+            EventDailyStats.event_level,
+            EventDailyStats.status,
+            func.sum(EventDailyStats.event_count).label('count')
+        ).group_by(
+            window_date,
+            EventDailyStats.event_type,
+            EventDailyStats.event_level,
+            EventDailyStats.status
+        )
     )
-    by_status = {str(row[0].value): row[1] for row in status_result.all()}
     
-    # 趋势数据
-    trend_data = []
-    for i in range(days):
-        target_date = today - timedelta(days=i)
+    total_events = pending_events = handled_events = 0
+    critical_events = warning_events = info_events = today_events = 0
+    by_type: Dict[str, int] = {}
+    by_level: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    daily: Dict[date, Dict[str, int]] = {
+        start_date + timedelta(days=i): {"count": 0, "critical_count": 0, "warning_count": 0, "info_count": 0}
+        for i in range(days)
+    }
+    
+    for row in result.all():
+        count = int(row.count or 0)
+        if not count:
+            continue
         
-        # 当日总数
-        daily_result = await db.execute(
-            select(func.count(Event.id))
-            .where(func.date(Event.created_at) == target_date)
-        )
-        daily_count = daily_result.scalar()
-        
-        # 当日各级别数量
-        critical_daily = await db.execute(
-            select(func.count(Event.id))
-            .where(
-                and_(
-                    func.date(Event.created_at) == target_date,
-                    Event.level == EventLevel.CRITICAL
-                )
-            )
-        )
-        critical_count = critical_daily.scalar()
+        total_events += count
+        if row.status == EventStatus.PENDING.name:
+            pending_events += count
+        elif row.status in HANDLED_STATUSES:
+            handled_events += count
         
-        warning_daily = await db.execute(
-            select(func.count(Event.id))
-            .where(
-                and_(
-                    func.date(Event.created_at) == target_date,
-                    Event.level == EventLevel.WARNING
-                )
-            )
-        )
-        warning_count = warning_daily.scalar()
+        level_key = None
+        if row.event_level == EventLevel.CRITICAL.name:
+            critical_events += count
+            level_key = "critical_count"
+        elif row.event_level in WARNING_LEVELS:
+            warning_events += count
+            level_key = "warning_count"
+        elif row.event_level in INFO_LEVELS:
+            info_events += count
+            level_key = "info_count"
         
-        info_daily = await db.execute(
-            select(func.count(Event.id))
-            .where(
-                and_(
-                    func.date(Event.created_at) == target_date,
-                    Event.level == EventLevel.INFO
-                )
-            )
-        )
-        info_count = info_daily.scalar()
+        type_value = _enum_value(EventType, row.event_type)
+        level_value = _enum_value(EventLevel, row.event_level)
+        status_value = _enum_value(EventStatus, row.status)
+        by_type[type_value] = by_type.get(type_value, 0) + count
+        by_level[level_value] = by_level.get(level_value, 0) + count
+        by_status[status_value] = by_status.get(status_value, 0) + count
         
-        trend_data.append({
-            "date": target_date.strftime("%Y-%m-%d"),
-            "count": daily_count,
-            "critical_count": critical_count,
-            "warning_count": warning_count,
-            "info_count": info_count
-        })
-    
-    trend_data.reverse()  # 按时间正序排列
+        day = daily.get(row.stat_date)
+        if day is not None:
+            day["count"] += count
+            if level_key:
+                day[level_key] += count
+            if row.stat_date == today:
+                today_events += count
+    
+    trend_data = [
+        {"date": stat_date.strftime("%Y-%m-%d"), **counts}
+        for stat_date, counts in daily.items()
+    ]
     
     return EventStatsResponse(
         total_events=total_events,
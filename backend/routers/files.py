@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response, Request, Header
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from minio import Minio
 from minio.error import S3Error
-from typing import Optional, Dict, Any
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import logging
+import time
 
 from database import get_db, get_minio
 from models.user import User
 from models.ai_algorithm import AIAlgorithm
 from routers.auth import get_current_user
-from utils.file_upload import get_file_upload_service, FileUploadService
+from utils.file_upload import (
+    get_file_upload_service, FileUploadService,
+    get_multipart_upload_service, ModelMultipartUploadService
+)
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -51,33 +60,258 @@ async def upload_avatar(
         logger.error(f"Avatar upload failed: {e}")
         raise HTTPException(status_code=500, detail="头像上传失败")
 
+class MultipartUploadInitiate(BaseModel):
+    file_name: str
+    file_size: int
+    part_size: Optional[int] = None
+
+
+# 模型文件分片续传：需注册在通配文件路由之前
+@router.post("/upload/model/multipart")
+async def initiate_model_multipart_upload(
+    upload_data: MultipartUploadInitiate,
+    current_user: User = Depends(get_current_user),
+    upload_service: ModelMultipartUploadService = Depends(get_multipart_upload_service)
+) -> Dict[str, Any]:
+    """创建模型文件分片上传会话"""
+    result = await upload_service.initiate(
+        upload_data.file_name, upload_data.file_size, current_user.id, upload_data.part_size
+    )
+    return {
+        "message": "分片上传会话已创建",
+        "data": result
+    }
+
+
+@router.put("/upload/model/multipart/{upload_id}/parts/{part_number}")
+async def upload_model_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    content_md5: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    upload_service: ModelMultipartUploadService = Depends(get_multipart_upload_service)
+) -> Dict[str, Any]:
+    """上传单个分片（请求体为分片原始字节，可并行上传）"""
+    content_length = request.headers.get("content-length")
+    if content_length:
+        try:
+            content_length = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Content-Length 无效")
+        if content_length > ModelMultipartUploadService.MAX_PART_SIZE:
+            raise HTTPException(status_code=413, detail="分片过大")
+    
+    result = await upload_service.upload_part(
+        upload_id, part_number, request.stream(), current_user.id, content_md5
+    )
+    return {
+        "message": "分片上传成功",
+        "data": result
+    }
+
+
+@router.get("/upload/model/multipart/{upload_id}")
+async def get_model_multipart_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    upload_service: ModelMultipartUploadService = Depends(get_multipart_upload_service)
+) -> Dict[str, Any]:
+    """查询分片上传进度，用于断点续传"""
+    return {"data": await upload_service.get_status(upload_id, current_user.id)}
+
+
+@router.post("/upload/model/multipart/{upload_id}/complete")
+async def complete_model_multipart_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    upload_service: ModelMultipartUploadService = Depends(get_multipart_upload_service)
+) -> Dict[str, Any]:
+    """校验并合并全部分片"""
+    result = await upload_service.complete(upload_id, current_user.id)
+    return {
+        "message": "模型文件上传成功",
+        "data": result
+    }
+
+
+@router.delete("/upload/model/multipart/{upload_id}")
+async def abort_model_multipart_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    upload_service: ModelMultipartUploadService = Depends(get_multipart_upload_service)
+) -> Dict[str, Any]:
+    """取消分片上传"""
+    await upload_service.abort(upload_id, current_user.id)
+    return {"message": "分片上传已取消"}
+
+# 对象元数据缓存：{object_name: (过期时间, stat)}，避免每次请求都访问MinIO
+_STAT_CACHE_TTL = 60
+_STAT_CACHE_MAX_SIZE = 2048
+_stat_cache: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+# 流式传输分块大小范围
+_MIN_CHUNK_SIZE = 64 * 1024
+_MAX_CHUNK_SIZE = 1024 * 1024
+
+
+async def _get_object_stat(minio_client: Minio, object_name: str):
+    """获取对象元数据（带短期缓存）"""
+    now = time.monotonic()
+    cached = _stat_cache.get(object_name)
+    if cached and cached[0] > now:
+        _stat_cache.move_to_end(object_name)
+        return cached[1]
+    
+    stat = await run_in_threadpool(
+        minio_client.stat_object,
+        bucket_name=settings.MINIO_BUCKET_NAME,
+        object_name=object_name
+    )
+    _stat_cache[object_name] = (now + _STAT_CACHE_TTL, stat)
+    _stat_cache.move_to_end(object_name)
+    while len(_stat_cache) > _STAT_CACHE_MAX_SIZE:
+        _stat_cache.popitem(last=False)
+    return stat
+
+
+def _parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """解析单段Range请求头，返回闭区间 (start, end)
+    
+    Returns:
+        None 表示不是可处理的字节范围请求，包括格式无效的Range（RFC 9110 要求忽略，按完整内容返回）
+    
+    Raises:
+        ValueError: 格式有效但范围无法满足，应返回416
+    """
+    if not range_header.startswith("bytes="):
+        return None
+    ranges = range_header[len("bytes="):].strip()
+    # 只支持单段范围，多段请求按完整内容返回
+    if "," in ranges:
+        return None
+    
+    start_str, sep, end_str = ranges.partition("-")
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not sep or not (start_str or end_str):
+        return None
+    if not all(part.isdigit() for part in (start_str, end_str) if part):
+        return None
+    
+    if not start_str:
+        # 后缀范围: bytes=-500，长度为0时无法满足
+        suffix_length = int(end_str)
+        if suffix_length == 0 or file_size == 0:
+            raise ValueError("unsatisfiable suffix range")
+        return max(file_size - suffix_length, 0), file_size - 1
+    
+    start = int(start_str)
+    if end_str and int(end_str) < start:
+        # last-pos 小于 first-pos 属于格式无效
+        return None
+    if start >= file_size:
+        raise ValueError("unsatisfiable range")
+    end = int(end_str) if end_str else file_size - 1
+    return start, min(end, file_size - 1)
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """根据 If-None-Match / If-Modified-Since 判断是否可以返回304"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match 优先于 If-Modified-Since
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            # "-0000" 或不带时区的日期解析为naive时间，按UTC处理
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            if last_modified.tzinfo is None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+            return last_modified.replace(microsecond=0) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 @router.get("/{file_path:path}")
 async def get_file(
     file_path: str,
+    request: Request,
     minio_client: Minio = Depends(get_minio)
 ):
-    """获取文件内容"""
+    """获取文件内容
+    
+    支持 Range 分段下载（视频拖动、断点续传）以及 If-None-Match / If-Modified-Since 条件请求。
+    """
     try:
-        # 从MinIO获取文件
-        response = minio_client.get_object(
-            bucket_name=settings.MINIO_BUCKET_NAME,
-            object_name=file_path
-        )
+        # 获取文件信息（一次stat，带缓存）
+        stat = await _get_object_stat(minio_client, file_path)
         
-        # 获取文件信息
-        stat = minio_client.stat_object(
-            bucket_name=settings.MINIO_BUCKET_NAME,
-            object_name=file_path
-        )
+        etag = f'"{stat.etag}"'
+        file_size = stat.size
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "public, max-age=3600",  # 缓存1小时
+            "ETag": etag
+        }
+        if stat.last_modified:
+            headers["Last-Modified"] = format_datetime(stat.last_modified, usegmt=True)
+        
+        # 条件请求：内容未变化时直接返回304
+        if _is_not_modified(request, etag, stat.last_modified):
+            return Response(status_code=304, headers=headers)
+        
+        # 解析Range；If-Range不匹配时忽略Range返回完整内容
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (not if_range or if_range == etag):
+            try:
+                byte_range = _parse_range(range_header, file_size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={**headers, "Content-Range": f"bytes */{file_size}"}
+                )
+        
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        else:
+            start, end = 0, file_size - 1
+            status_code = 200
+        length = end - start + 1
+        headers["Content-Length"] = str(length)
         
         # 确定内容类型
         content_type = stat.content_type or "application/octet-stream"
         
-        # 返回文件流
-        def iterfile():
+        if length <= 0:
+            return Response(status_code=status_code, headers=headers, media_type=content_type)
+        
+        # 从MinIO获取文件（仅请求的范围）
+        response = await run_in_threadpool(
+            minio_client.get_object,
+            bucket_name=settings.MINIO_BUCKET_NAME,
+            object_name=file_path,
+            offset=start,
+            length=length
+        )
+        
+        # 按内容大小选择分块：小文件少分块，大文件减少往返次数
+        chunk_size = min(_MAX_CHUNK_SIZE, max(_MIN_CHUNK_SIZE, length // 16))
+        
+        # 返回文件流，阻塞读取放到线程池中执行
+        async def iterfile():
             try:
                 while True:
-                    chunk = response.read(8192)
+                    chunk = await run_in_threadpool(response.read, chunk_size)
                     if not chunk:
                         break
                     yield chunk
@@ -87,15 +321,13 @@ async def get_file(
         
         return StreamingResponse(
             iterfile(),
+            status_code=status_code,
             media_type=content_type,
-            headers={
-                "Content-Length": str(stat.size),
-                "Cache-Control": "public, max-age=3600",  # 缓存1小时
-                "ETag": stat.etag
-            }
+            headers=headers
         )
         
     except S3Error as e:
+        _stat_cache.pop(file_path, None)
         if e.code == "NoSuchKey":
             raise HTTPException(status_code=404, detail="文件不存在")
         logger.error(f"MinIO error: {e}")
@@ -136,11 +368,15 @@ async def delete_avatar(
 
 @router.post("/upload/algorithm-package")
 async def upload_algorithm_package(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: User = Depends(get_current_user),
     file_service: FileUploadService = Depends(get_file_upload_service)
 ) -> Dict[str, Any]:
-    """上传算法包"""
+    """上传算法包（multipart字段名 file，接收时即按 MAX_ALGORITHM_PACKAGE_SIZE 限制大小）"""
+    max_size = settings.MAX_ALGORITHM_PACKAGE_SIZE
+    file = await file_service.receive_upload(
+        request, max_size, f"算法包大小不能超过{max_size // (1024 * 1024)}MB"
+    )
     try:
         result = await file_service.upload_algorithm_package(file, current_user.id)
         return {
@@ -152,6 +388,8 @@ async def upload_algorithm_package(
     except Exception as e:
         logger.error(f"Algorithm package upload error: {e}")
         raise HTTPException(status_code=500, detail="算法包上传失败")
+    finally:
+        await file.close()
 
 
 @router.post("/upload/model")
@@ -197,6 +435,8 @@ async def install_algorithm_package(
             tags=package_info.get("tags", []),
             config_schema=package_info.get("config_schema", {}),
             file_path=file_url,  # 修复字段名：package_url -> file_path
+            file_size=package_data.get("file_size"),
+            file_hash=package_data.get("file_hash"),  # Worker据此校验并缓存算法包
             input_format=package_info.get("input_format", {}),
             output_format=package_info.get("output_format", {}),
             performance_metrics=package_info.get("performance_metrics", {}),
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from database import get_db
 from models.user import User, UserMessage
 from routers.auth import get_current_user
+from utils.pagination import paginate
 
 router = APIRouter(prefix="/api/v1/messages", tags=["messages"])
 
@@ -40,6 +41,9 @@ class MessageListResponse(BaseModel):
     messages: List[MessageResponse]
     total: int
     unread_count: int
+    total_is_exact: bool = True
+    has_more: bool = False
+    next_cursor: Optional[str] = None
 
 class MessageMarkReadRequest(BaseModel):
     message_ids: List[int]
@@ -51,6 +55,8 @@ async def get_user_messages(
     category: Optional[str] = Query(None, description="消息分类筛选"),
     is_read: Optional[bool] = Query(None, description="是否已读筛选"),
     message_type: Optional[str] = Query(None, description="消息类型筛选"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor）"),
+    use_cursor: bool = Query(False, description="使用游标分页（总数最多统计到上限）"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -64,11 +70,6 @@ async def get_user_messages(
     if message_type:
         conditions.append(UserMessage.message_type == message_type)
     
-    # 获取总数
-    total_query = select(func.count(UserMessage.id)).where(and_(*conditions))
-    total_result = await db.execute(total_query)
-    total = total_result.scalar()
-    
     # 获取未读数量
     unread_query = select(func.count(UserMessage.id)).where(
         and_(UserMessage.receiver_id == current_user.id, UserMessage.is_read == False)
@@ -77,18 +78,12 @@ async def get_user_messages(
     unread_count = unread_result.scalar()
     
     # 获取消息列表
-    offset = (page - 1) * page_size
-    query = (
-        select(UserMessage)
-        .options(selectinload(UserMessage.sender))
-        .where(and_(*conditions))
-        .order_by(desc(UserMessage.created_at))
-        .offset(offset)
-        .limit(page_size)
+    page_result = await paginate(
+        db, select(UserMessage).where(and_(*conditions)), UserMessage,
+        page=page, page_size=page_size, cursor=cursor, use_cursor=use_cursor,
+        options=[selectinload(UserMessage.sender)]
     )
-    
-    result = await db.execute(query)
-    messages = result.scalars().all()
+    messages = page_result.items
     
     message_responses = []
     for message in messages:
@@ -110,8 +105,11 @@ async def get_user_messages(
     
     return MessageListResponse(
         messages=message_responses,
-        total=total,
-        unread_count=unread_count
+        total=page_result.total,
+        unread_count=unread_count,
+        total_is_exact=page_result.total_is_exact,
+        has_more=page_result.has_more,
+        next_cursor=page_result.next_cursor
     )
 
 @router.get("/unread-count")
@@ -9,6 +9,7 @@ import json
 from database import get_db
 from models.diagnosis import NotificationChannel, NotificationLog
 from models.user import User
+from notification_dispatcher import ChannelConfig, notification_dispatcher
 from routers.auth import get_current_user
 
 router = APIRouter(prefix="/api/v1/notification-channels", tags=["通知渠道"])
@@ -130,6 +131,13 @@ async def get_notification_stats(
         "success_rate": round(success_rate, 2)
     }
 
+@router.get("/dispatcher/stats")
+async def get_dispatcher_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取通知调度器状态（各渠道队列深度、发送/失败/重试次数）"""
+    return notification_dispatcher.get_stats()
+
 @router.get("/", response_model=List[NotificationChannelResponse])
 async def get_notification_channels(
     page: int = Query(1, ge=1, description="页码"),
@@ -282,6 +290,7 @@ async def update_notification_channel(
     
     await db.commit()
     await db.refresh(channel)
+    notification_dispatcher.forget_channel(channel_id)
     
     # 隐藏敏感信息
     if 'password' in channel.config:
@@ -315,6 +324,7 @@ async def delete_notification_channel(
     
     await db.delete(channel)
     await db.commit()
+    notification_dispatcher.forget_channel(channel_id)
     
     return {"message": "通知渠道删除成功"}
 
@@ -343,9 +353,12 @@ async def test_notification_channel(
             detail="通知渠道已禁用"
         )
     
-    # 这里应该调用实际的通知发送服务
-    # 目前只是模拟测试
     try:
+        # 立即经渠道发送器发送（不排队、不合并），失败时记录失败日志
+        await notification_dispatcher.send_test(
+            ChannelConfig.from_model(channel), test_data.title, test_data.content, test_data.recipients
+        )
+        
         # 创建测试日志
         log = NotificationLog(
             channel_id=channel_id,
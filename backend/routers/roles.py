@@ -10,6 +10,7 @@ from models.role import Role, Permission, UserRole
 from models.user import User
 from routers.auth import get_current_user
 from routers.users import require_admin
+from utils.auth_cache import auth_cache
 
 router = APIRouter()
 
@@ -255,6 +256,7 @@ async def update_role(
         setattr(role, field, value)
     
     await db.commit()
+    await auth_cache.invalidate_all()
     await db.refresh(role)
     
     return RoleResponse(
@@ -305,6 +307,7 @@ async def delete_role(
     
     await db.delete(role)
     await db.commit()
+    await auth_cache.invalidate_all()
     
     return {"message": "角色删除成功"}
 
@@ -434,6 +437,7 @@ async def assign_user_roles(
         db.add(user_role)
     
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     
     return {"message": "角色分配成功"}
 
@@ -13,6 +13,11 @@ from models.system import (
 )
 from models.user import User
 from routers.auth import get_current_user
+from utils.cache import stats_cache
+from utils.pagination import paginate
+from utils.system_sampler import system_sampler
+from middleware.audit_log_writer import audit_log_writer
+from middleware.logging_config import logging_config, SAMPLING_CONFIG_PREFIX
 
 router = APIRouter()
 
@@ -124,6 +129,9 @@ class SystemLogListResponse(BaseModel):
     page: int
     page_size: int
     pages: int
+    total_is_exact: bool = True
+    has_more: bool = False
+    next_cursor: Optional[str] = None
 
 class SystemMetricsResponse(BaseModel):
     id: int
@@ -233,6 +241,8 @@ async def create_system_config(
     db.add(config)
     await db.commit()
     await db.refresh(config)
+    if config.key.startswith(SAMPLING_CONFIG_PREFIX):
+        await logging_config.refresh_sampling_policy()
     
     return SystemConfigResponse(
         id=config.id,
@@ -303,6 +313,8 @@ async def update_system_config(
     
     await db.commit()
     await db.refresh(config)
+    if config.key.startswith(SAMPLING_CONFIG_PREFIX):
+        await logging_config.refresh_sampling_policy()
     
     return SystemConfigResponse(
         id=config.id,
@@ -335,8 +347,11 @@ async def delete_system_config(
             detail="配置不存在"
         )
     
+    config_key = config.key
     await db.delete(config)
     await db.commit()
+    if config_key.startswith(SAMPLING_CONFIG_PREFIX):
+        await logging_config.refresh_sampling_policy()
     
     return {"message": "配置删除成功"}
 
@@ -564,6 +579,8 @@ async def get_system_logs(
     start_date: Optional[date] = Query(None, description="开始日期"),
     end_date: Optional[date] = Query(None, description="结束日期"),
     search: Optional[str] = Query(None, description="搜索关键词"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor）"),
+    use_cursor: bool = Query(False, description="使用游标分页（总数最多统计到上限）"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -595,22 +612,15 @@ async def get_system_logs(
             )
         )
     
-    query = select(SystemLog).order_by(desc(SystemLog.created_at))
+    query = select(SystemLog)
     if conditions:
         query = query.where(and_(*conditions))
     
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
-    
-    # 获取总数
-    count_query = select(func.count(SystemLog.id))
-    if conditions:
-        count_query = count_query.where(and_(*conditions))
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    
-    result = await db.execute(query)
-    logs = result.scalars().all()
+    page_result = await paginate(
+        db, query, SystemLog,
+        page=page, page_size=page_size, cursor=cursor, use_cursor=use_cursor
+    )
+    logs = page_result.items
     
     # 获取用户信息
     user_map = {}
@@ -641,10 +651,28 @@ async def get_system_logs(
     
     return {
         "items": items,
-        "total": total,
+        "total": page_result.total,
         "page": page,
         "page_size": page_size,
-        "pages": (total + page_size - 1) // page_size
+        "pages": page_result.total_pages(page_size),
+        "total_is_exact": page_result.total_is_exact,
+        "has_more": page_result.has_more,
+        "next_cursor": page_result.next_cursor
+    }
+
+@router.get("/logs/writer-stats")
+async def get_log_writer_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取审计日志批量写入器的队列深度、写入统计和采样统计"""
+    return {
+        **audit_log_writer.get_stats(),
+        'sampling': {
+            **logging_config.sampling_stats,
+            'default_sample_rate': logging_config.default_sample_rate,
+            'route_sample_rates': logging_config.route_sample_rates,
+            'client_rate_limit': logging_config.client_rate_limit
+        }
     }
 
 @router.post("/logs/", response_model=SystemLogResponse)
@@ -767,9 +795,16 @@ async def get_system_stats(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取系统统计信息"""
-    import psutil
-    from datetime import timedelta
+    """获取系统统计信息（共享缓存）"""
+    return await stats_cache.get_or_set(
+        "system:stats",
+        lambda: _compute_system_stats(db),
+        ttl=30,
+        tags=["system"]
+    )
+
+async def _compute_system_stats(db: AsyncSession) -> SystemStatsResponse:
+    """计算系统统计信息"""
     
     # 配置统计
     total_configs_result = await db.execute(select(func.count(SystemConfig.id)))
@@ -841,56 +876,16 @@ async def get_system_stats(
         else:
             license_status = "永久"
     
-    # 系统资源使用情况 - 支持多个磁盘
-    disk_usage = []
-    try:
-        # 获取所有磁盘分区
-        partitions = psutil.disk_partitions()
-        for partition in partitions:
-            try:
-                # 跳过特殊文件系统
-                if partition.fstype in ['', 'tmpfs', 'devtmpfs', 'squashfs']:
-                    continue
-                    
-                usage = psutil.disk_usage(partition.mountpoint)
-                disk_info = {
-                    "device": partition.device,
-                    "mountpoint": partition.mountpoint,
-                    "fstype": partition.fstype,
-                    "total": usage.total,
-                    "used": usage.used,
-                    "free": usage.free,
-                    "percent": usage.percent
-                }
-                disk_usage.append(disk_info)
-            except (PermissionError, OSError):
-                # 跳过无法访问的磁盘
-                continue
-    except Exception:
-        # 如果获取多磁盘信息失败，回退到根目录
-        try:
-            usage = psutil.disk_usage('/')
-            disk_usage = [{
-                "device": "/",
-                "mountpoint": "/",
-                "fstype": "unknown",
-                "total": usage.total,
-                "used": usage.used,
-                "free": usage.free,
-                "percent": usage.percent
-            }]
-        except Exception:
-            disk_usage = []
-    
-    memory_info = psutil.virtual_memory()
+    # 系统资源使用情况 - 读取后台采样线程的最新快照（支持多个磁盘）
+    sample = system_sampler.latest()
+    disk_usage = list(sample.disks)
     memory_usage = {
-        "total": memory_info.total,
-        "used": memory_info.used,
-        "available": memory_info.available,
-        "percent": memory_info.percent
+        "total": sample.memory_total,
+        "used": sample.memory_used,
+        "available": sample.memory_available,
+        "percent": sample.memory_percent
     }
-    
-    cpu_usage = psutil.cpu_percent(interval=1)
+    cpu_usage = sample.cpu_percent
     
     return SystemStatsResponse(
         total_configs=total_configs,
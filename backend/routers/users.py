@@ -9,6 +9,7 @@ from database import get_db
 from models.user import User, UserLoginLog
 from models.role import Role, UserRole
 from routers.auth import get_current_user, get_user_roles_and_permissions
+from utils.auth_cache import auth_cache
 from config import settings
 
 router = APIRouter()
@@ -232,6 +233,7 @@ async def create_user(
             db.add(user_role)
     
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     
     # 获取用户角色和权限信息
     user_roles_permissions = await get_user_roles_and_permissions(user, db)
@@ -349,6 +351,7 @@ async def update_user(
     permissions_to_assign = update_data.pop('permissions', None)
     
     # 更新用户基本信息
+    old_username = user.username
     for field, value in update_data.items():
         setattr(user, field, value)
     
@@ -376,6 +379,7 @@ async def update_user(
     
     await db.commit()
     await db.refresh(user)
+    await auth_cache.invalidate_user(old_username, user.username)
     
     # 获取用户的角色和权限信息
     user_roles_permissions = await get_user_roles_and_permissions(user, db)
@@ -423,8 +427,10 @@ async def delete_user(
             detail="用户不存在"
         )
     
+    username = user.username
     await db.delete(user)
     await db.commit()
+    await auth_cache.invalidate_user(username)
     
     return {"message": "用户删除成功"}
 
@@ -447,6 +453,7 @@ async def reset_user_password(
     
     user.set_password(password_data.new_password)
     await db.commit()
+    await auth_cache.invalidate_user(user.username)
     
     return {"message": "密码重置成功"}
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+从events表重建事件日汇总表(event_daily_stats)
+
+用法:
+    python scripts/backfill_event_daily_stats.py              # 全量重建
+    python scripts/backfill_event_daily_stats.py --days 30    # 只重建最近30天
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+from datetime import date, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncSessionLocal
+from utils.event_rollup import rebuild_event_daily_stats
+
+async def backfill_event_daily_stats(days: int = None):
+    """重建事件日汇总数据"""
+    start_date = date.today() - timedelta(days=days - 1) if days else None
+    async with AsyncSessionLocal() as session:
+        try:
+            rows = await rebuild_event_daily_stats(session, start_date=start_date)
+            await session.commit()
+            print(f"事件日汇总重建完成，共写入 {rows} 行")
+        except Exception as e:
+            await session.rollback()
+            print(f"重建事件日汇总失败: {e}")
+            raise
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建事件日汇总表")
+    parser.add_argument("--days", type=int, default=None, help="只重建最近N天（默认全量）")
+    args = parser.parse_args()
+    asyncio.run(backfill_event_daily_stats(args.days))
@@ -176,6 +176,36 @@ DEFAULT_CONFIGS = [
         "is_public": False,
         "is_editable": True,
         "requires_restart": True
+    },
+    {
+        "key": "log.sampling.default_rate",
+        "value": "1.0",
+        "data_type": "float",
+        "category": "日志设置",
+        "description": "请求日志默认采样率(0-1)，错误和慢请求总是记录",
+        "is_public": False,
+        "is_editable": True,
+        "requires_restart": False
+    },
+    {
+        "key": "log.sampling.route_rates",
+        "value": "{}",
+        "data_type": "json",
+        "category": "日志设置",
+        "description": "按路径前缀的请求日志采样率，如 {\"/api/v1/dashboard\": 0.1}，* 匹配一个路径段",
+        "is_public": False,
+        "is_editable": True,
+        "requires_restart": False
+    },
+    {
+        "key": "log.sampling.client_rate_limit",
+        "value": "600",
+        "data_type": "int",
+        "category": "日志设置",
+        "description": "每个用户/IP每分钟最多记录的请求日志条数，0为不限制",
+        "is_public": False,
+        "is_editable": True,
+        "requires_restart": False
     }
 ]
 
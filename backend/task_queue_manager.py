@@ -1,19 +1,38 @@
-import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime, timezone
 import aio_pika
 from aio_pika import Message, DeliveryMode
-from database import get_rabbitmq_connection
+from database import AsyncSessionLocal, get_rabbitmq_connection
 from config import settings
+from utils.task_lease import reset_for_requeue
 
 logger = logging.getLogger(__name__)
 
+# 任务类型 -> 路由键
+TASK_ROUTING_KEYS = {
+    'diagnosis': 'diagnosis',
+    'event': 'event',
+    'ai_service': 'ai_service'
+}
+
+DEAD_LETTER_QUEUE = 'tasks.dead'
+
 class TaskQueueManager:
-    """基于RabbitMQ的任务队列管理器"""
+    """基于RabbitMQ的任务队列管理器
+
+    延迟投递/重试不依赖插件也不轮询数据库: 每种任务类型按延迟时长声明延迟队列
+    （{task_type}.delay.{N}s，队列级TTL=N秒，无消费者），消息过期后经死信交换机
+    回到 easysight.tasks 并按原任务类型路由。同一队列内TTL相同，先进先出即按时到期。
+    重试次数用尽的消息进入死信队列 tasks.dead，供接口查看和重新投递。
+    """
     
-    def __init__(self):
+    def __init__(self, prefetch_count: int = 1):
+        self.prefetch_count = prefetch_count
+        self.retry_base_delay = settings.TASK_RETRY_BASE_DELAY
+        self.retry_max_delay = settings.TASK_RETRY_MAX_DELAY
+        self.retry_max_attempts = settings.TASK_RETRY_MAX_ATTEMPTS
         self.connection: Optional[aio_pika.Connection] = None
         self.channel: Optional[aio_pika.Channel] = None
         self.exchanges: Dict[str, aio_pika.Exchange] = {}
@@ -26,8 +45,9 @@ class TaskQueueManager:
             self.connection = await get_rabbitmq_connection()
             self.channel = await self.connection.channel()
             
-            # 设置QoS，确保每个worker一次只处理一个任务
-            await self.channel.set_qos(prefetch_count=1)
+            # 设置QoS，默认每个worker一次只处理一个任务；
+            # Worker可按并发上限放宽预取数量，以便同一算法的帧凑成批次推理
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
             
             # 创建交换机
             await self._create_exchanges()
@@ -109,9 +129,42 @@ class TaskQueueManager:
             auto_delete=True
         )
         
+        # 重试次数用尽的死信队列
+        self.queues['dead_letters'] = await self.channel.declare_queue(
+            DEAD_LETTER_QUEUE,
+            durable=True,
+            arguments={
+                'x-max-length': settings.TASK_DEAD_LETTER_MAX_LENGTH
+            }
+        )
+        
+        # 按退避时长预先声明各任务类型的延迟队列
+        for task_type in TASK_ROUTING_KEYS:
+            for attempt in range(1, self.retry_max_attempts + 1):
+                await self._get_delay_queue(task_type, self.retry_delay(attempt))
+        
         # 绑定队列到交换机
         await self._bind_queues()
     
+    async def _get_delay_queue(self, task_type: str, delay: int) -> aio_pika.Queue:
+        """获取（必要时声明）指定任务类型和延迟时长的延迟队列"""
+        key = f"{task_type}_delay_{delay}"
+        if key not in self.queues:
+            self.queues[key] = await self.channel.declare_queue(
+                f"{task_type}.delay.{delay}s",
+                durable=True,
+                arguments={
+                    'x-message-ttl': delay * 1000,
+                    'x-dead-letter-exchange': 'easysight.tasks',
+                    'x-dead-letter-routing-key': self._get_routing_key(task_type)
+                }
+            )
+        return self.queues[key]
+    
+    def retry_delay(self, attempt: int) -> int:
+        """第 attempt 次重试的延迟(秒)，指数退避并封顶"""
+        return min(self.retry_max_delay, self.retry_base_delay * 2 ** max(0, attempt - 1))
+    
     async def _bind_queues(self):
         """绑定队列到交换机"""
         # 任务队列绑定
@@ -136,15 +189,16 @@ class TaskQueueManager:
         )
     
     async def publish_task(self, task_type: str, task_data: Dict[str, Any], 
-                          priority: int = 5, delay: int = 0) -> bool:
-        """发布任务到队列"""
+                          priority: int = 5, delay: int = 0, attempt: int = 0) -> bool:
+        """发布任务到队列（delay>0 时经延迟队列到期后投递，attempt 为已重试次数）"""
         try:
             message_body = {
                 'task_id': task_data.get('task_id'),
                 'task_type': task_type,
                 'data': task_data,
                 'created_at': datetime.now(timezone.utc).isoformat(),
-                'priority': priority
+                'priority': priority,
+                'attempt': attempt
             }
             
             message = Message(
@@ -154,9 +208,12 @@ class TaskQueueManager:
                 timestamp=datetime.now(timezone.utc)
             )
             
-            # 如果有延迟，设置延迟投递
             if delay > 0:
-                message.headers = {'x-delay': delay * 1000}  # 毫秒
+                # 延迟投递: 写入延迟队列，TTL到期后死信回到任务交换机
+                queue = await self._get_delay_queue(task_type, int(delay))
+                await self.channel.default_exchange.publish(message, routing_key=queue.name)
+                logger.info(f"Scheduled {task_type} task {task_data.get('task_id')} in {int(delay)}s (attempt {attempt})")
+                return True
             
             # 根据任务类型选择路由键
             routing_key = self._get_routing_key(task_type)
@@ -172,14 +229,47 @@ class TaskQueueManager:
             logger.error(f"Failed to publish task: {e}")
             return False
     
+    async def publish_retry(self, task_type: str, task_data: Dict[str, Any], attempt: int,
+                            error: Optional[str] = None, priority: int = 5,
+                            max_attempts: Optional[int] = None) -> bool:
+        """按指数退避安排第 attempt 次重试，超过最大次数时转入死信队列"""
+        max_attempts = self.retry_max_attempts if max_attempts is None else max_attempts
+        if attempt > max_attempts:
+            return await self.publish_dead_letter(task_type, task_data, attempt - 1, error)
+        return await self.publish_task(
+            task_type, task_data, priority=priority, delay=self.retry_delay(attempt), attempt=attempt
+        )
+    
+    async def publish_dead_letter(self, task_type: str, task_data: Dict[str, Any],
+                                  attempts: int, error: Optional[str] = None) -> bool:
+        """将重试次数用尽的任务写入死信队列"""
+        try:
+            message_body = {
+                'task_id': task_data.get('task_id'),
+                'task_type': task_type,
+                'data': task_data,
+                'attempts': attempts,
+                'last_error': error,
+                'dead_lettered_at': datetime.now(timezone.utc).isoformat()
+            }
+            
+            message = Message(
+                json.dumps(message_body).encode(),
+                delivery_mode=DeliveryMode.PERSISTENT,
+                timestamp=datetime.now(timezone.utc)
+            )
+            
+            await self.channel.default_exchange.publish(message, routing_key=DEAD_LETTER_QUEUE)
+            logger.warning(f"{task_type} task {task_data.get('task_id')} dead-lettered after {attempts} attempts: {error}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to publish dead letter: {e}")
+            return False
+    
     def _get_routing_key(self, task_type: str) -> str:
         """根据任务类型获取路由键"""
-        routing_map = {
-            'diagnosis': 'diagnosis',
-            'event': 'event',
-            'ai_service': 'ai_service'
-        }
-        return routing_map.get(task_type, 'diagnosis')
+        return TASK_ROUTING_KEYS.get(task_type, 'diagnosis')
     
     async def consume_tasks(self, task_type: str, callback: Callable):
         """消费任务队列"""
@@ -193,8 +283,11 @@ class TaskQueueManager:
             
             async def process_message(message: aio_pika.IncomingMessage):
                 async with message.process():
+                    task_data = json.loads(message.body.decode())
+                    payload = task_data.get('data') or {'task_id': task_data.get('task_id')}
+                    attempt = task_data.get('attempt', 0)
+                    priority = task_data.get('priority', 5)
                     try:
-                        task_data = json.loads(message.body.decode())
                         logger.info(f"Processing {task_type} task: {task_data.get('task_id')}")
                         
                         # 调用回调函数处理任务
@@ -203,17 +296,18 @@ class TaskQueueManager:
                         # 检查是否被拒绝（worker忙碌）
                         if result and result.get('rejected', False):
                             logger.info(f"Task {task_data.get('task_id')} rejected by worker, will be retried by another worker")
-                            # 延迟重新发布任务，让其他worker有机会处理
-                            await asyncio.sleep(1)
-                            await self.publish_task(task_type, task_data, delay=2)
+                            # 经延迟队列稍后重新投递，让其他worker有机会处理（不计入重试次数）
+                            if not await self.publish_task(task_type, payload, priority=priority, delay=2, attempt=attempt):
+                                raise RuntimeError("重新投递被拒绝的任务失败")
                         elif result:
                             # 发布任务结果
                             await self.publish_result(task_data.get('task_id'), result)
                         
                     except Exception as e:
                         logger.error(f"Error processing message: {e}")
-                        # 消息会被重新投递
-                        raise
+                        # 按指数退避经延迟队列重试，次数用尽后进入死信队列
+                        if not await self.publish_retry(task_type, payload, attempt + 1, str(e), priority):
+                            raise
             
             # 开始消费
             await queue.consume(process_message)
@@ -283,6 +377,89 @@ class TaskQueueManager:
             logger.error(f"Failed to get queue info: {e}")
         return {}
     
+    async def get_retry_stats(self) -> Dict[str, Any]:
+        """各延迟队列和死信队列当前积压的消息数"""
+        stats = {'delay_queues': {}, 'dead_letters': 0}
+        for key, queue in list(self.queues.items()):
+            if '_delay_' not in key and key != 'dead_letters':
+                continue
+            # 被动声明获取实时消息数
+            declared = await self.channel.declare_queue(queue.name, passive=True)
+            count = declared.declaration_result.message_count
+            if key == 'dead_letters':
+                stats['dead_letters'] = count
+            else:
+                stats['delay_queues'][queue.name] = count
+        return stats
+    
+    async def peek_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """查看死信队列中的消息（取出后放回，不消费）"""
+        queue = self.queues['dead_letters']
+        messages = []
+        fetched = []
+        try:
+            for _ in range(limit):
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                fetched.append(message)
+                messages.append(json.loads(message.body.decode()))
+        finally:
+            for message in fetched:
+                await message.nack(requeue=True)
+        return messages
+    
+    async def requeue_dead_letters(self, limit: int = 100, task_id: Optional[Any] = None) -> Dict[str, Any]:
+        """将死信重新投递到任务队列（重试次数清零），可按task_id过滤
+
+        事件任务先把数据库中的FAILED任务重置为PENDING，否则消费方无法领取；
+        任务已删除、停用或状态已变化时拒绝投递，消息保留在死信队列。
+        返回 {'requeued': 投递数量, 'refused': 拒绝投递的task_id列表}
+        """
+        queue = self.queues['dead_letters']
+        requeued = 0
+        refused = []
+        skipped = []
+        try:
+            for _ in range(limit):
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                body = json.loads(message.body.decode())
+                if task_id is not None and str(body.get('task_id')) != str(task_id):
+                    skipped.append(message)
+                    continue
+                data = body.get('data') or {}
+                if body['task_type'] == 'event':
+                    if not await self._reset_event_task(body.get('task_id')):
+                        refused.append(body.get('task_id'))
+                        skipped.append(message)
+                        continue
+                    data['retry_attempt'] = 0
+                if await self.publish_task(body['task_type'], data, attempt=0):
+                    await message.ack()
+                    requeued += 1
+                else:
+                    skipped.append(message)
+                    break
+        finally:
+            for message in skipped:
+                await message.nack(requeue=True)
+        return {'requeued': requeued, 'refused': refused}
+    
+    @staticmethod
+    async def _reset_event_task(task_id: Any) -> bool:
+        """死信重新投递前重置事件任务状态，返回是否可以投递"""
+        try:
+            async with AsyncSessionLocal() as db:
+                reset = await reset_for_requeue(db, int(task_id))
+                await db.commit()
+        except (TypeError, ValueError):
+            return False
+        if not reset:
+            logger.warning(f"Refused to requeue dead-lettered event task {task_id}: task is not FAILED or inactive")
+        return reset
+    
     async def close(self):
         """关闭连接"""
         try:
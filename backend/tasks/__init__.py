@@ -1,3 +1,7 @@
 from .system_metrics_collector import start_metrics_collection, stop_metrics_collection, metrics_collector
+from .data_retention import start_data_retention, stop_data_retention, retention_manager
 
-__all__ = ['start_metrics_collection', 'stop_metrics_collection', 'metrics_collector']
\ No newline at end of file
+__all__ = [
+    'start_metrics_collection', 'stop_metrics_collection', 'metrics_collector',
+    'start_data_retention', 'stop_data_retention', 'retention_manager'
+]
\ No newline at end of file
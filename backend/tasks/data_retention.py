@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from database import get_db
+from models.system import DataRetentionPolicy
+from utils.partitioning import PARTITIONED_TABLES, ensure_all_partitions, drop_partitions_before
+
+logger = logging.getLogger(__name__)
+
+class DataRetentionManager:
+    """数据保留管理器
+
+    - 定期为分区表提前创建未来分区
+    - 按 DataRetentionPolicy 整体删除过期分区（data_type 为分区表名:
+      diagnosis_results / system_logs / system_metrics）
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self.check_interval = 3600  # 每小时检查一次
+
+    async def start(self):
+        """启动数据保留管理"""
+        if self.is_running:
+            logger.warning("数据保留管理器已在运行")
+            return
+
+        self.is_running = True
+        logger.info("启动数据保留管理器")
+
+        while self.is_running:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"执行数据保留任务时发生错误: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    async def stop(self):
+        """停止数据保留管理"""
+        self.is_running = False
+        logger.info("停止数据保留管理器")
+
+    @staticmethod
+    def _is_due(policy: DataRetentionPolicy, now: datetime) -> bool:
+        """判断策略今天的清理时间是否已到且尚未执行"""
+        try:
+            hour, minute = map(int, (policy.cleanup_time or "02:00").split(":"))
+        except ValueError:
+            hour, minute = 2, 0
+        scheduled = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now < scheduled:
+            return False
+        return policy.last_cleanup is None or policy.last_cleanup < scheduled
+
+    async def run_once(self, force: bool = False):
+        """创建未来分区并执行到期的保留策略
+
+        Args:
+            force: 忽略策略的清理时间，立即执行所有启用的策略
+        """
+        async for db in get_db():
+            await ensure_all_partitions(db)
+            await db.commit()
+
+            result = await db.execute(
+                select(DataRetentionPolicy).where(
+                    DataRetentionPolicy.is_active == True,
+                    DataRetentionPolicy.auto_cleanup == True,
+                    DataRetentionPolicy.data_type.in_(list(PARTITIONED_TABLES))
+                )
+            )
+            now = datetime.now().astimezone()
+            for policy in result.scalars().all():
+                if not force and not self._is_due(policy, now):
+                    continue
+                if policy.archive_before_delete:
+                    logger.warning(f"保留策略 {policy.data_type} 要求删除前归档，分区删除不支持归档，已跳过")
+                    continue
+
+                cutoff = datetime.now(timezone.utc) - timedelta(days=policy.retention_days)
+                stats = await drop_partitions_before(db, policy.data_type, cutoff)
+                policy.last_cleanup = now
+                await db.commit()
+                logger.info(
+                    f"保留策略 {policy.data_type} 执行完成: 删除分区 {stats['dropped_partitions']} 个，"
+                    f"删除行 {stats['deleted_rows']} 条"
+                )
+            break
+
+# 全局实例
+retention_manager = DataRetentionManager()
+
+async def start_data_retention():
+    """启动数据保留管理"""
+    await retention_manager.start()
+
+async def stop_data_retention():
+    """停止数据保留管理"""
+    await retention_manager.stop()
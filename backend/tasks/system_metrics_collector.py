@@ -1,11 +1,12 @@
 import asyncio
 import logging
-import psutil
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import insert
 from database import get_db
 from models.system import SystemMetrics
+from utils.partitioning import drop_partitions_before
+from utils.system_sampler import system_sampler
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,7 @@ class SystemMetricsCollector:
             return
             
         self.is_running = True
+        system_sampler.start()
         logger.info("启动系统指标收集器")
         
         while self.is_running:
@@ -36,97 +38,85 @@ class SystemMetricsCollector:
     async def stop(self):
         """停止指标收集"""
         self.is_running = False
+        system_sampler.stop()
         logger.info("停止系统指标收集器")
         
     async def collect_metrics(self):
-        """收集系统指标"""
+        """将采样线程最近一个收集周期内的采样降采样后批量写入数据库
+        
+        CPU、内存和网络速率取周期内平均值（网络速率另记峰值），磁盘和累计值取最新采样。
+        """
         try:
+            samples = system_sampler.window(self.collection_interval) or [system_sampler.latest()]
+            latest = samples[-1]
+            timestamp = datetime.now(timezone.utc)
+            
+            def avg(attr: str) -> float:
+                return sum(getattr(sample, attr) for sample in samples) / len(samples)
+            
+            rows = [
+                self._metric_row("cpu_usage", avg("cpu_percent"), "%", timestamp),
+                self._metric_row("memory_usage", avg("memory_percent"), "%", timestamp),
+                self._metric_row("memory_total", latest.memory_total / (1024**3), "GB", timestamp),
+                self._metric_row("memory_available", latest.memory_available / (1024**3), "GB", timestamp),
+                self._metric_row("network_bytes_sent", latest.network_bytes_sent / (1024**2), "MB", timestamp),
+                self._metric_row("network_bytes_recv", latest.network_bytes_recv / (1024**2), "MB", timestamp),
+                self._metric_row("network_sent_rate", avg("network_sent_rate"), "KB/s", timestamp),
+                self._metric_row("network_recv_rate", avg("network_recv_rate"), "KB/s", timestamp),
+                self._metric_row("network_sent_rate_max", max(s.network_sent_rate for s in samples), "KB/s", timestamp),
+                self._metric_row("network_recv_rate_max", max(s.network_recv_rate for s in samples), "KB/s", timestamp),
+                self._metric_row("process_count", latest.process_count, "count", timestamp),
+            ]
+            
+            for disk in latest.disks:
+                dimensions = {
+                    "device": disk["device"],
+                    "mountpoint": disk["mountpoint"],
+                    "fstype": disk["fstype"]
+                }
+                rows.append(self._metric_row("disk_usage", disk["percent"], "%", timestamp, dimensions))
+                rows.append(self._metric_row("disk_total", disk["total"] / (1024**3), "GB", timestamp, dimensions))
+                rows.append(self._metric_row("disk_free", disk["free"] / (1024**3), "GB", timestamp, dimensions))
+            
             async for db in get_db():
-                timestamp = datetime.now(timezone.utc)
-                
-                # 收集CPU使用率
-                cpu_percent = psutil.cpu_percent(interval=1)
-                await self.save_metric(db, "cpu_usage", cpu_percent, "%", timestamp)
-                
-                # 收集内存使用率
-                memory = psutil.virtual_memory()
-                await self.save_metric(db, "memory_usage", memory.percent, "%", timestamp)
-                await self.save_metric(db, "memory_total", memory.total / (1024**3), "GB", timestamp)
-                await self.save_metric(db, "memory_available", memory.available / (1024**3), "GB", timestamp)
-                
-                # 收集磁盘使用率
-                disk_partitions = psutil.disk_partitions()
-                for partition in disk_partitions:
-                    try:
-                        disk_usage = psutil.disk_usage(partition.mountpoint)
-                        disk_percent = (disk_usage.used / disk_usage.total) * 100
-                        
-                        dimensions = {
-                            "device": partition.device,
-                            "mountpoint": partition.mountpoint,
-                            "fstype": partition.fstype
-                        }
-                        
-                        await self.save_metric(
-                            db, "disk_usage", disk_percent, "%", timestamp, dimensions
-                        )
-                        await self.save_metric(
-                            db, "disk_total", disk_usage.total / (1024**3), "GB", timestamp, dimensions
-                        )
-                        await self.save_metric(
-                            db, "disk_free", disk_usage.free / (1024**3), "GB", timestamp, dimensions
-                        )
-                    except (PermissionError, OSError) as e:
-                        logger.warning(f"无法访问磁盘分区 {partition.device}: {e}")
-                        continue
-                
-                # 收集网络IO
-                net_io = psutil.net_io_counters()
-                if net_io:
-                    await self.save_metric(db, "network_bytes_sent", net_io.bytes_sent / (1024**2), "MB", timestamp)
-                    await self.save_metric(db, "network_bytes_recv", net_io.bytes_recv / (1024**2), "MB", timestamp)
-                
-                # 收集进程数
-                process_count = len(psutil.pids())
-                await self.save_metric(db, "process_count", process_count, "count", timestamp)
-                
+                await db.execute(insert(SystemMetrics), rows)
                 await db.commit()
-                logger.debug(f"成功收集系统指标: {timestamp}")
+                logger.debug(f"成功收集系统指标: {timestamp}（{len(samples)} 个采样，{len(rows)} 条指标）")
                 break
                 
         except Exception as e:
             logger.error(f"收集系统指标失败: {e}")
             
+    @staticmethod
+    def _metric_row(metric_name: str, metric_value: float, metric_unit: str,
+                    timestamp: datetime, dimensions: dict = None) -> dict:
+        """构造一条指标行（批量INSERT使用）"""
+        return {
+            "metric_name": metric_name,
+            "metric_value": metric_value,
+            "metric_unit": metric_unit,
+            "dimensions": dimensions or {},
+            "timestamp": timestamp
+        }
+    
     async def save_metric(self, db: AsyncSession, metric_name: str, metric_value: float, 
                          metric_unit: str, timestamp: datetime, dimensions: dict = None):
-        """保存指标到数据库"""
+        """保存单条指标到数据库"""
         try:
-            metric = SystemMetrics(
-                metric_name=metric_name,
-                metric_value=metric_value,
-                metric_unit=metric_unit,
-                dimensions=dimensions or {},
-                timestamp=timestamp
-            )
-            
-            db.add(metric)
-            
+            db.add(SystemMetrics(**self._metric_row(metric_name, metric_value, metric_unit, timestamp, dimensions)))
         except Exception as e:
             logger.error(f"保存指标 {metric_name} 失败: {e}")
             
     async def cleanup_old_metrics(self, days: int = 30):
-        """清理旧的指标数据"""
+        """清理旧的指标数据（按天分区整体删除，未分区时逐行删除）"""
         try:
             async for db in get_db():
                 cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
                 
-                # 删除超过指定天数的指标数据
-                result = await db.execute(
-                    delete(SystemMetrics).where(SystemMetrics.timestamp < cutoff_date)
-                )
+                stats = await drop_partitions_before(db, "system_metrics", cutoff_date)
                     
                 await db.commit()
-                logger.info(f"清理了 {result.rowcount} 条旧指标数据")
+                logger.info(f"清理旧指标数据: 删除分区 {stats['dropped_partitions']} 个，删除行 {stats['deleted_rows']} 条")
                 break
                 
         except Exception as e:
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+请求审计日志中间件测试
+用 TestClient 发起请求，开启数据库日志的 SystemLoggingMiddleware 把日志行放入
+audit_log_writer 队列；队列入口替换为内存收集，不需要数据库。
+
+运行: python test_audit_log_middleware.py 或 pytest test_audit_log_middleware.py
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware.audit_log_writer import audit_log_writer
+from middleware.logging_middleware import SystemLoggingMiddleware
+
+
+def _make_client():
+    app = FastAPI()
+    app.add_middleware(SystemLoggingMiddleware, enable_db_logging=True)
+
+    @app.get("/api/v1/cameras/")
+    async def list_cameras():
+        return []
+
+    @app.get("/api/v1/cameras/{camera_id}")
+    async def get_camera(camera_id: int):
+        return {"id": camera_id}
+
+    @app.get("/api/v1/broken")
+    async def broken():
+        raise RuntimeError("boom")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def _collect(test):
+    """运行 test(client)，返回期间放入队列的日志行"""
+    rows = []
+    original = audit_log_writer.enqueue
+    audit_log_writer.enqueue = lambda row: rows.append(row) or True
+    try:
+        with _make_client() as client:
+            test(client)
+    finally:
+        audit_log_writer.enqueue = original
+    return rows
+
+
+def test_success_logged():
+    def run(client):
+        response = client.get("/api/v1/cameras/?page=2")
+        assert response.status_code == 200, response.status_code
+
+    rows = _collect(run)
+    assert len(rows) == 1, rows
+    row = rows[0]
+    assert row['level'] == "info"
+    assert row['response_status'] == 200
+    assert row['request_method'] == "GET"
+    assert row['module'] == "camera" and row['action'] == "list"
+    assert row['message'].endswith(" - 200"), row['message']
+    assert row['extra_data']['request_params'] == {"page": "2"}
+
+
+def test_client_error_status_kept():
+    def run(client):
+        response = client.get("/api/v1/cameras/abc")
+        assert response.status_code == 422, response.status_code
+
+    rows = _collect(run)
+    assert len(rows) == 1, rows
+    assert rows[0]['level'] == "info"
+    assert rows[0]['response_status'] == 422
+
+
+def test_error_logged():
+    def run(client):
+        response = client.get("/api/v1/broken")
+        assert response.status_code == 500, response.status_code
+
+    rows = _collect(run)
+    assert len(rows) == 1, rows
+    assert rows[0]['level'] == "error"
+    assert rows[0]['response_status'] == 500
+    assert rows[0]['extra_data']['error_message'] == "boom"
+
+
+if __name__ == "__main__":
+    tests = [test_success_logged, test_client_error_status_kept, test_error_logged]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e}")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+通知调度测试
+在本地启动假的SMTP服务（FakeSmtpServer）和Webhook服务（FakeWebhookServer），验证
+notification_dispatcher 的摘要合并、退避重试、令牌桶限速、连接复用、钉钉加签以及
+停止时发送剩余通知。通知日志写入替换为内存收集，不需要数据库。
+
+运行: python test_notification_dispatcher.py 或 pytest test_notification_dispatcher.py
+"""
+
+import asyncio
+import base64
+import email
+import hashlib
+import hmac
+import json
+import time
+from email.header import decode_header, make_header
+from urllib.parse import parse_qs, urlsplit
+
+from notification_dispatcher import ChannelConfig, Notification, NotificationDispatcher, TokenBucket
+
+
+class FakeSmtpServer:
+    """假的SMTP服务，fail_first 为前几次 MAIL FROM 返回 451 的次数"""
+
+    def __init__(self, fail_first: int = 0):
+        self.failures_left = fail_first
+        self.connections = 0
+        self.messages = []
+        self._server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 fake ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    writer.write(b"250-fake\r\n250 8BITMIME\r\n")
+                elif command.startswith("MAIL"):
+                    if self.failures_left > 0:
+                        self.failures_left -= 1
+                        writer.write(b"451 Try again later\r\n")
+                    else:
+                        writer.write(b"250 OK\r\n")
+                elif command.startswith("DATA"):
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    data = []
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk == b".\r\n":
+                            break
+                        data.append(chunk)
+                    self.messages.append(email.message_from_bytes(b"".join(data)))
+                    writer.write(b"250 Queued\r\n")
+                elif command.startswith("QUIT"):
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    # RCPT / RSET / NOOP
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class FakeWebhookServer:
+    """假的HTTP服务，支持keep-alive；fail_first 次请求返回 fail_status，之后返回200"""
+
+    def __init__(self, fail_first: int = 0, fail_status: int = 500, body: dict = None):
+        self.failures_left = fail_first
+        self.fail_status = fail_status
+        self.body = json.dumps(body or {"errcode": 0, "errmsg": "ok"}).encode()
+        self.connections = 0
+        self.requests = []
+        self._server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def url(self, path: str = "/hook") -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                method, target, _ = lines[0].split(" ")
+                headers = {k.strip().lower(): v.strip() for k, v in
+                           (line.split(":", 1) for line in lines[1:] if ":" in line)}
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests.append({
+                    "method": method,
+                    "path": urlsplit(target).path,
+                    "query": {k: v[0] for k, v in parse_qs(urlsplit(target).query).items()},
+                    "headers": headers,
+                    "json": json.loads(body) if body else None,
+                })
+                if self.failures_left > 0:
+                    self.failures_left -= 1
+                    status = f"{self.fail_status} Error"
+                else:
+                    status = "200 OK"
+                writer.write((
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(self.body)}\r\n\r\n"
+                ).encode() + self.body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class LogCollector:
+    """代替数据库写入，收集批量写入的通知日志"""
+
+    def __init__(self):
+        self.rows = []
+        self.batches = 0
+
+    async def __call__(self, rows):
+        self.batches += 1
+        self.rows.extend(rows)
+
+
+async def wait_until(predicate, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.02)
+
+
+def make_dispatcher():
+    logs = LogCollector()
+    return NotificationDispatcher(log_writer=logs, log_flush_interval=0.05), logs
+
+
+def channel(channel_id: int, channel_type: str, **config) -> ChannelConfig:
+    options = {'rate_limit_per_minute': 0, 'retry_base_delay': 0.05, 'digest_seconds': 0}
+    options.update(config)
+    return ChannelConfig(id=channel_id, name=f"{channel_type}-{channel_id}", type=channel_type, config=options)
+
+
+def alarm(index: int) -> Notification:
+    return Notification(title=f"告警{index}", content=f"摄像头{index}画面异常", rule_id=1, alarm_id=index)
+
+
+async def _test_webhook_digest():
+    async with FakeWebhookServer() as server:
+        dispatcher, logs = make_dispatcher()
+        webhook = channel(1, 'webhook', url=server.url(), method='POST', digest_seconds=0.3)
+        assert dispatcher.submit(webhook, alarm(0))
+        await wait_until(lambda: len(server.requests) == 1)
+        for index in range(1, 5):
+            assert dispatcher.submit(webhook, alarm(index))
+        await wait_until(lambda: len(logs.rows) == 5)
+        await dispatcher.stop()
+
+        # 第一条立即发送，其余4条在摘要间隔内合并为一条
+        assert len(server.requests) == 2, server.requests
+        assert [request["json"]["count"] for request in server.requests] == [1, 4]
+        assert "等4条告警" in server.requests[1]["json"]["title"]
+        assert all(row["status"] == "sent" and row["channel_id"] == 1 for row in logs.rows)
+        # 两次请求复用同一个连接
+        assert server.connections == 1, server.connections
+
+
+async def _test_webhook_retry():
+    async with FakeWebhookServer(fail_first=2) as server:
+        dispatcher, logs = make_dispatcher()
+        dispatcher.submit(channel(1, 'webhook', url=server.url()), alarm(1))
+        await wait_until(lambda: logs.rows)
+        await dispatcher.stop()
+        assert len(server.requests) == 3
+        assert logs.rows[0]["status"] == "sent" and logs.rows[0]["retry_count"] == 2, logs.rows
+
+
+async def _test_webhook_client_error():
+    async with FakeWebhookServer(fail_first=10, fail_status=400) as server:
+        dispatcher, logs = make_dispatcher()
+        dispatcher.submit(channel(1, 'webhook', url=server.url()), alarm(1))
+        await wait_until(lambda: logs.rows)
+        await dispatcher.stop()
+        # 4xx 不重试
+        assert len(server.requests) == 1
+        assert logs.rows[0]["status"] == "failed" and "400" in logs.rows[0]["error_message"], logs.rows
+
+
+async def _test_dingtalk_sign():
+    async with FakeWebhookServer() as server:
+        dispatcher, logs = make_dispatcher()
+        secret = "SEC-test"
+        dispatcher.submit(channel(2, 'dingtalk', webhook_url=server.url("/robot/send"), secret=secret), alarm(1))
+        await wait_until(lambda: logs.rows)
+        await dispatcher.stop()
+
+        request = server.requests[0]
+        timestamp = request["query"]["timestamp"]
+        expected = base64.b64encode(
+            hmac.new(secret.encode(), f"{timestamp}\n{secret}".encode(), hashlib.sha256).digest()
+        ).decode()
+        assert request["query"]["sign"] == expected
+        assert request["json"]["msgtype"] == "markdown"
+        assert logs.rows[0]["status"] == "sent"
+
+
+async def _test_dingtalk_errcode():
+    async with FakeWebhookServer(body={"errcode": 310000, "errmsg": "sign not match"}) as server:
+        dispatcher, logs = make_dispatcher()
+        dispatcher.submit(channel(2, 'dingtalk', webhook_url=server.url(), secret="x"), alarm(1))
+        await wait_until(lambda: logs.rows)
+        await dispatcher.stop()
+        assert len(server.requests) == 1
+        assert logs.rows[0]["status"] == "failed" and "310000" in logs.rows[0]["error_message"]
+
+
+def _email_channel(port: int, **config) -> ChannelConfig:
+    return channel(3, 'email', smtp_server='127.0.0.1', smtp_port=port, use_tls=False,
+                   from_addr='easysight@example.com', recipients=['ops@example.com'], **config)
+
+
+async def _test_email_digest():
+    async with FakeSmtpServer() as server:
+        dispatcher, logs = make_dispatcher()
+        email_channel = _email_channel(server.port, digest_seconds=0.3)
+        dispatcher.submit(email_channel, alarm(0))
+        await wait_until(lambda: len(server.messages) == 1)
+        for index in range(1, 3):
+            dispatcher.submit(email_channel, alarm(index))
+        await wait_until(lambda: len(logs.rows) == 3)
+        await dispatcher.stop()
+
+        assert len(server.messages) == 2
+        assert "等2条告警" in str(make_header(decode_header(server.messages[1]["Subject"])))
+        assert server.messages[0]["To"] == "ops@example.com"
+        # SMTP连接在两封邮件间复用
+        assert server.connections == 1, server.connections
+
+
+async def _test_email_retry():
+    async with FakeSmtpServer(fail_first=1) as server:
+        dispatcher, logs = make_dispatcher()
+        dispatcher.submit(_email_channel(server.port), alarm(1))
+        await wait_until(lambda: logs.rows)
+        await dispatcher.stop()
+        assert logs.rows[0]["status"] == "sent" and logs.rows[0]["retry_count"] == 1, logs.rows
+        assert len(server.messages) == 1
+
+
+async def _test_stop_flushes_pending():
+    async with FakeWebhookServer() as server:
+        dispatcher, logs = make_dispatcher()
+        webhook = channel(1, 'webhook', url=server.url(), digest_seconds=60)
+        dispatcher.submit(webhook, alarm(0))
+        await wait_until(lambda: len(server.requests) == 1)
+        for index in range(1, 4):
+            dispatcher.submit(webhook, alarm(index))
+        # 摘要间隔未到，停止时剩余通知合并发送一次并写入日志
+        await dispatcher.stop()
+        assert len(server.requests) == 2 and server.requests[1]["json"]["count"] == 3
+        assert len(logs.rows) == 4
+
+
+async def _test_token_bucket():
+    bucket = TokenBucket(rate_per_minute=600, burst=2)
+    start = time.perf_counter()
+    for _ in range(5):
+        await bucket.acquire()
+    elapsed = time.perf_counter() - start
+    # 前2个令牌立即可用，其余3个按每秒10个补充
+    assert 0.25 <= elapsed < 1.0, elapsed
+
+
+def test_webhook_digest():
+    asyncio.run(_test_webhook_digest())
+
+
+def test_webhook_retry():
+    asyncio.run(_test_webhook_retry())
+
+
+def test_webhook_client_error():
+    asyncio.run(_test_webhook_client_error())
+
+
+def test_dingtalk_sign():
+    asyncio.run(_test_dingtalk_sign())
+
+
+def test_dingtalk_errcode():
+    asyncio.run(_test_dingtalk_errcode())
+
+
+def test_email_digest():
+    asyncio.run(_test_email_digest())
+
+
+def test_email_retry():
+    asyncio.run(_test_email_retry())
+
+
+def test_stop_flushes_pending():
+    asyncio.run(_test_stop_flushes_pending())
+
+
+def test_token_bucket():
+    asyncio.run(_test_token_bucket())
+
+
+if __name__ == "__main__":
+    tests = [test_webhook_digest, test_webhook_retry, test_webhook_client_error, test_dingtalk_sign,
+             test_dingtalk_errcode, test_email_digest, test_email_retry, test_stop_flushes_pending,
+             test_token_bucket]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e}")
+    raise SystemExit(1 if failures else 0)
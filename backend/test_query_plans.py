@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+列表查询执行计划回归测试
+在SQLite内存库中按模型建表（含复合/部分索引），对各列表接口的典型查询执行
+EXPLAIN QUERY PLAN，确认走预期索引且排序不需要临时B树。
+
+运行: python test_query_plans.py 或 pytest test_query_plans.py
+"""
+
+from datetime import datetime
+
+from sqlalchemy import and_, create_engine, desc, func, or_, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from database import Base
+from models.user import User, UserMessage
+from models.event import Event, EventStatus, EventLevel
+from models.diagnosis import DiagnosisResult, DiagnosisAlarm, DiagnosisStatus
+from models.system import SystemLog
+
+
+class ExplainQueryPlan(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(ExplainQueryPlan)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+def create_test_engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, UserMessage.__table__, Event.__table__,
+        DiagnosisResult.__table__, DiagnosisAlarm.__table__, SystemLog.__table__
+    ])
+    return engine
+
+
+def keyset_list(model, *conditions, page_size=20):
+    """与 utils.pagination.paginate 相同形状的列表查询"""
+    query = select(model)
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(desc(model.created_at), desc(model.id)).limit(page_size + 1)
+
+
+def after_cursor(model):
+    cursor_time, cursor_id = datetime(2025, 1, 1), 1000
+    return or_(
+        model.created_at < cursor_time,
+        and_(model.created_at == cursor_time, model.id < cursor_id)
+    )
+
+
+# (说明, 查询, 可接受的索引)
+CASES = [
+    ("事件列表", keyset_list(Event), {"ix_events_created_at_id"}),
+    ("事件列表-状态筛选", keyset_list(Event, Event.status == EventStatus.PENDING),
+     {"ix_events_status_created_at"}),
+    ("事件列表-级别筛选", keyset_list(Event, Event.event_level == EventLevel.CRITICAL),
+     {"ix_events_event_level_created_at"}),
+    ("事件列表-摄像头筛选", keyset_list(Event, Event.camera_id == 1),
+     {"ix_events_camera_id_created_at"}),
+    ("事件列表-游标", keyset_list(Event, after_cursor(Event)), {"ix_events_created_at_id"}),
+    ("诊断结果列表", keyset_list(DiagnosisResult), {"ix_diagnosis_results_created_at_id"}),
+    ("诊断结果-任务筛选", keyset_list(DiagnosisResult, DiagnosisResult.task_id == 1),
+     {"ix_diagnosis_results_task_id_created_at"}),
+    ("诊断结果-状态筛选", keyset_list(DiagnosisResult, DiagnosisResult.diagnosis_status == DiagnosisStatus.ERROR),
+     {"ix_diagnosis_results_status_created_at"}),
+    ("诊断告警-未确认", keyset_list(DiagnosisAlarm, DiagnosisAlarm.is_acknowledged == False),
+     {"ix_diagnosis_alarms_unacknowledged", "ix_diagnosis_alarms_created_at_id"}),
+    ("诊断告警-严重程度", keyset_list(DiagnosisAlarm, DiagnosisAlarm.severity == "critical"),
+     {"ix_diagnosis_alarms_severity_created_at"}),
+    ("用户消息列表", keyset_list(UserMessage, UserMessage.receiver_id == 1),
+     {"ix_user_messages_receiver_id_created_at"}),
+    ("用户未读数", select(func.count(UserMessage.id)).where(
+        and_(UserMessage.receiver_id == 1, UserMessage.is_read == False)),
+     {"ix_user_messages_receiver_id_unread", "ix_user_messages_receiver_id_created_at"}),
+    ("系统日志列表", keyset_list(SystemLog), {"ix_system_logs_created_at_id"}),
+    ("系统日志-级别筛选", keyset_list(SystemLog, SystemLog.level == "error"),
+     {"ix_system_logs_level_created_at"}),
+    ("系统日志-模块筛选", keyset_list(SystemLog, SystemLog.module == "camera"),
+     {"ix_system_logs_module_created_at"}),
+]
+
+
+def explain(conn, statement):
+    return [row[-1] for row in conn.execute(ExplainQueryPlan(statement)).fetchall()]
+
+
+def check_plan(conn, name, statement, expected_indexes):
+    plan = explain(conn, statement)
+    plan_text = " | ".join(plan)
+    assert any(f"INDEX {index}" in plan_text for index in expected_indexes), \
+        f"{name}: 未使用预期索引 {sorted(expected_indexes)}，执行计划: {plan_text}"
+    assert "TEMP B-TREE" not in plan_text, f"{name}: 排序需要临时B树，执行计划: {plan_text}"
+    return plan_text
+
+
+def test_list_queries_use_indexes():
+    engine = create_test_engine()
+    with engine.connect() as conn:
+        for name, statement, expected_indexes in CASES:
+            check_plan(conn, name, statement, expected_indexes)
+
+
+if __name__ == "__main__":
+    engine = create_test_engine()
+    failures = 0
+    with engine.connect() as conn:
+        for name, statement, expected_indexes in CASES:
+            try:
+                plan_text = check_plan(conn, name, statement, expected_indexes)
+                print(f"✅ {name}: {plan_text}")
+            except AssertionError as e:
+                failures += 1
+                print(f"❌ {e}")
+    print(f"\n共 {len(CASES)} 项，失败 {failures} 项")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+RTSP探测测试
+在本地启动一个假的RTSP应答服务（FakeRtspServer），验证 utils.rtsp_probe 对
+正常流、DESCRIBE失败、无应答、Digest认证和端口未监听等情况的判断，以及批量探测吞吐。
+
+运行: python test_rtsp_probe.py 或 pytest test_rtsp_probe.py
+"""
+
+import asyncio
+import hashlib
+import socket
+import time
+
+from utils.rtsp_probe import LatencyHistogram, probe_rtsp
+
+SDP = (
+    "v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=Fake\r\nt=0 0\r\n"
+    "m=video 0 RTP/AVP 96\r\na=rtpmap:96 H264/90000\r\n"
+)
+
+
+class FakeRtspServer:
+    """假的RTSP应答服务
+
+    mode:
+        ok        OPTIONS/DESCRIBE 均返回200（DESCRIBE带SDP）
+        no_stream DESCRIBE 返回404（端口正常但流不存在）
+        silent    接受连接但不应答（编码器卡死）
+        hang      OPTIONS 正常应答，DESCRIBE 不应答（取流卡死）
+        digest    DESCRIBE 需要Digest认证
+        garbage   返回非RTSP内容
+    """
+
+    REALM = "FakeCamera"
+    NONCE = "abc123"
+
+    def __init__(self, mode: str = "ok", username: str = "admin", password: str = "secret"):
+        self.mode = mode
+        self.username = username
+        self.password = password
+        self.requests = []
+        self._server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def url(self, path: str = "/live", credentials: str = "") -> str:
+        return f"rtsp://{credentials}127.0.0.1:{self.port}{path}"
+
+    def _digest_ok(self, header: str, uri: str) -> bool:
+        ha1 = hashlib.md5(f"{self.username}:{self.REALM}:{self.password}".encode()).hexdigest()
+        ha2 = hashlib.md5(f"DESCRIBE:{uri}".encode()).hexdigest()
+        expected = hashlib.md5(f"{ha1}:{self.NONCE}:{ha2}".encode()).hexdigest()
+        return f'response="{expected}"' in header
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                method, uri, _ = lines[0].split(" ")
+                headers = {k.strip().lower(): v.strip() for k, v in
+                           (line.split(":", 1) for line in lines[1:] if ":" in line)}
+                self.requests.append((method, headers))
+                cseq = headers.get("cseq", "0")
+
+                if self.mode == "silent" or (self.mode == "hang" and method == "DESCRIBE"):
+                    # 不应答，直到客户端超时断开
+                    await reader.read()
+                    break
+                if self.mode == "garbage":
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+                    await writer.drain()
+                    break
+
+                body = ""
+                extra = ""
+                if method == "OPTIONS":
+                    status = "200 OK"
+                    extra = "Public: OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN\r\n"
+                elif self.mode == "no_stream":
+                    status = "404 Not Found"
+                elif self.mode == "digest" and not self._digest_ok(headers.get("authorization", ""), uri):
+                    status = "401 Unauthorized"
+                    extra = f'WWW-Authenticate: Digest realm="{self.REALM}", nonce="{self.NONCE}"\r\n'
+                else:
+                    status = "200 OK"
+                    body = SDP
+                    extra = "Content-Type: application/sdp\r\n"
+
+                writer.write((
+                    f"RTSP/1.0 {status}\r\nCSeq: {cseq}\r\n{extra}"
+                    f"Content-Length: {len(body)}\r\n\r\n{body}"
+                ).encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _test_ok():
+    async with FakeRtspServer("ok") as server:
+        result = await probe_rtsp(server.url())
+        assert result.reachable and result.healthy and result.status_code == 200, result
+        assert result.connect_ms is not None and result.describe_ms is not None
+        assert [method for method, _ in server.requests] == ["OPTIONS", "DESCRIBE"]
+
+
+async def _test_no_stream():
+    async with FakeRtspServer("no_stream") as server:
+        result = await probe_rtsp(server.url())
+        assert result.reachable and not result.healthy and result.status_code == 404, result
+
+
+async def _test_silent():
+    async with FakeRtspServer("silent") as server:
+        start = time.perf_counter()
+        result = await probe_rtsp(server.url(), timeout=0.3)
+        assert result.reachable and not result.healthy and result.error, result
+        assert time.perf_counter() - start < 1.5
+
+
+async def _test_describe_hang():
+    async with FakeRtspServer("hang") as server:
+        result = await probe_rtsp(server.url(), timeout=0.3)
+        assert result.reachable and not result.healthy and result.error, result
+        assert result.options_ms is not None and result.describe_ms is None, result
+        assert result.status_code is None, result
+
+
+async def _test_garbage():
+    async with FakeRtspServer("garbage") as server:
+        result = await probe_rtsp(server.url())
+        assert result.reachable and not result.healthy and result.error, result
+
+
+async def _test_digest():
+    async with FakeRtspServer("digest") as server:
+        result = await probe_rtsp(server.url(credentials="admin:secret@"))
+        assert result.status_code == 200 and result.healthy, result
+        # 凭据在请求URI中不应出现
+        assert all("secret" not in str(headers) for _, headers in server.requests)
+
+        # 未提供凭据: 服务正常应答401，视为编码器在工作
+        result = await probe_rtsp(server.url())
+        assert result.status_code == 401 and result.auth_required and result.healthy, result
+
+        # 凭据错误
+        result = await probe_rtsp(server.url(credentials="admin:wrong@"))
+        assert result.status_code == 401, result
+
+
+async def _test_closed_port():
+    result = await probe_rtsp(f"rtsp://127.0.0.1:{free_port()}/live", timeout=0.5)
+    assert not result.reachable and not result.healthy, result
+
+
+async def _test_throughput(total: int = 2000, concurrency: int = 200):
+    async with FakeRtspServer("ok") as server:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await probe_rtsp(server.url())
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.perf_counter() - start
+        assert all(result.healthy for result in results)
+        return total / elapsed * 60
+
+
+def test_histogram():
+    histogram = LatencyHistogram()
+    for value in [1, 3, 8, 15, 40, 90, 150, 400, 900, 7000]:
+        histogram.observe(value)
+    data = histogram.to_dict()
+    assert data["count"] == 10 and data["max_ms"] == 7000
+    assert data["buckets"]["5"] == 2 and data["buckets"]["inf"] == 1
+    assert histogram.percentile(50) == 50.0
+
+
+def test_ok():
+    asyncio.run(_test_ok())
+
+
+def test_no_stream():
+    asyncio.run(_test_no_stream())
+
+
+def test_silent():
+    asyncio.run(_test_silent())
+
+
+def test_describe_hang():
+    asyncio.run(_test_describe_hang())
+
+
+def test_garbage():
+    asyncio.run(_test_garbage())
+
+
+def test_digest():
+    asyncio.run(_test_digest())
+
+
+def test_closed_port():
+    asyncio.run(_test_closed_port())
+
+
+def test_throughput():
+    per_minute = asyncio.run(_test_throughput())
+    assert per_minute > 5000, per_minute
+
+
+if __name__ == "__main__":
+    tests = [test_histogram, test_ok, test_no_stream, test_silent, test_describe_hang, test_garbage, test_digest, test_closed_port]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e}")
+    rate = asyncio.run(_test_throughput())
+    print(f"📊 本地吞吐: 约 {rate:.0f} 次探测/分钟")
+    raise SystemExit(1 if failures else 0)
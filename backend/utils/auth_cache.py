@@ -0,0 +1,92 @@
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import DateTime, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from config import settings
+from models.user import User
+from utils.cache import StatsCache, stats_cache
+
+logger = logging.getLogger(__name__)
+
+# 不进入缓存的敏感字段，需要时由调用方显式刷新
+EXCLUDED_COLUMNS = {'hashed_password'}
+
+
+class AuthCache:
+    """已认证用户与权限的短TTL缓存
+
+    复用 StatsCache（进程内L1 + Redis L2 + 标签失效），按用户名缓存用户行和角色权限，
+    用户、角色或密码变更时按标签失效，多个进程通过pub/sub同步清理。
+    缓存中的用户行通过 merge(load=False) 挂到当前请求的会话上，不产生查询，
+    端点对 current_user 的修改仍会随会话提交。
+    """
+
+    def __init__(self, cache: StatsCache, ttl: float = 30):
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def user_tag(username: str) -> str:
+        return f"auth:user:{username}"
+
+    @staticmethod
+    def _user_to_dict(user: User) -> Dict[str, Any]:
+        return {
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+            if column.key not in EXCLUDED_COLUMNS
+        }
+
+    @staticmethod
+    def _user_from_dict(data: Dict[str, Any]) -> User:
+        values = dict(data)
+        for column in User.__table__.columns:
+            if isinstance(column.type, DateTime) and isinstance(values.get(column.key), str):
+                values[column.key] = datetime.fromisoformat(values[column.key])
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    async def get_user(self, db: AsyncSession, username: str) -> Optional[User]:
+        """获取用户（缓存未命中时查询数据库）"""
+        loaded: Dict[str, Optional[User]] = {}
+
+        async def load_user():
+            result = await db.execute(select(User).where(User.username == username))
+            user = result.scalar_one_or_none()
+            loaded['user'] = user
+            return self._user_to_dict(user) if user else None
+
+        data = await self.cache.get_or_set(
+            f"auth:user:{username}", load_user, ttl=self.ttl,
+            tags=["auth", self.user_tag(username)]
+        )
+        if 'user' in loaded:
+            return loaded['user']
+        if data is None:
+            return None
+        return await db.merge(self._user_from_dict(data), load=False)
+
+    async def get_roles_and_permissions(self, user: User,
+                                        loader: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """获取用户的角色和权限（角色变更时通过 "auth" 标签整体失效）"""
+        return await self.cache.get_or_set(
+            f"auth:permissions:{user.username}", loader, ttl=self.ttl,
+            tags=["auth", self.user_tag(user.username)]
+        )
+
+    async def invalidate_user(self, *usernames: str):
+        """用户信息、密码或角色分配变更后调用"""
+        await self.cache.invalidate_tags(*[self.user_tag(username) for username in usernames if username])
+
+    async def invalidate_all(self):
+        """角色定义变更后调用（影响所有拥有该角色的用户）"""
+        await self.cache.invalidate_tags("auth")
+
+
+# 全局认证缓存实例
+auth_cache = AuthCache(stats_cache, ttl=settings.AUTH_CACHE_TTL)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """算法微批处理器
+
+    按算法键收集待推理的帧，凑满 max_batch_size 张或等待超过 max_wait_ms 后，
+    一次性调用算法包的 process_batch(images) 入口，再把结果逐一回填给调用方。
+    推理函数在线程池中执行，避免阻塞事件循环。
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: int = 20):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0, max_wait_ms)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._batch_fns: Dict[str, Callable[[List[Any]], List[Any]]] = {}
+        self._limits: Dict[str, Tuple[int, int]] = {}
+
+        # 统计信息
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'failed_batches': 0
+        }
+
+    async def submit(self, key: str, batch_fn: Callable[[List[Any]], List[Any]], item: Any,
+                     max_batch_size: Optional[int] = None, max_wait_ms: Optional[int] = None) -> Any:
+        """提交单个输入，等待所在批次的对应结果
+
+        Args:
+            key: 批处理键（算法编码:版本:配置摘要），相同键的输入会被合并，
+                 同一键的 batch_fn 必须等价（后提交的会替换之前的）
+            batch_fn: 批量推理函数，输入列表，返回等长结果列表
+            item: 单个输入（图像）
+            max_batch_size: 覆盖默认的最大批大小（来自algorithm.json）
+            max_wait_ms: 覆盖默认的最大等待时间（来自algorithm.json）
+
+        Returns:
+            该输入对应的推理结果
+        """
+        # 算法包更新后使用最新的入口函数
+        self._batch_fns[key] = batch_fn
+        self._limits[key] = (
+            max(1, max_batch_size or self.max_batch_size),
+            max(0, max_wait_ms if max_wait_ms is not None else self.max_wait_ms)
+        )
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[key] = queue
+
+        worker = self._workers.get(key)
+        if worker is None or worker.done():
+            self._workers[key] = asyncio.create_task(self._batch_loop(key, queue))
+
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((item, future))
+        return await future
+
+    async def _batch_loop(self, key: str, queue: asyncio.Queue):
+        """单个算法键的批处理循环"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # 阻塞等待批次中的第一帧
+            first = await queue.get()
+            batch = [first]
+
+            max_batch_size, max_wait_ms = self._limits.get(key, (self.max_batch_size, self.max_wait_ms))
+            deadline = loop.time() + max_wait_ms / 1000.0
+
+            # 在等待窗口内继续收集，直到凑满批次
+            while len(batch) < max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # 跳过调用方已取消的请求
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            await self._run_batch(key, batch)
+
+    async def _run_batch(self, key: str, batch: List[Tuple[Any, asyncio.Future]]):
+        """执行一个批次并回填结果"""
+        loop = asyncio.get_running_loop()
+        batch_fn = self._batch_fns[key]
+        items = [item for item, _ in batch]
+
+        start_time = time.time()
+        try:
+            results = await loop.run_in_executor(None, batch_fn, items)
+            results = list(results)
+            if len(results) != len(items):
+                raise ValueError(f"process_batch返回结果数量({len(results)})与输入数量({len(items)})不一致")
+        except Exception as e:
+            logger.error(f"批量推理失败 [{key}] batch_size={len(items)}: {str(e)}")
+            self.stats['failed_batches'] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats['batches'] += 1
+        self.stats['items'] += len(items)
+        logger.debug(f"批量推理完成 [{key}] batch_size={len(items)}, 耗时: {(time.time() - start_time) * 1000:.2f}ms")
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取批处理统计信息"""
+        avg_batch_size = self.stats['items'] / self.stats['batches'] if self.stats['batches'] else 0
+        return {
+            **self.stats,
+            'avg_batch_size': round(avg_batch_size, 2),
+            'pending': {key: queue.qsize() for key, queue in self._queues.items()}
+        }
+
+    async def close(self):
+        """停止所有批处理循环"""
+        for worker in self._workers.values():
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+
+        # 未处理的请求直接失败，避免调用方永久等待
+        for queue in self._queues.values():
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("批处理器已关闭"))
+        self._queues.clear()
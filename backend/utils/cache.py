@@ -0,0 +1,311 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from database import async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """统计类接口的共享缓存（进程内L1 + Redis L2）
+
+    - L1: 进程内字典，TTL较短，命中时不访问Redis
+    - L2: Redis，所有uvicorn进程和副本共享同一份聚合结果
+    - 防击穿: 进程内同一键只有一个协程在计算；跨进程通过Redis锁保证只有一个进程重算，
+      其他进程短暂等待结果写入
+    - 标签失效: 写入时记录 标签 -> 键集合，按标签删除并通过pub/sub通知各进程清理L1
+
+    Redis不可用时自动退化为仅使用L1。
+    """
+
+    def __init__(self, redis_client=None, namespace: str = "easysight:cache",
+                 l1_ttl: float = 5, l1_max_size: int = 1024,
+                 lock_timeout: float = 10, lock_wait: float = 3):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.l1_ttl = l1_ttl
+        self.l1_max_size = l1_max_size
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.channel = f"{namespace}:invalidate"
+
+        # L1: key -> (过期时间, 值, 标签)
+        self._l1: Dict[str, Tuple[float, Any, Tuple[str, ...]]] = {}
+        # 进程内正在计算的键
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+        self._redis_available = redis_client is not None
+
+        # 统计信息
+        self.stats = {
+            'l1_hits': 0,
+            'l2_hits': 0,
+            'misses': 0,
+            'redis_errors': 0
+        }
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.namespace}:lock:{key}"
+
+    def _on_redis_error(self, action: str, error: Exception):
+        self.stats['redis_errors'] += 1
+        if self._redis_available:
+            logger.warning(f"Redis缓存{action}失败，退化为进程内缓存: {error}")
+        self._redis_available = False
+
+    def _get_l1(self, key: str) -> Tuple[bool, Any]:
+        entry = self._l1.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._l1.pop(key, None)
+            return False, None
+        return True, value
+
+    def _set_l1(self, key: str, value: Any, ttl: float, tags: Tuple[str, ...]):
+        if len(self._l1) >= self.l1_max_size:
+            # 先清理过期项，仍然超限时淘汰最早过期的一半
+            now = time.monotonic()
+            for k in [k for k, v in self._l1.items() if v[0] < now]:
+                self._l1.pop(k, None)
+            if len(self._l1) >= self.l1_max_size:
+                for k, _ in sorted(self._l1.items(), key=lambda item: item[1][0])[:self.l1_max_size // 2]:
+                    self._l1.pop(k, None)
+        self._l1[key] = (time.monotonic() + min(ttl, self.l1_ttl), value, tags)
+
+    def _drop_l1_tags(self, tags: Iterable[str]):
+        tags = set(tags)
+        for key in [k for k, v in self._l1.items() if tags.intersection(v[2])]:
+            self._l1.pop(key, None)
+
+    async def _get_l2(self, key: str) -> Tuple[bool, Any]:
+        if not self.redis:
+            return False, None
+        try:
+            raw = await self.redis.get(self._redis_key(key))
+            self._redis_available = True
+        except Exception as e:
+            self._on_redis_error("读取", e)
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    async def _set_l2(self, key: str, value: Any, ttl: float, tags: Tuple[str, ...]):
+        if not self.redis:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(self._redis_key(key), json.dumps(value, ensure_ascii=False), ex=max(1, int(ttl)))
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                # 标签集合比缓存值多保留一段时间，过期后自然清理
+                pipe.expire(self._tag_key(tag), max(60, int(ttl) * 10))
+            await pipe.execute()
+        except Exception as e:
+            self._on_redis_error("写入", e)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]],
+                         ttl: float = 30, tags: Iterable[str] = ()) -> Any:
+        """获取缓存值，未命中时调用loader计算并写入缓存
+
+        Args:
+            key: 缓存键（不含命名空间）
+            loader: 计算函数，返回值会经jsonable_encoder转换为可JSON序列化的结构
+            ttl: 缓存有效期(秒)
+            tags: 失效标签，调用invalidate_tags时一并删除
+
+        Returns:
+            缓存值（JSON结构）
+        """
+        tags = tuple(tags)
+        self._ensure_listener()
+
+        hit, value = self._get_l1(key)
+        if hit:
+            self.stats['l1_hits'] += 1
+            return value
+
+        # 进程内单飞：同一键只由一个协程计算
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # 自身被取消则继续抛出；计算方被取消时由当前协程接手计算
+                if not inflight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader, ttl, tags)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现"Future exception was never retrieved"
+            future.exception()
+            raise
+        except BaseException:
+            # 计算方被取消（如客户端断开），取消future，避免等待者永远挂起
+            future.cancel()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                    ttl: float, tags: Tuple[str, ...]) -> Any:
+        hit, value = await self._get_l2(key)
+        if hit:
+            self.stats['l2_hits'] += 1
+            self._set_l1(key, value, ttl, tags)
+            return value
+
+        # 跨进程单飞：抢到锁的进程负责重算，其他进程等待结果
+        lock_token = await self._acquire_lock(key)
+        if lock_token is None:
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                hit, value = await self._get_l2(key)
+                if hit:
+                    self.stats['l2_hits'] += 1
+                    self._set_l1(key, value, ttl, tags)
+                    return value
+            # 等待超时则自行计算，保证可用性
+
+        self.stats['misses'] += 1
+        try:
+            value = jsonable_encoder(await loader())
+            self._set_l1(key, value, ttl, tags)
+            await self._set_l2(key, value, ttl, tags)
+            return value
+        finally:
+            if lock_token:
+                await self._release_lock(key, lock_token)
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        """获取重算锁，Redis不可用时视为已获取"""
+        token = uuid.uuid4().hex
+        if not self.redis or not self._redis_available:
+            return token
+        try:
+            acquired = await self.redis.set(
+                self._lock_key(key), token, nx=True, px=int(self.lock_timeout * 1000)
+            )
+            return token if acquired else None
+        except Exception as e:
+            self._on_redis_error("加锁", e)
+            return token
+
+    async def _release_lock(self, key: str, token: str):
+        if not self.redis or not self._redis_available:
+            return
+        try:
+            # 只释放自己持有的锁
+            await self.redis.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+                1, self._lock_key(key), token
+            )
+        except Exception as e:
+            self._on_redis_error("释放锁", e)
+
+    async def invalidate_tags(self, *tags: str):
+        """按标签失效缓存（本进程L1立即清理，其他进程通过pub/sub清理）"""
+        if not tags:
+            return
+        self._drop_l1_tags(tags)
+        if not self.redis:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for tag in tags:
+                pipe.smembers(self._tag_key(tag))
+            members = await pipe.execute()
+
+            keys = {self._redis_key(key) for group in members for key in group}
+            pipe = self.redis.pipeline()
+            if keys:
+                pipe.delete(*keys)
+            pipe.delete(*[self._tag_key(tag) for tag in tags])
+            pipe.publish(self.channel, json.dumps(list(tags)))
+            await pipe.execute()
+            self._redis_available = True
+        except Exception as e:
+            self._on_redis_error("失效", e)
+
+    async def invalidate(self, *keys: str):
+        """按键失效缓存"""
+        for key in keys:
+            self._l1.pop(key, None)
+        if not self.redis or not keys:
+            return
+        try:
+            await self.redis.delete(*[self._redis_key(key) for key in keys])
+        except Exception as e:
+            self._on_redis_error("失效", e)
+
+    def _ensure_listener(self):
+        """按需启动失效消息监听"""
+        if self.redis and (self._listener_task is None or self._listener_task.done()):
+            self._listener_task = asyncio.create_task(self._listen_invalidations())
+
+    async def _listen_invalidations(self):
+        """订阅其他进程发布的标签失效消息"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._drop_l1_tags(json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"缓存失效订阅中断，稍后重试: {e}")
+                # 订阅中断期间的失效消息会丢失，清空L1以免读到旧数据
+                self._l1.clear()
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    async def close(self):
+        """停止失效消息监听"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            await asyncio.gather(self._listener_task, return_exceptions=True)
+            self._listener_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            **self.stats,
+            'l1_size': len(self._l1),
+            'redis_available': self._redis_available
+        }
+
+
+# 全局统计缓存实例
+stats_cache = StatsCache(async_redis_client)
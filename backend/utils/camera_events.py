@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from database import async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class CameraStatusBroadcaster:
+    """摄像头状态变化广播
+
+    - 进程内: 每个订阅者一个有界队列，消费过慢时清空积压并放入 None 作为重新同步标记
+    - 跨副本: 通过Redis频道扇出，每个进程订阅后转发给本地订阅者，忽略自己发布的消息
+    Redis不可用时只在本进程内广播。
+    """
+
+    def __init__(self, redis_client=None, channel: str = "easysight:camera_status",
+                 queue_size: int = 1000):
+        self.redis = redis_client
+        self.channel = channel
+        self.queue_size = queue_size
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._listener_task: Optional[asyncio.Task] = None
+        self.stats = {'published': 0, 'received_remote': 0, 'dropped': 0}
+
+    @staticmethod
+    def make_event(camera_id: int, code: Optional[str], old_status: Any, new_status: Any) -> Dict[str, Any]:
+        """构造状态变化事件（状态统一为枚举值字符串）"""
+        return {
+            'camera_id': camera_id,
+            'code': code,
+            'old_status': getattr(old_status, 'value', old_status),
+            'new_status': getattr(new_status, 'value', new_status),
+            'changed_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """注册本地订阅者，返回接收事件列表的队列（取到 None 表示有消息丢失，需要重新同步）"""
+        self._ensure_listener()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _deliver(self, events: List[Dict[str, Any]]):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # 消费过慢: 清空积压并放入 None，订阅者收到后应重新获取完整快照
+                while not queue.empty():
+                    queue.get_nowait()
+                    self.stats['dropped'] += 1
+                queue.put_nowait(None)
+            queue.put_nowait(events)
+
+    async def publish(self, events: Iterable[Dict[str, Any]]):
+        """发布一批状态变化（本进程立即投递，其他副本经Redis接收）"""
+        events = list(events)
+        if not events:
+            return
+        self.stats['published'] += len(events)
+        self._deliver(events)
+        if not self.redis:
+            return
+        try:
+            await self.redis.publish(self.channel, json.dumps({'origin': self.origin, 'events': events}))
+        except Exception as e:
+            logger.debug(f"摄像头状态广播到Redis失败: {e}")
+
+    def _ensure_listener(self):
+        """按需启动Redis订阅"""
+        if self.redis and (self._listener_task is None or self._listener_task.done()):
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """接收其他副本发布的状态变化"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') == self.origin:
+                        continue
+                    events = payload.get('events') or []
+                    self.stats['received_remote'] += len(events)
+                    self._deliver(events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"摄像头状态订阅中断，稍后重试: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    async def close(self):
+        """停止Redis订阅"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            await asyncio.gather(self._listener_task, return_exceptions=True)
+            self._listener_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'subscribers': len(self._subscribers)}
+
+
+# 全局摄像头状态广播实例
+camera_status_broadcaster = CameraStatusBroadcaster(async_redis_client)
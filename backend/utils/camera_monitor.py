@@ -1,162 +1,236 @@
 import asyncio
 import aiohttp
 import logging
+import random
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
 from database import get_db
 from models.camera import Camera, CameraStatus
-from typing import List, Optional
+from utils.cache import stats_cache
+from utils.camera_events import camera_status_broadcaster
+from utils.rtsp_probe import CameraProbeMetrics, RtspProbeResult, probe_rtsp
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class ProbeState:
+    """单个摄像头的探测状态"""
+    interval: float
+    next_check_at: float = 0.0
+    last_status: Optional[CameraStatus] = None
+    stable_count: int = 0  # 连续相同结果次数
+    flap_count: int = 0    # 累计状态变化次数
+
+
 class CameraMonitor:
-    """摄像头状态监控器"""
-    
-    def __init__(self):
-        self.session_timeout = aiohttp.ClientTimeout(total=10)  # 10秒超时
-    
-    async def check_rtsp_stream(self, stream_url: str) -> bool:
-        """检查RTSP流是否可用"""
-        try:
-            # 验证URL格式
-            if not stream_url.startswith('rtsp://'):
-                logger.warning(f"Invalid RTSP URL format: {stream_url}")
-                return False
-            
-            # 使用简单的TCP连接测试替代OpenCV，避免阻塞和异常
-            import socket
-            import asyncio
-            from urllib.parse import urlparse
-            
-            def _check_rtsp_tcp():
-                """通过TCP连接测试RTSP服务是否可达"""
-                try:
-                    parsed = urlparse(stream_url)
-                    host = parsed.hostname
-                    port = parsed.port or 554  # RTSP默认端口
-                    
-                    if not host:
-                        return False
-                    
-                    # 创建TCP连接测试
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.settimeout(3)  # 3秒超时
-                    result = sock.connect_ex((host, port))
-                    sock.close()
-                    return result == 0
-                except Exception:
-                    return False
-            
-            # 在线程池中运行TCP连接测试
-            loop = asyncio.get_event_loop()
-            from concurrent.futures import ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                future = loop.run_in_executor(executor, _check_rtsp_tcp)
-                return await asyncio.wait_for(future, timeout=5.0)
-                
-        except asyncio.TimeoutError:
-            logger.debug(f"RTSP stream check timeout for {stream_url}")
-            return False
-        except Exception as e:
-            logger.debug(f"RTSP stream check failed for {stream_url}: {e}")
-            return False
-    
+    """摄像头状态监控器
+
+    - 所有探测共享一个并发上限（信号量），RTSP通过原生asyncio连接发送OPTIONS/DESCRIBE
+      （端口可连但无正常应答时判为ERROR），HTTP复用同一个 aiohttp.ClientSession
+    - 记录每个RTSP摄像头的连接和DESCRIBE延迟直方图，用于发现链路劣化
+    - 每个摄像头独立的探测间隔: 结果连续不变时逐步放大到 max_interval，
+      状态变化（含抖动）时缩短到 min_interval 尽快复查
+    - 探测过程不占用数据库会话，每轮的状态变化用一次批量UPDATE写入，并通过
+      camera_status_broadcaster 广播给订阅者（SSE、AI服务监控等）
+    """
+
+    def __init__(self, max_concurrency: int = None, probe_timeout: float = None,
+                 min_interval: float = None, max_interval: float = None):
+        self.max_concurrency = max_concurrency or settings.CAMERA_PROBE_CONCURRENCY
+        self.probe_timeout = probe_timeout or settings.CAMERA_PROBE_TIMEOUT
+        self.min_interval = min_interval or settings.CAMERA_PROBE_MIN_INTERVAL
+        self.max_interval = max_interval or settings.CAMERA_PROBE_MAX_INTERVAL
+        # 新摄像头的初始间隔（与原先固定30秒一轮一致）
+        self.initial_interval = max(self.min_interval, min(30, self.max_interval))
+        self.session_timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._states: Dict[int, ProbeState] = {}
+        self._probe_metrics: Dict[int, CameraProbeMetrics] = {}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                timeout=self.session_timeout,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, ssl=False)
+            )
+        return self._http_session
+
+    async def close(self):
+        """关闭共享的HTTP会话"""
+        if self._http_session and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+
+    async def check_rtsp_stream(self, stream_url: str) -> RtspProbeResult:
+        """检查RTSP流（OPTIONS + DESCRIBE，只读应答头不拉流）"""
+        if not stream_url.startswith('rtsp://'):
+            logger.warning(f"Invalid RTSP URL format: {stream_url}")
+            return RtspProbeResult(reachable=False, error="无效的RTSP地址")
+        result = await probe_rtsp(stream_url, timeout=self.probe_timeout)
+        if result.error:
+            logger.debug(f"RTSP stream check failed for {stream_url}: {result.error}")
+        return result
+
     async def check_http_stream(self, stream_url: str) -> bool:
         """检查HTTP流是否可用"""
         try:
-            async with aiohttp.ClientSession(timeout=self.session_timeout) as session:
-                async with session.head(stream_url) as response:
-                    return response.status == 200
+            async with self._get_http_session().head(stream_url) as response:
+                return response.status == 200
         except Exception as e:
             logger.debug(f"HTTP stream check failed for {stream_url}: {e}")
             return False
-    
+
     async def check_camera_status(self, camera: Camera) -> CameraStatus:
         """检查单个摄像头状态"""
         if not camera.stream_url:
             return CameraStatus.ERROR
-        
-        # 验证URL格式
-        if not (camera.stream_url.startswith('rtsp://') or 
-                camera.stream_url.startswith('http://') or 
-                camera.stream_url.startswith('https://')):
-            logger.warning(f"Unsupported stream URL format: {camera.stream_url}")
-            return CameraStatus.ERROR
-        
+
         # 根据流URL类型选择检测方法
         if camera.stream_url.startswith('rtsp://'):
-            is_available = await self.check_rtsp_stream(camera.stream_url)
+            result = await self.check_rtsp_stream(camera.stream_url)
+            self._probe_metrics.setdefault(camera.id, CameraProbeMetrics()).record(result)
+            if not result.reachable:
+                return CameraStatus.OFFLINE
+            # 端口可连但RTSP服务无正常应答（编码器异常、流不存在等）
+            return CameraStatus.ONLINE if result.healthy else CameraStatus.ERROR
         elif camera.stream_url.startswith('http://') or camera.stream_url.startswith('https://'):
             is_available = await self.check_http_stream(camera.stream_url)
         else:
+            logger.warning(f"Unsupported stream URL format: {camera.stream_url}")
             return CameraStatus.ERROR
-        
+
         return CameraStatus.ONLINE if is_available else CameraStatus.OFFLINE
-    
-    async def update_camera_status(self, db: AsyncSession, camera_id: int, status: CameraStatus):
-        """更新摄像头状态"""
+
+    async def _probe(self, camera: Camera) -> CameraStatus:
+        """在全局并发上限内探测摄像头"""
+        async with self._get_semaphore():
+            try:
+                return await self.check_camera_status(camera)
+            except Exception as e:
+                logger.error(f"Error checking camera {camera.code}: {e}")
+                return CameraStatus.ERROR
+
+    def _schedule_next(self, state: ProbeState, status: CameraStatus, now: float) -> bool:
+        """根据探测结果调整下次探测时间，返回状态是否发生变化"""
+        changed = state.last_status is not None and status != state.last_status
+        if changed:
+            state.flap_count += 1
+            state.stable_count = 0
+            state.interval = self.min_interval
+        else:
+            state.stable_count += 1
+            # 连续两次结果一致后开始退避
+            if state.stable_count >= 2:
+                state.interval = min(self.max_interval, state.interval * 2)
+        state.last_status = status
+        # 加入±10%抖动，避免大量摄像头在同一时刻集中探测
+        state.next_check_at = now + state.interval * random.uniform(0.9, 1.1)
+        return changed
+
+    async def update_camera_statuses(self, db: AsyncSession, changes: List[Tuple[int, CameraStatus]]) -> bool:
+        """批量更新摄像头状态（一次executemany的UPDATE），返回是否写入成功"""
+        if not changes:
+            return False
+        now = datetime.now(timezone.utc)
         try:
-            stmt = (
-                update(Camera)
-                .where(Camera.id == camera_id)
-                .values(
-                    status=status,
-                    last_heartbeat=datetime.now(timezone.utc)
-                )
+            await db.execute(
+                update(Camera),
+                [{"id": camera_id, "status": status, "last_heartbeat": now} for camera_id, status in changes]
             )
-            await db.execute(stmt)
             await db.commit()
-            logger.debug(f"Updated camera {camera_id} status to {status.value}")
+            await stats_cache.invalidate_tags("cameras")
+            logger.debug(f"Updated status of {len(changes)} cameras")
+            return True
         except Exception as e:
-            logger.error(f"Failed to update camera {camera_id} status: {e}")
+            logger.error(f"Failed to update camera statuses: {e}")
             await db.rollback()
-    
+            return False
+
     async def monitor_all_cameras(self):
-        """监控所有摄像头状态"""
-        logger.info("Starting camera status monitoring...")
-        
+        """监控所有到期的摄像头状态"""
         async for db in get_db():
             try:
                 # 获取所有启用的摄像头
                 result = await db.execute(
-                    select(Camera).where(Camera.is_active == True)
+                    select(Camera.id, Camera.code, Camera.stream_url, Camera.status)
+                    .where(Camera.is_active == True)
                 )
-                cameras = result.scalars().all()
-                
-                logger.info(f"Monitoring {len(cameras)} cameras")
-                
-                # 并发检查所有摄像头状态
-                tasks = []
+                cameras = result.all()
+                # 结束只读事务，探测期间不占用数据库连接
+                await db.commit()
+
+                # 清理已删除或已停用摄像头的探测状态
+                active_ids = {camera.id for camera in cameras}
+                for camera_id in list(self._states):
+                    if camera_id not in active_ids:
+                        del self._states[camera_id]
+                        self._probe_metrics.pop(camera_id, None)
+
+                now = time.monotonic()
+                due = []
                 for camera in cameras:
-                    task = self.check_and_update_camera(db, camera)
-                    tasks.append(task)
-                
-                if tasks:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                
-                logger.info("Camera status monitoring completed")
-                
+                    state = self._states.get(camera.id)
+                    if state is None:
+                        state = self._states[camera.id] = ProbeState(interval=self.initial_interval)
+                    if state.next_check_at <= now:
+                        due.append(camera)
+
+                if not due:
+                    return
+
+                logger.info(f"Probing {len(due)}/{len(cameras)} cameras")
+                statuses = await asyncio.gather(*[self._probe(camera) for camera in due])
+
+                now = time.monotonic()
+                changes = []
+                events = []
+                for camera, new_status in zip(due, statuses):
+                    self._schedule_next(self._states[camera.id], new_status, now)
+                    # 与数据库中的状态比较，只写入有变化的摄像头
+                    if new_status != camera.status:
+                        changes.append((camera.id, new_status))
+                        events.append(camera_status_broadcaster.make_event(
+                            camera.id, camera.code, camera.status, new_status
+                        ))
+                        old_status = camera.status.value if camera.status else None
+                        logger.info(f"Camera {camera.code} status changed: {old_status} -> {new_status.value}")
+
+                if await self.update_camera_statuses(db, changes):
+                    await camera_status_broadcaster.publish(events)
+                logger.info(f"Camera status monitoring completed, {len(changes)} changed")
+
             except Exception as e:
                 logger.error(f"Error in camera monitoring: {e}")
             finally:
                 await db.close()
-    
-    async def check_and_update_camera(self, db: AsyncSession, camera: Camera):
-        """检查并更新单个摄像头状态"""
-        try:
-            new_status = await self.check_camera_status(camera)
-            
-            # 只有状态发生变化时才更新
-            if new_status != camera.status:
-                await self.update_camera_status(db, camera.id, new_status)
-                logger.info(f"Camera {camera.code} status changed: {camera.status.value} -> {new_status.value}")
-            
-        except Exception as e:
-            logger.error(f"Error checking camera {camera.code}: {e}")
-            # 如果检查失败，标记为错误状态
-            if camera.status != CameraStatus.ERROR:
-                await self.update_camera_status(db, camera.id, CameraStatus.ERROR)
+
+    def get_probe_metrics(self, camera_id: int) -> Optional[Dict]:
+        """获取摄像头的RTSP探测延迟统计"""
+        metrics = self._probe_metrics.get(camera_id)
+        return metrics.to_dict() if metrics else None
+
+    def get_stats(self) -> Dict[str, int]:
+        """探测状态统计"""
+        now = time.monotonic()
+        return {
+            "tracked_cameras": len(self._states),
+            "due_cameras": sum(1 for state in self._states.values() if state.next_check_at <= now),
+            "fast_recheck_cameras": sum(1 for state in self._states.values() if state.interval <= self.min_interval),
+            "backed_off_cameras": sum(1 for state in self._states.values() if state.interval >= self.max_interval),
+        }
 
 # 全局监控器实例
-camera_monitor = CameraMonitor()
\ No newline at end of file
+camera_monitor = CameraMonitor()
@@ -0,0 +1,107 @@
+import logging
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import String, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.event import Event, EventDailyStats, EventLevel
+
+logger = logging.getLogger(__name__)
+
+# 汇总维度: (统计日期, 事件类型, 事件级别, 状态)，类型/级别/状态均为枚举名称
+EventBucket = Tuple[date, str, str, str]
+
+# 事件级别为空时按默认级别归档
+DEFAULT_LEVEL = EventLevel.MEDIUM.name
+
+
+def _bucket_columns():
+    """事件所属汇总桶的SQL表达式（与回填使用同一套口径）"""
+    return (
+        func.date(Event.created_at).label('stat_date'),
+        cast(Event.event_type, String).label('event_type'),
+        func.coalesce(cast(Event.event_level, String), DEFAULT_LEVEL).label('event_level'),
+        cast(Event.status, String).label('status'),
+    )
+
+
+async def get_event_bucket(db: AsyncSession, event_id: int) -> Optional[EventBucket]:
+    """查询事件当前所属的汇总桶，事件不存在时返回None"""
+    result = await db.execute(select(*_bucket_columns()).where(Event.id == event_id))
+    row = result.first()
+    return tuple(row) if row else None
+
+
+async def _add_to_bucket(db: AsyncSession, bucket: EventBucket, delta: int):
+    stat_date, event_type, event_level, status = bucket
+    stmt = pg_insert(EventDailyStats).values(
+        stat_date=stat_date,
+        event_type=event_type,
+        event_level=event_level,
+        status=status,
+        event_count=delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint='uq_event_daily_stats_bucket',
+        set_={
+            'event_count': EventDailyStats.event_count + stmt.excluded.event_count,
+            'updated_at': func.now()
+        }
+    )
+    await db.execute(stmt)
+
+
+async def apply_event_change(db: AsyncSession, old_bucket: Optional[EventBucket],
+                             new_bucket: Optional[EventBucket]):
+    """在当前事务中增量更新汇总表
+
+    Args:
+        db: 与事件写入相同的会话，随事件一起提交
+        old_bucket: 变更前所属的桶，新建事件时为None
+        new_bucket: 变更后所属的桶，删除事件时为None
+    """
+    if old_bucket == new_bucket:
+        return
+    if old_bucket is not None:
+        await _add_to_bucket(db, old_bucket, -1)
+    if new_bucket is not None:
+        await _add_to_bucket(db, new_bucket, 1)
+
+
+async def rebuild_event_daily_stats(db: AsyncSession, start_date: Optional[date] = None,
+                                    end_date: Optional[date] = None) -> int:
+    """从events表重建指定日期范围内的汇总数据（不提交事务）
+
+    Args:
+        db: 数据库会话
+        start_date: 起始日期（含），为空时不限
+        end_date: 结束日期（含），为空时不限
+
+    Returns:
+        写入的汇总行数
+    """
+    stat_date, event_type, event_level, status = _bucket_columns()
+
+    delete_stmt = delete(EventDailyStats)
+    if start_date:
+        delete_stmt = delete_stmt.where(EventDailyStats.stat_date >= start_date)
+    if end_date:
+        delete_stmt = delete_stmt.where(EventDailyStats.stat_date <= end_date)
+    await db.execute(delete_stmt)
+
+    source = select(stat_date, event_type, event_level, status, func.count(Event.id))
+    if start_date:
+        source = source.where(func.date(Event.created_at) >= start_date)
+    if end_date:
+        source = source.where(func.date(Event.created_at) <= end_date)
+    source = source.group_by(stat_date, event_type, event_level, status)
+
+    result = await db.execute(
+        pg_insert(EventDailyStats).from_select(
+            ['stat_date', 'event_type', 'event_level', 'status', 'event_count'], source
+        )
+    )
+    logger.info(f"事件日汇总重建完成: {start_date or '-'} ~ {end_date or '-'}, 共 {result.rowcount} 行")
+    return result.rowcount
@@ -0,0 +1,190 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+
+Box = Tuple[float, float, float, float]
+
+
+def _box_of(detection: Dict[str, Any]) -> Optional[Box]:
+    """检测目标的 (x1, y1, x2, y2)，bbox 按 [x, y, width, height]，box/xyxy 按两点坐标"""
+    bbox = detection.get('bbox')
+    if bbox and len(bbox) >= 4:
+        return float(bbox[0]), float(bbox[1]), float(bbox[0]) + float(bbox[2]), float(bbox[1]) + float(bbox[3])
+    box = detection.get('box') or detection.get('xyxy')
+    if box and len(box) >= 4:
+        return float(box[0]), float(box[1]), float(box[2]), float(box[3])
+    return None
+
+
+def iou(a: Box, b: Box) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class SuppressionPolicy:
+    """抑制参数，可由AI服务 alarm_config 覆盖"""
+    cooldown_seconds: float = settings.AI_SERVICE_EVENT_COOLDOWN
+    cell_size: float = settings.AI_EVENT_DEDUP_CELL_SIZE
+    iou_threshold: float = settings.AI_EVENT_DEDUP_IOU_THRESHOLD
+    expire_seconds: float = settings.AI_EVENT_DEDUP_EXPIRE
+
+    @classmethod
+    def from_config(cls, alarm_config: Optional[Dict[str, Any]]) -> "SuppressionPolicy":
+        config = alarm_config or {}
+        policy = cls()
+        for name, key in (('cooldown_seconds', 'cooldown_seconds'), ('cell_size', 'dedup_cell_size'),
+                          ('iou_threshold', 'dedup_iou_threshold'), ('expire_seconds', 'dedup_expire_seconds')):
+            if config.get(key) is not None:
+                setattr(policy, name, float(config[key]))
+        return policy
+
+
+@dataclass
+class _Track:
+    """同一目标的连续检测"""
+    cell: Optional[Tuple[int, int]]
+    box: Optional[Box]
+    first_seen: float
+    last_seen: float
+    last_emitted: float
+    merged: int = 0
+
+
+@dataclass
+class SuppressionResult:
+    """emit 为需要生成事件的检测目标，merged 为这些目标自上次告警以来被合并掉的检测次数"""
+    emit: List[Dict[str, Any]] = field(default_factory=list)
+    suppressed: int = 0
+    merged: int = 0
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (camera_id, event_type) -> 活跃目标列表
+        self.buckets: Dict[Tuple[int, str], List[_Track]] = {}
+
+
+class EventSuppressor:
+    """检测事件去重/抑制窗口
+
+    状态按 (摄像头, 事件类型) 分桶，桶内每个目标以所在空间网格和最近一次的检测框表示:
+    新检测与已有目标 IoU 达到阈值、或（无检测框时）落在同一网格时合并到该目标，
+    目标在冷却时间内不重复告警，持续存在时每个冷却周期告警一次；超过 expire_seconds
+    未再出现的目标被清除，之后再出现视为新目标。
+
+    桶按摄像头分片、每片独立加锁；多副本部署时摄像头按 AI_SERVICE_SHARD_COUNT
+    分配给各副本（见 owns_camera），同一摄像头的抑制状态只存在于一个进程中。
+    """
+
+    def __init__(self, num_shards: int = 16):
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self.stats = {'detections': 0, 'emitted': 0, 'suppressed': 0, 'expired': 0}
+
+    def _shard(self, camera_id: int) -> _Shard:
+        return self._shards[camera_id % len(self._shards)]
+
+    @staticmethod
+    def _cell(box: Optional[Box], width: int, height: int, cell_size: float) -> Optional[Tuple[int, int]]:
+        """检测框中心所在网格，cell_size 为网格边长占画面的比例"""
+        if box is None or not width or not height or cell_size <= 0:
+            return None
+        cx, cy = (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+        return int(cx / (width * cell_size)), int(cy / (height * cell_size))
+
+    @staticmethod
+    def _match(tracks: List[_Track], cell, box: Optional[Box], policy: SuppressionPolicy,
+               taken: set) -> Optional[_Track]:
+        best, best_iou = None, policy.iou_threshold
+        for track in tracks:
+            if id(track) in taken:
+                continue
+            if box is not None and track.box is not None:
+                overlap = iou(box, track.box)
+                if overlap >= best_iou:
+                    best, best_iou = track, overlap
+            elif best is None and track.cell == cell:
+                best = track
+        return best
+
+    def evaluate(self, camera_id: int, event_type: str, detections: Sequence[Dict[str, Any]],
+                 frame_size: Tuple[int, int], now: float,
+                 policy: Optional[SuppressionPolicy] = None) -> SuppressionResult:
+        """判断一帧检测结果中哪些需要告警，frame_size 为 (宽, 高)，now 为帧时间戳(秒)"""
+        policy = policy or SuppressionPolicy()
+        width, height = frame_size
+        result = SuppressionResult()
+        shard = self._shard(camera_id)
+        with shard.lock:
+            key = (camera_id, event_type)
+            tracks = [
+                track for track in shard.buckets.get(key, [])
+                if now - track.last_seen <= policy.expire_seconds
+            ]
+            self.stats['expired'] += len(shard.buckets.get(key, [])) - len(tracks)
+
+            taken = set()
+            for detection in detections:
+                box = _box_of(detection)
+                cell = self._cell(box, width, height, policy.cell_size)
+                track = self._match(tracks, cell, box, policy, taken)
+                if track is None:
+                    track = _Track(cell, box, now, now, now)
+                    tracks.append(track)
+                    result.emit.append(detection)
+                else:
+                    track.cell, track.box, track.last_seen = cell, box or track.box, now
+                    if now - track.last_emitted >= policy.cooldown_seconds:
+                        track.last_emitted = now
+                        result.merged += track.merged
+                        track.merged = 0
+                        result.emit.append(detection)
+                    else:
+                        track.merged += 1
+                        result.suppressed += 1
+                taken.add(id(track))
+
+            if tracks:
+                shard.buckets[key] = tracks
+            else:
+                shard.buckets.pop(key, None)
+
+        self.stats['detections'] += len(detections)
+        self.stats['emitted'] += len(result.emit)
+        self.stats['suppressed'] += result.suppressed
+        return result
+
+    def forget_camera(self, camera_id: int):
+        """清除摄像头的全部抑制状态（流水线停止或摄像头迁移到其他副本时）"""
+        shard = self._shard(camera_id)
+        with shard.lock:
+            for key in [key for key in shard.buckets if key[0] == camera_id]:
+                del shard.buckets[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'buckets': sum(len(shard.buckets) for shard in self._shards),
+            'tracks': sum(len(tracks) for shard in self._shards for tracks in shard.buckets.values()),
+        }
+
+
+def owns_camera(camera_id: int, shard_index: Optional[int] = None, shard_count: Optional[int] = None) -> bool:
+    """摄像头是否分配给当前副本（按摄像头ID取模）"""
+    shard_count = shard_count if shard_count is not None else settings.AI_SERVICE_SHARD_COUNT
+    shard_index = shard_index if shard_index is not None else settings.AI_SERVICE_SHARD_INDEX
+    if shard_count <= 1:
+        return True
+    return camera_id % shard_count == shard_index
+
+
+# 全局事件抑制实例
+event_suppressor = EventSuppressor()
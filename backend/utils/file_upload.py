@@ -1,19 +1,53 @@
 import os
 import uuid
 import io
+import base64
+import hashlib
+import math
+import time
 import zipfile
 import json
 import tempfile
-from typing import Optional, Dict, Any, List
-from fastapi import UploadFile, HTTPException, Depends
+from typing import Optional, Dict, Any, List, AsyncIterator
+from fastapi import UploadFile, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 from minio import Minio
 from minio.error import S3Error
+from redis.asyncio import Redis
 from config import settings
-from database import get_minio
+from database import get_minio, get_async_redis
+from utils.minio_client import MultipartUploadClient
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 支持的模型文件扩展名
+MODEL_FILE_EXTENSIONS = {".pth", ".pt", ".pb", ".h5", ".onnx", ".xml", ".bin", ".trt", ".engine"}
+
+# multipart请求中边界和字段头允许的额外字节数
+MULTIPART_OVERHEAD = 64 * 1024
+
+class HashingReader:
+    """读取时同步计算sha256的文件包装
+    
+    MinIO put_object 按顺序读取各分片后再并发上传，因此哈希与上传重叠进行，无需单独读一遍文件。
+    """
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        return data
+    
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+
 class FileUploadService:
     """文件上传服务类"""
     
@@ -127,9 +161,62 @@ class FileUploadService:
             return ""
         return os.path.splitext(filename)[1]
     
+    async def receive_upload(self, request: Request, max_size: int, too_large_detail: str,
+                             field: str = "file") -> UploadFile:
+        """边接收边限制大小地解析multipart请求，返回其中的上传文件
+        
+        Content-Length 超限时直接拒绝；未声明或声明不实时在读取请求流的过程中计数，
+        超过 max_size 立即中止，不会先把超大的请求体完整转存到磁盘。
+        调用方用完后需关闭返回的文件。
+        
+        Args:
+            request: 原始请求
+            max_size: 文件允许的最大字节数
+            too_large_detail: 超出大小时的错误信息
+            field: 文件字段名
+            
+        Returns:
+            UploadFile: 已转存到临时文件的上传文件
+        """
+        limit = max_size + MULTIPART_OVERHEAD
+        content_length = request.headers.get("content-length")
+        if content_length:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Content-Length 无效")
+            if content_length > limit:
+                raise HTTPException(status_code=413, detail=too_large_detail)
+        
+        async def limited_stream():
+            received = 0
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=too_large_detail)
+                yield chunk
+        
+        try:
+            form = await MultiPartParser(request.headers, limited_stream(), max_files=1, max_fields=10).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=f"上传内容解析失败: {e.message}")
+        
+        file = form.get(field)
+        if not isinstance(file, StarletteUploadFile):
+            await form.close()
+            raise HTTPException(status_code=400, detail=f"缺少上传文件字段: {field}")
+        if file.size is not None and file.size > max_size:
+            await form.close()
+            raise HTTPException(status_code=413, detail=too_large_detail)
+        return file
+    
     async def upload_algorithm_package(self, file: UploadFile, user_id: int) -> Dict[str, Any]:
         """上传算法包
         
+        只读取ZIP中央目录和algorithm.json完成校验，校验通过后以分片并发方式上传到MinIO，
+        sha256在上传读取数据时同步计算，整个过程不会把算法包完整读入内存。
+        文件大小已由 receive_upload 在接收时限制。
+        
         Args:
             file: 上传的算法包文件
             user_id: 用户ID
@@ -144,34 +231,35 @@ class FileUploadService:
         if not self._is_valid_algorithm_package(file):
             raise HTTPException(status_code=400, detail="只支持 ZIP 格式的算法包")
         
-        # 验证文件大小 (100MB)
-        if file.size and file.size > 100 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="算法包大小不能超过100MB")
-        
         try:
             # 生成唯一文件名
             file_extension = self._get_file_extension(file.filename)
             unique_filename = f"algorithms/{user_id}/{uuid.uuid4().hex}{file_extension}"
             
-            # 读取文件内容
-            file_content = await file.read()
+            file_size = await run_in_threadpool(file.file.seek, 0, os.SEEK_END)
             
-            # 解析算法包
-            package_info = await self._parse_algorithm_package(file_content)
+            # 解析算法包（仅读取中央目录和配置文件）
+            package_info = await run_in_threadpool(self._parse_algorithm_package_file, file.file)
+            await file.seek(0)
             
-            # 上传到MinIO
-            self.minio_client.put_object(
+            # 分片并发上传到MinIO，同时计算哈希
+            reader = HashingReader(file.file)
+            await run_in_threadpool(
+                self.minio_client.put_object,
                 bucket_name=self.bucket_name,
                 object_name=unique_filename,
-                data=io.BytesIO(file_content),
-                length=len(file_content),
-                content_type="application/zip"
+                data=reader,
+                length=file_size,
+                content_type="application/zip",
+                part_size=settings.MINIO_PART_SIZE,
+                num_parallel_uploads=settings.MINIO_PARALLEL_UPLOADS
             )
             
             # 返回文件信息和解析结果
             result = {
                 "file_url": f"/api/v1/files/{unique_filename}",
-                "file_size": len(file_content),
+                "file_size": file_size,
+                "file_hash": reader.hexdigest(),
                 "package_info": package_info
             }
             
@@ -256,9 +344,8 @@ class FileUploadService:
         if not file.filename:
             return False
         
-        valid_extensions = {".pth", ".pt", ".pb", ".h5", ".onnx", ".xml", ".bin", ".trt", ".engine"}
         file_extension = self._get_file_extension(file.filename).lower()
-        return file_extension in valid_extensions
+        return file_extension in MODEL_FILE_EXTENSIONS
     
     async def _parse_algorithm_package(self, file_content: bytes) -> Dict[str, Any]:
         """解析算法包内容
@@ -269,12 +356,27 @@ class FileUploadService:
         Returns:
             Dict[str, Any]: 解析结果
             
+        Raises:
+            HTTPException: 解析失败时抛出异常
+        """
+        return self._parse_algorithm_package_file(io.BytesIO(file_content))
+    
+    def _parse_algorithm_package_file(self, package_file) -> Dict[str, Any]:
+        """从可随机读取的文件对象解析算法包
+        
+        ZipFile只读取文件末尾的中央目录，除algorithm.json外不解压任何条目。
+        
+        Args:
+            package_file: 算法包文件对象
+            
+        Returns:
+            Dict[str, Any]: 解析结果
+            
         Raises:
             HTTPException: 解析失败时抛出异常
         """
         try:
-            # 直接从内存中读取ZIP文件，避免临时文件权限问题
-            with zipfile.ZipFile(io.BytesIO(file_content), 'r') as zip_file:
+            with zipfile.ZipFile(package_file, 'r') as zip_file:
                     # 检查必需文件
                     required_files = ['algorithm.json', 'main.py']
                     file_list = zip_file.namelist()
@@ -286,6 +388,15 @@ class FileUploadService:
                             detail=f"算法包缺少必需文件: {', '.join(missing_files)}"
                         )
                     
+                    # 根据中央目录校验条目路径和解压后大小，防止路径穿越和zip炸弹
+                    uncompressed_size = 0
+                    for info in zip_file.infolist():
+                        if info.filename.startswith('/') or '..' in info.filename.replace('\\', '/').split('/'):
+                            raise HTTPException(status_code=400, detail=f"算法包包含非法路径: {info.filename}")
+                        uncompressed_size += info.file_size
+                    if uncompressed_size > settings.MAX_ALGORITHM_PACKAGE_UNCOMPRESSED_SIZE:
+                        raise HTTPException(status_code=400, detail="算法包解压后体积过大")
+                    
                     # 读取算法配置
                     try:
                         with zip_file.open('algorithm.json') as config_file:
@@ -317,8 +428,10 @@ class FileUploadService:
                         "dependencies": dependencies,
                         "models": models,
                         "files": file_list,
+                        "uncompressed_size": uncompressed_size,
                         "entry_point": algorithm_config.get('entry_point', 'main.py'),
-                        "config_schema": algorithm_config.get('config_schema', {})
+                        "config_schema": algorithm_config.get('config_schema', {}),
+                        "batch": algorithm_config.get('batch')
                     }
                     
         except zipfile.BadZipFile:
@@ -330,7 +443,249 @@ class FileUploadService:
             raise HTTPException(status_code=500, detail="算法包解析失败")
 
 
+class ModelMultipartUploadService:
+    """模型文件分片续传服务
+    
+    一次续传会话对应一个MinIO分片上传（multipart upload）：
+    initiate 创建分片上传，各分片可并行、乱序、重复上传，complete 时由MinIO合并。
+    会话状态和已上传分片记录在Redis中，API多进程/多副本共享；任意分片失败只需重传该分片。
+    MinIO分片接口经 MultipartUploadClient 调用（阻塞调用放到线程池），Redis使用异步客户端。
+    """
+    
+    # S3协议限制：除最后一个分片外，分片不得小于5MB，分片数不得超过10000
+    MIN_PART_SIZE = 5 * 1024 * 1024
+    # 分片在提交给MinIO前需完整缓存在内存中，上限不宜过大
+    MAX_PART_SIZE = 64 * 1024 * 1024
+    MAX_PARTS = 10000
+    SESSION_TTL = 24 * 3600
+    SESSION_KEY_PREFIX = "easysight:upload:model:"
+    
+    def __init__(self, minio_client: Minio, redis_client: Redis):
+        self.multipart = MultipartUploadClient(minio_client, settings.MINIO_BUCKET_NAME)
+        self.redis_client = redis_client
+    
+    def _session_key(self, upload_id: str) -> str:
+        return f"{self.SESSION_KEY_PREFIX}{upload_id}"
+    
+    async def _save(self, upload_id: str, field: str, value: Dict[str, Any]):
+        """写入会话字段并刷新过期时间"""
+        key = self._session_key(upload_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hset(key, field, json.dumps(value))
+        pipe.expire(key, self.SESSION_TTL)
+        await pipe.execute()
+    
+    async def _get_session(self, upload_id: str, user_id: int) -> Dict[str, Any]:
+        """读取续传会话，并校验所属用户"""
+        data = await self.redis_client.hgetall(self._session_key(upload_id))
+        if not data or 'meta' not in data:
+            raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+        
+        session = json.loads(data['meta'])
+        if session['user_id'] != user_id:
+            raise HTTPException(status_code=403, detail="无权访问该上传会话")
+        
+        session['parts'] = {
+            int(field.split(':', 1)[1]): json.loads(value)
+            for field, value in data.items() if field.startswith('part:')
+        }
+        return session
+    
+    def _expected_part_size(self, session: Dict[str, Any], part_number: int) -> int:
+        """计算指定分片应有的大小（最后一个分片可以更小）"""
+        if part_number < session['total_parts']:
+            return session['part_size']
+        return session['file_size'] - session['part_size'] * (session['total_parts'] - 1)
+    
+    async def initiate(self, file_name: str, file_size: int, user_id: int,
+                       part_size: Optional[int] = None) -> Dict[str, Any]:
+        """创建续传会话
+        
+        Args:
+            file_name: 原始文件名
+            file_size: 文件总大小(字节)
+            user_id: 用户ID
+            part_size: 期望的分片大小，不传时使用 MINIO_PART_SIZE
+            
+        Returns:
+            Dict[str, Any]: 会话信息（upload_id、分片大小、分片数量）
+        """
+        file_extension = os.path.splitext(file_name or "")[1].lower()
+        if file_extension not in MODEL_FILE_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="不支持的模型文件格式")
+        if file_size <= 0:
+            raise HTTPException(status_code=400, detail="文件大小无效")
+        
+        part_size = min(max(part_size or settings.MINIO_PART_SIZE, self.MIN_PART_SIZE), self.MAX_PART_SIZE)
+        # 文件过大时自动放大分片，保证分片数不超过上限
+        part_size = max(part_size, math.ceil(file_size / self.MAX_PARTS))
+        total_parts = max(1, math.ceil(file_size / part_size))
+        
+        object_name = f"models/{user_id}/{uuid.uuid4().hex}{file_extension}"
+        try:
+            minio_upload_id = await run_in_threadpool(self.multipart.create, object_name)
+        except S3Error as e:
+            logger.error(f"MinIO create multipart upload error: {e}")
+            raise HTTPException(status_code=500, detail="创建分片上传失败")
+        
+        upload_id = uuid.uuid4().hex
+        session = {
+            'upload_id': upload_id,
+            'minio_upload_id': minio_upload_id,
+            'object_name': object_name,
+            'file_name': file_name,
+            'file_size': file_size,
+            'part_size': part_size,
+            'total_parts': total_parts,
+            'user_id': user_id,
+            'created_at': time.time()
+        }
+        await self._save(upload_id, 'meta', session)
+        
+        logger.info(f"Model multipart upload initiated for user {user_id}: {object_name}, parts={total_parts}")
+        return {
+            'upload_id': upload_id,
+            'part_size': part_size,
+            'total_parts': total_parts,
+            'expires_in': self.SESSION_TTL
+        }
+    
+    async def upload_part(self, upload_id: str, part_number: int, chunks: AsyncIterator[bytes], user_id: int,
+                          content_md5: Optional[str] = None) -> Dict[str, Any]:
+        """上传单个分片，重复上传同一分片会覆盖之前的内容
+        
+        先校验会话再读取请求体，请求体分块读取并边读边计算MD5，超出该分片应有大小时立即中止。
+        
+        Args:
+            upload_id: 会话ID
+            part_number: 分片序号（从1开始）
+            chunks: 分片内容的异步分块迭代器（如 request.stream()）
+            user_id: 用户ID
+            content_md5: 客户端提供的Content-MD5（base64），用于校验传输完整性
+            
+        Returns:
+            Dict[str, Any]: 分片信息
+        """
+        session = await self._get_session(upload_id, user_id)
+        if part_number < 1 or part_number > session['total_parts']:
+            raise HTTPException(status_code=400, detail=f"分片序号超出范围: 1-{session['total_parts']}")
+        
+        expected_size = self._expected_part_size(session, part_number)
+        buffer = bytearray()
+        md5 = hashlib.md5()
+        async for chunk in chunks:
+            if len(buffer) + len(chunk) > expected_size:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"分片 {part_number} 大小错误，超过期望的 {expected_size} 字节"
+                )
+            buffer += chunk
+            md5.update(chunk)
+        if len(buffer) != expected_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"分片 {part_number} 大小错误，期望 {expected_size} 字节，实际 {len(buffer)} 字节"
+            )
+        data = bytes(buffer)
+        
+        if content_md5 and base64.b64encode(md5.digest()).decode() != content_md5:
+            raise HTTPException(status_code=400, detail=f"分片 {part_number} 校验失败，请重新上传")
+        
+        try:
+            etag = await run_in_threadpool(
+                self.multipart.upload_part,
+                session['object_name'], session['minio_upload_id'], part_number,
+                data, base64.b64encode(md5.digest()).decode()
+            )
+        except S3Error as e:
+            logger.error(f"MinIO upload part error: {e}")
+            raise HTTPException(status_code=500, detail=f"分片 {part_number} 上传失败")
+        
+        part = {'etag': etag, 'size': len(data), 'md5': md5.hexdigest()}
+        await self._save(upload_id, f"part:{part_number}", part)
+        
+        return {'part_number': part_number, **part}
+    
+    async def get_status(self, upload_id: str, user_id: int) -> Dict[str, Any]:
+        """获取会话进度，客户端据此只补传缺失的分片"""
+        session = await self._get_session(upload_id, user_id)
+        uploaded = sorted(session['parts'])
+        uploaded_bytes = sum(part['size'] for part in session['parts'].values())
+        return {
+            'upload_id': upload_id,
+            'file_name': session['file_name'],
+            'file_size': session['file_size'],
+            'part_size': session['part_size'],
+            'total_parts': session['total_parts'],
+            'uploaded_parts': uploaded,
+            'missing_parts': [n for n in range(1, session['total_parts'] + 1) if n not in session['parts']],
+            'uploaded_bytes': uploaded_bytes
+        }
+    
+    async def complete(self, upload_id: str, user_id: int) -> Dict[str, Any]:
+        """校验全部分片后合并为最终对象
+        
+        Returns:
+            Dict[str, Any]: 与单次上传接口一致的文件信息
+        """
+        session = await self._get_session(upload_id, user_id)
+        missing = [n for n in range(1, session['total_parts'] + 1) if n not in session['parts']]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"仍有 {len(missing)} 个分片未上传: {missing[:20]}")
+        
+        try:
+            minio_parts = await run_in_threadpool(
+                self.multipart.list_parts, session['object_name'], session['minio_upload_id']
+            )
+        except S3Error as e:
+            logger.error(f"MinIO list parts error: {e}")
+            raise HTTPException(status_code=500, detail="分片核对失败")
+        
+        mismatched = [
+            n for n, part in session['parts'].items()
+            if minio_parts.get(n) != part['etag'].strip('"')
+        ]
+        if mismatched:
+            raise HTTPException(status_code=409, detail=f"分片与服务端记录不一致，请重传: {sorted(mismatched)[:20]}")
+        
+        etags = [(n, session['parts'][n]['etag']) for n in range(1, session['total_parts'] + 1)]
+        try:
+            await run_in_threadpool(
+                self.multipart.complete, session['object_name'], session['minio_upload_id'], etags
+            )
+        except S3Error as e:
+            logger.error(f"MinIO complete multipart upload error: {e}")
+            raise HTTPException(status_code=500, detail="分片合并失败")
+        
+        await self.redis_client.delete(self._session_key(upload_id))
+        
+        logger.info(f"Model multipart upload completed for user {user_id}: {session['object_name']}")
+        return {
+            "file_path": session['object_name'],
+            "file_url": f"/api/v1/files/{session['object_name']}",
+            "file_size": session['file_size'],
+            "file_name": session['file_name']
+        }
+    
+    async def abort(self, upload_id: str, user_id: int):
+        """取消续传会话，并释放MinIO中已上传的分片"""
+        session = await self._get_session(upload_id, user_id)
+        try:
+            await run_in_threadpool(self.multipart.abort, session['object_name'], session['minio_upload_id'])
+        except S3Error as e:
+            logger.warning(f"MinIO abort multipart upload error: {e}")
+        await self.redis_client.delete(self._session_key(upload_id))
+
+
 # 依赖注入函数
 def get_file_upload_service(minio_client = Depends(get_minio)) -> FileUploadService:
     """获取文件上传服务实例"""
-    return FileUploadService(minio_client)
\ No newline at end of file
+    return FileUploadService(minio_client)
+
+
+def get_multipart_upload_service(
+    minio_client = Depends(get_minio),
+    redis_client = Depends(get_async_redis)
+) -> ModelMultipartUploadService:
+    """获取模型分片续传服务实例"""
+    return ModelMultipartUploadService(minio_client, redis_client)
\ No newline at end of file
@@ -1,7 +1,8 @@
 from minio import Minio
+from minio.datatypes import Part
 from datetime import timedelta
 import io
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 class MinioClient:
     """简化的MinIO客户端，避免依赖冲突"""
@@ -29,4 +30,56 @@ class MinioClient:
             return self.client.presigned_get_object(bucket_name, object_name, expiry)
         except Exception as e:
             print(f"获取预签名URL失败: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+class MultipartUploadClient:
+    """MinIO分片上传接口的适配层
+
+    minio-py 未公开分片上传的单步接口，这里集中封装其私有方法
+    (_create_multipart_upload/_upload_part/_list_parts/_complete_multipart_upload/
+    _abort_multipart_upload)，其他代码不得直接调用。requirements.txt 中固定了 minio 版本，
+    升级时只需核对本类。所有方法均为同步阻塞调用，异步代码中需放到线程池执行。
+    """
+
+    def __init__(self, client: Minio, bucket_name: str):
+        self.client = client
+        self.bucket_name = bucket_name
+
+    def create(self, object_name: str, content_type: str = "application/octet-stream") -> str:
+        """创建分片上传，返回 upload_id"""
+        return self.client._create_multipart_upload(
+            self.bucket_name, object_name, {"Content-Type": content_type}
+        )
+
+    def upload_part(self, object_name: str, upload_id: str, part_number: int,
+                    data: bytes, content_md5: str) -> str:
+        """上传单个分片，返回 etag"""
+        return self.client._upload_part(
+            self.bucket_name, object_name, data, {"Content-MD5": content_md5},
+            upload_id, part_number
+        )
+
+    def list_parts(self, object_name: str, upload_id: str) -> Dict[int, str]:
+        """列出服务端已接收的分片: 分片序号 -> etag（去除引号）"""
+        parts = {}
+        marker = None
+        while True:
+            result = self.client._list_parts(
+                self.bucket_name, object_name, upload_id,
+                max_parts=1000, part_number_marker=marker
+            )
+            for part in result.parts:
+                parts[part.part_number] = part.etag.strip('"')
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete(self, object_name: str, upload_id: str, etags: List[Tuple[int, str]]):
+        """按 (分片序号, etag) 合并分片"""
+        parts = [Part(part_number, etag) for part_number, etag in etags]
+        self.client._complete_multipart_upload(self.bucket_name, object_name, upload_id, parts)
+
+    def abort(self, object_name: str, upload_id: str):
+        """取消分片上传并释放已上传的分片"""
+        self.client._abort_multipart_upload(self.bucket_name, object_name, upload_id)
@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 流式下载的分块大小
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class PackageIntegrityError(Exception):
+    """算法包校验失败"""
+    pass
+
+
+class AlgorithmPackageCache:
+    """Worker本地算法包缓存（按zip内容的sha256寻址）
+
+    目录结构:
+        <cache_dir>/objects/<sha256>/   解压后的算法包
+        <cache_dir>/tmp/                下载与解压的暂存目录（与objects同一文件系统，保证rename原子性）
+        <cache_dir>/manifest.json       清单: 算法(code@version) -> sha256，以及各对象的大小和最近使用时间
+
+    相同内容的算法包只下载和解压一次；超过磁盘预算时按最近最少使用淘汰。
+    """
+
+    def __init__(self, cache_dir: Path, minio_client, bucket_name: str,
+                 max_bytes: int = 10 * 1024 * 1024 * 1024, max_concurrent_downloads: int = 4):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.tmp_dir = self.cache_dir / "tmp"
+        self.manifest_path = self.cache_dir / "manifest.json"
+        self.minio_client = minio_client
+        self.bucket_name = bucket_name
+        self.max_bytes = max_bytes
+        self.max_concurrent_downloads = max_concurrent_downloads
+
+        self._lock = threading.Lock()
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        # 清理上次异常退出残留的暂存文件
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """加载清单，并剔除磁盘上已不存在的对象"""
+        manifest = {'objects': {}, 'refs': {}}
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest.update(json.load(f))
+            except Exception as e:
+                logger.warning(f"算法包缓存清单损坏，将重新构建: {e}")
+
+        manifest['objects'] = {
+            digest: entry for digest, entry in manifest['objects'].items()
+            if (self.objects_dir / digest).is_dir()
+        }
+        manifest['refs'] = {
+            ref: entry for ref, entry in manifest['refs'].items()
+            if entry.get('sha256') in manifest['objects']
+        }
+        return manifest
+
+    def _save_manifest(self):
+        """原子写入清单"""
+        tmp_path = self.tmp_dir / f"manifest.{uuid.uuid4().hex}.json"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _ref_key(code: str, version: str) -> str:
+        return f"{code}@{version}"
+
+    def get_package_path(self, code: str, version: str) -> Optional[Path]:
+        """获取已缓存算法包的解压目录，并刷新其最近使用时间"""
+        with self._lock:
+            ref = self.manifest['refs'].get(self._ref_key(code, version))
+            if not ref:
+                return None
+            entry = self.manifest['objects'].get(ref['sha256'])
+            if not entry:
+                return None
+            entry['last_used'] = time.time()
+            return self.objects_dir / ref['sha256']
+
+    def _resolve_object_name(self, file_path: str) -> str:
+        """将算法记录中的file_path转换为MinIO对象名"""
+        if file_path.startswith("/api/v1/files/"):
+            return file_path[len("/api/v1/files/"):]
+        bucket_prefix = f"/{self.bucket_name}/"
+        if file_path.startswith(bucket_prefix):
+            return file_path[len(bucket_prefix):]
+        return file_path.lstrip('/')
+
+    def _is_up_to_date(self, ref_key: str, file_path: str, expected_hash: Optional[str]) -> bool:
+        """判断本地引用是否已是最新内容"""
+        with self._lock:
+            ref = self.manifest['refs'].get(ref_key)
+        if not ref:
+            return False
+        if expected_hash:
+            return ref['sha256'] == expected_hash.lower()
+        # 服务端未记录哈希时，使用对象ETag判断是否变化
+        if ref.get('file_path') != file_path:
+            return False
+        try:
+            stat = self.minio_client.stat_object(self.bucket_name, self._resolve_object_name(file_path))
+            return stat.etag == ref.get('etag')
+        except Exception as e:
+            logger.warning(f"获取算法包对象信息失败 {file_path}: {e}")
+            # 无法确认时保留现有缓存
+            return True
+
+    def ensure_package(self, code: str, version: str, file_path: str,
+                       expected_hash: Optional[str] = None) -> Path:
+        """确保算法包已缓存（阻塞调用，应在线程池中执行）
+
+        Args:
+            code: 算法编码
+            version: 算法版本
+            file_path: 算法包在MinIO中的路径
+            expected_hash: 服务端记录的sha256，存在时用于完整性校验
+
+        Returns:
+            解压后的算法包目录
+        """
+        ref_key = self._ref_key(code, version)
+        if self._is_up_to_date(ref_key, file_path, expected_hash):
+            return self.get_package_path(code, version)
+
+        # 内容已存在（其他算法引用了相同的包）时无需重复下载
+        if expected_hash and (self.objects_dir / expected_hash.lower()).is_dir():
+            digest, size, etag = expected_hash.lower(), None, None
+        else:
+            digest, size, etag = self._download_and_unpack(file_path, expected_hash)
+
+        with self._lock:
+            entry = self.manifest['objects'].setdefault(digest, {
+                'size': size or self._dir_size(self.objects_dir / digest),
+                'created_at': time.time()
+            })
+            entry['last_used'] = time.time()
+            self.manifest['refs'][ref_key] = {
+                'sha256': digest,
+                'file_path': file_path,
+                'etag': etag,
+                'updated_at': time.time()
+            }
+            self._save_manifest()
+
+        logger.info(f"算法包已缓存: {ref_key} -> {digest[:12]}")
+        return self.objects_dir / digest
+
+    def _download_and_unpack(self, file_path: str, expected_hash: Optional[str]):
+        """从MinIO流式下载算法包，边下载边计算sha256，校验后原子解压"""
+        object_name = self._resolve_object_name(file_path)
+        staging_id = uuid.uuid4().hex
+        zip_path = self.tmp_dir / f"{staging_id}.zip"
+        unpack_dir = self.tmp_dir / staging_id
+
+        sha256 = hashlib.sha256()
+        response = self.minio_client.get_object(self.bucket_name, object_name)
+        try:
+            etag = response.headers.get('ETag', '').strip('"') or None
+            with open(zip_path, 'wb') as f:
+                for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                    sha256.update(chunk)
+                    f.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+
+        try:
+            digest = sha256.hexdigest()
+            if expected_hash and digest != expected_hash.lower():
+                raise PackageIntegrityError(
+                    f"算法包完整性校验失败: {object_name}, 期望 {expected_hash}, 实际 {digest}"
+                )
+
+            target_dir = self.objects_dir / digest
+            if target_dir.is_dir():
+                return digest, None, etag
+
+            with zipfile.ZipFile(zip_path, 'r') as zip_file:
+                self._safe_extract(zip_file, unpack_dir)
+
+            size = self._dir_size(unpack_dir)
+            try:
+                # 同一文件系统内rename是原子的，其他进程不会看到解压到一半的目录
+                os.rename(unpack_dir, target_dir)
+            except OSError:
+                # 并发下载相同内容时，其他进程已完成解压
+                if not target_dir.is_dir():
+                    raise
+            return digest, size, etag
+        finally:
+            zip_path.unlink(missing_ok=True)
+            shutil.rmtree(unpack_dir, ignore_errors=True)
+
+    @staticmethod
+    def _safe_extract(zip_file: zipfile.ZipFile, target_dir: Path):
+        """解压zip，拒绝指向目标目录之外的条目"""
+        target_root = target_dir.resolve()
+        for member in zip_file.infolist():
+            member_path = (target_dir / member.filename).resolve()
+            if member_path != target_root and target_root not in member_path.parents:
+                raise PackageIntegrityError(f"算法包包含非法路径: {member.filename}")
+        zip_file.extractall(target_dir)
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+    def evict(self, pinned: Optional[set] = None) -> List[str]:
+        """按最近最少使用淘汰对象，直到总大小不超过磁盘预算
+
+        Args:
+            pinned: 当前仍在使用、不应被淘汰的sha256集合
+
+        Returns:
+            被淘汰的sha256列表
+        """
+        pinned = pinned or set()
+        evicted = []
+        with self._lock:
+            objects = self.manifest['objects']
+            total = sum(entry.get('size', 0) for entry in objects.values())
+            if total <= self.max_bytes:
+                return evicted
+
+            candidates = sorted(
+                (digest for digest in objects if digest not in pinned),
+                key=lambda digest: objects[digest].get('last_used', 0)
+            )
+            for digest in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= objects.pop(digest).get('size', 0)
+                evicted.append(digest)
+                self.manifest['refs'] = {
+                    ref_key: ref for ref_key, ref in self.manifest['refs'].items()
+                    if ref['sha256'] != digest
+                }
+            self._save_manifest()
+
+        # 先移动到暂存目录再删除，避免留下部分删除的对象目录
+        for digest in evicted:
+            trash_dir = self.tmp_dir / f"evict.{digest}.{uuid.uuid4().hex}"
+            try:
+                os.rename(self.objects_dir / digest, trash_dir)
+                shutil.rmtree(trash_dir, ignore_errors=True)
+            except OSError as e:
+                logger.warning(f"删除缓存对象失败 {digest}: {e}")
+
+        if evicted:
+            logger.info(f"算法包缓存淘汰 {len(evicted)} 个对象")
+        return evicted
+
+    async def sync(self, algorithms: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """根据算法列表同步本地缓存，只下载缺失或已变化的算法包
+
+        Args:
+            algorithms: /api/v1/ai/worker/algorithms/ 返回的算法列表
+
+        Returns:
+            同步统计信息
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+        stats = {'total': 0, 'downloaded': 0, 'cached': 0, 'failed': 0}
+
+        async def _sync_one(algorithm: Dict[str, Any]):
+            code, version = algorithm['code'], algorithm['version']
+            file_path = algorithm['file_path']
+            expected_hash = algorithm.get('file_hash')
+            async with semaphore:
+                try:
+                    cached = await loop.run_in_executor(
+                        None, self._is_up_to_date, self._ref_key(code, version), file_path, expected_hash
+                    )
+                    if cached:
+                        stats['cached'] += 1
+                        return
+                    await loop.run_in_executor(None, self.ensure_package, code, version, file_path, expected_hash)
+                    stats['downloaded'] += 1
+                except Exception as e:
+                    stats['failed'] += 1
+                    logger.error(f"同步算法包失败 {code}@{version}: {e}")
+
+        targets = [a for a in algorithms if a.get('file_path')]
+        stats['total'] = len(targets)
+        await asyncio.gather(*[_sync_one(a) for a in targets])
+
+        # 当前算法列表引用的对象不参与淘汰
+        with self._lock:
+            pinned = {
+                self.manifest['refs'][self._ref_key(a['code'], a['version'])]['sha256']
+                for a in targets if self._ref_key(a['code'], a['version']) in self.manifest['refs']
+            }
+        stats['evicted'] = len(await loop.run_in_executor(None, self.evict, pinned))
+
+        logger.info(f"算法包同步完成: {stats}")
+        return stats
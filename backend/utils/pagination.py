@@ -0,0 +1,121 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import desc, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+# 游标模式下计数的上限，超过时只返回上限值（total_is_exact=False）
+DEFAULT_COUNT_CAP = 10000
+
+
+@dataclass
+class PageResult:
+    """分页查询结果"""
+    items: List[Any]
+    total: int
+    total_is_exact: bool
+    has_more: bool
+    next_cursor: Optional[str] = None
+
+    def total_pages(self, page_size: int) -> int:
+        return (self.total + page_size - 1) // page_size
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """将 (created_at, id) 编码为不透明的游标字符串"""
+    payload = json.dumps({"t": created_at.isoformat(), "id": item_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标字符串，格式非法时返回400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    model,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    use_cursor: bool = False,
+    count_cap: int = DEFAULT_COUNT_CAP,
+    options: Sequence[Any] = ()
+) -> PageResult:
+    """按 (created_at, id) 倒序分页
+
+    - 页码模式（默认）: OFFSET分页，返回精确总数，兼容原有接口
+    - 游标模式（传入cursor或use_cursor=True）: 按上一页最后一条记录的 (created_at, id)
+      定位下一页，深分页耗时与页码无关；总数最多统计到 count_cap 条
+
+    两种模式都会返回 next_cursor，客户端可以从任意一页切换到游标模式。
+
+    Args:
+        db: 数据库会话
+        query: 已附加筛选条件的 select(model) 查询（不含排序和分页）
+        model: 具有 created_at 和 id 列的模型
+        page: 页码（仅页码模式使用）
+        page_size: 每页数量
+        cursor: 上一页返回的 next_cursor
+        use_cursor: 首页启用游标模式
+        count_cap: 游标模式下计数上限
+        options: 仅作用于列表查询的加载选项（如selectinload）
+
+    Returns:
+        PageResult
+    """
+    cursor_mode = use_cursor or bool(cursor)
+
+    # 计数
+    count_source = query.order_by(None)
+    if cursor_mode:
+        count_source = count_source.limit(count_cap + 1)
+    count_result = await db.execute(select(func.count()).select_from(count_source.subquery()))
+    total = count_result.scalar() or 0
+    total_is_exact = True
+    if cursor_mode and total > count_cap:
+        total, total_is_exact = count_cap, False
+
+    # 列表（多取一条用于判断是否还有下一页）
+    list_query = query.order_by(desc(model.created_at), desc(model.id))
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        # 行值比较可直接命中 (created_at, id) 复合索引做范围扫描
+        list_query = list_query.where(
+            tuple_(model.created_at, model.id) < tuple_(cursor_time, cursor_id)
+        )
+    elif not cursor_mode:
+        list_query = list_query.offset((page - 1) * page_size)
+    if options:
+        list_query = list_query.options(*options)
+
+    result = await db.execute(list_query.limit(page_size + 1))
+    items = list(result.scalars().all())
+    has_more = len(items) > page_size
+    items = items[:page_size]
+
+    next_cursor = None
+    if has_more and items and items[-1].created_at is not None:
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+
+    return PageResult(
+        items=items,
+        total=total,
+        total_is_exact=total_is_exact,
+        has_more=has_more,
+        next_cursor=next_cursor
+    )
@@ -0,0 +1,193 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    """分区表配置"""
+    table: str
+    column: str
+    interval: str  # "month" 或 "day"
+    ahead: int     # 提前创建的分区数量
+
+
+# 按时间范围分区的表（分区边界统一使用UTC）
+PARTITIONED_TABLES: Dict[str, PartitionSpec] = {
+    'diagnosis_results': PartitionSpec('diagnosis_results', 'created_at', 'month', 3),
+    'system_logs': PartitionSpec('system_logs', 'created_at', 'month', 3),
+    'system_metrics': PartitionSpec('system_metrics', 'timestamp', 'day', 7),
+}
+
+_PARTITION_NAME_RE = re.compile(r"_p(\d{8})$")
+
+
+def period_start(value: datetime, interval: str) -> datetime:
+    """计算时间所在分区的起始时间"""
+    value = value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if interval == 'month':
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    """计算下一个分区的起始时间"""
+    if interval == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def partition_name(spec: PartitionSpec, start: datetime) -> str:
+    return f"{spec.table}_p{start.strftime('%Y%m%d')}"
+
+
+def default_partition_name(spec: PartitionSpec) -> str:
+    return f"{spec.table}_default"
+
+
+def _bound(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S+00')
+
+
+async def is_partitioned(db: AsyncSession, table: str) -> bool:
+    """判断表是否已转换为分区表（迁移未执行时返回False）"""
+    result = await db.execute(
+        text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+             "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"),
+        {'table': table}
+    )
+    return result.first() is not None
+
+
+async def list_partitions(db: AsyncSession, spec: PartitionSpec) -> List[Tuple[str, datetime, datetime]]:
+    """列出按命名规则创建的分区: [(分区名, 起始时间, 结束时间)]，按起始时间排序"""
+    result = await db.execute(
+        text("SELECT c.relname FROM pg_inherits i "
+             "JOIN pg_class c ON c.oid = i.inhrelid "
+             "JOIN pg_class p ON p.oid = i.inhparent "
+             "WHERE p.relname = :table AND p.relnamespace = 'public'::regnamespace"),
+        {'table': spec.table}
+    )
+    partitions = []
+    for (name,) in result.all():
+        match = _PARTITION_NAME_RE.search(name)
+        if not match:
+            continue
+        start = datetime.strptime(match.group(1), '%Y%m%d').replace(tzinfo=timezone.utc)
+        partitions.append((name, start, next_period(start, spec.interval)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+async def _create_partition(db: AsyncSession, spec: PartitionSpec, start: datetime, end: datetime):
+    """创建单个分区
+
+    默认分区中已有落在该范围内的数据时（例如时钟偏差或分区未及时创建），
+    先建独立表并搬迁这些行，再挂载为分区，避免ATTACH因默认分区约束冲突失败。
+    """
+    name = partition_name(spec, start)
+    default_name = default_partition_name(spec)
+    params = {'start': _bound(start), 'end': _bound(end)}
+
+    result = await db.execute(
+        text(f'SELECT 1 FROM "{default_name}" WHERE "{spec.column}" >= CAST(:start AS timestamptz) '
+             f'AND "{spec.column}" < CAST(:end AS timestamptz) LIMIT 1'),
+        params
+    )
+    if result.first() is None:
+        await db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{spec.table}" '
+            f"FOR VALUES FROM ('{params['start']}') TO ('{params['end']}')"
+        ))
+        return
+
+    logger.warning(f"默认分区 {default_name} 中存在 {name} 范围内的数据，搬迁后挂载分区")
+    await db.execute(text(f'CREATE TABLE "{name}" (LIKE "{spec.table}" INCLUDING DEFAULTS)'))
+    await db.execute(text(
+        f'WITH moved AS (DELETE FROM "{default_name}" WHERE "{spec.column}" >= CAST(:start AS timestamptz) '
+        f'AND "{spec.column}" < CAST(:end AS timestamptz) RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    ), params)
+    await db.execute(text(
+        f'ALTER TABLE "{spec.table}" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{params['start']}') TO ('{params['end']}')"
+    ))
+
+
+async def ensure_partitions(db: AsyncSession, spec: PartitionSpec, now: Optional[datetime] = None) -> List[str]:
+    """确保当前及未来 spec.ahead 个周期的分区和默认分区存在（不提交事务）
+
+    Returns:
+        新创建的分区名列表
+    """
+    if not await is_partitioned(db, spec.table):
+        return []
+
+    await db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{default_partition_name(spec)}" PARTITION OF "{spec.table}" DEFAULT'
+    ))
+
+    existing = {name for name, _, _ in await list_partitions(db, spec)}
+    created = []
+    start = period_start(now or datetime.now(timezone.utc), spec.interval)
+    for _ in range(spec.ahead + 1):
+        end = next_period(start, spec.interval)
+        name = partition_name(spec, start)
+        if name not in existing:
+            await _create_partition(db, spec, start, end)
+            created.append(name)
+        start = end
+
+    if created:
+        logger.info(f"{spec.table} 新建分区: {', '.join(created)}")
+    return created
+
+
+async def ensure_all_partitions(db: AsyncSession) -> Dict[str, List[str]]:
+    """为所有分区表创建未来分区（不提交事务）"""
+    return {table: await ensure_partitions(db, spec) for table, spec in PARTITIONED_TABLES.items()}
+
+
+async def drop_partitions_before(db: AsyncSession, table: str, cutoff: datetime) -> Dict[str, int]:
+    """按保留期限清理数据（不提交事务）
+
+    - 分区表: 结束时间不晚于cutoff的分区整体DETACH + DROP；默认分区中的过期行逐行删除
+    - 未分区的表（迁移未执行）: 退化为按时间列DELETE
+
+    跨越cutoff的分区会保留到整个分区过期，因此实际保留时间最多多出一个分区周期。
+
+    Returns:
+        {'dropped_partitions': 删除的分区数, 'deleted_rows': 逐行删除的行数}
+    """
+    spec = PARTITIONED_TABLES[table]
+    cutoff = cutoff.astimezone(timezone.utc) if cutoff.tzinfo else cutoff.replace(tzinfo=timezone.utc)
+    stats = {'dropped_partitions': 0, 'deleted_rows': 0}
+
+    if not await is_partitioned(db, table):
+        result = await db.execute(
+            text(f'DELETE FROM "{table}" WHERE "{spec.column}" < CAST(:cutoff AS timestamptz)'),
+            {'cutoff': _bound(cutoff)}
+        )
+        stats['deleted_rows'] = result.rowcount
+        return stats
+
+    for name, _, end in await list_partitions(db, spec):
+        if end > cutoff:
+            break
+        await db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+        await db.execute(text(f'DROP TABLE "{name}"'))
+        stats['dropped_partitions'] += 1
+        logger.info(f"已删除过期分区 {name}")
+
+    result = await db.execute(
+        text(f'DELETE FROM "{default_partition_name(spec)}" WHERE "{spec.column}" < CAST(:cutoff AS timestamptz)'),
+        {'cutoff': _bound(cutoff)}
+    )
+    stats['deleted_rows'] = result.rowcount
+    return stats
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 算法输出中存放检测目标列表的常见字段
+DETECTION_KEYS = ('detections', 'objects', 'targets', 'faces', 'results')
+
+
+def _parse_points(roi: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """解析单个ROI的顶点，支持多边形 points/polygon/coordinates 和矩形 x/y/width/height"""
+    points = roi.get('points') or roi.get('polygon') or roi.get('coordinates')
+    if points:
+        return [
+            (float(point['x']), float(point['y'])) if isinstance(point, dict) else (float(point[0]), float(point[1]))
+            for point in points
+        ]
+    if all(key in roi for key in ('x', 'y', 'width', 'height')):
+        x, y, w, h = (float(roi[key]) for key in ('x', 'y', 'width', 'height'))
+        return [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+    return []
+
+
+def roi_signature(roi_areas: Optional[Sequence[Dict[str, Any]]]) -> str:
+    """ROI配置的内容签名，配置变化后缓存自然失效"""
+    payload = json.dumps(roi_areas or [], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+@dataclass
+class CompiledRoi:
+    """按具体分辨率预编译的ROI
+
+    bbox 为所有多边形并集的外接矩形；labels 是 bbox 大小的标签图（0表示多边形外，
+    i 表示第 i 个ROI），用于判断检测目标落在哪个区域。没有配置ROI时 full_frame 为True，
+    所有操作直接透传原图。
+    """
+    width: int
+    height: int
+    bbox: Tuple[int, int, int, int]
+    labels: Optional[np.ndarray]
+    names: List[Optional[str]]
+
+    @property
+    def full_frame(self) -> bool:
+        return self.labels is None
+
+    @property
+    def pixel_ratio(self) -> float:
+        """裁剪后参与推理的像素占整帧的比例"""
+        x0, y0, x1, y1 = self.bbox
+        return (x1 - x0) * (y1 - y0) / float(self.width * self.height)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """裁剪到ROI外接矩形（numpy切片视图，不复制像素）"""
+        if self.full_frame:
+            return frame
+        x0, y0, x1, y1 = self.bbox
+        return frame[y0:y1, x0:x1]
+
+    def masked(self, frame: np.ndarray, fill: int = 0) -> np.ndarray:
+        """裁剪并把多边形外的像素填充为 fill（会复制，用于对遮挡敏感的算法）"""
+        view = self.crop(frame)
+        if self.full_frame:
+            return view
+        result = view.copy()
+        result[self.labels == 0] = fill
+        return result
+
+    def region_at(self, x: float, y: float) -> int:
+        """整帧坐标点所在的ROI序号（从1开始），不在任何ROI内返回0"""
+        if self.full_frame:
+            return 1
+        x0, y0, x1, y1 = self.bbox
+        col, row = int(x) - x0, int(y) - y0
+        if 0 <= row < y1 - y0 and 0 <= col < x1 - x0:
+            return int(self.labels[row, col])
+        return 0
+
+    def to_frame(self, detection: Dict[str, Any]) -> Dict[str, Any]:
+        """把裁剪图坐标的检测结果映射回整帧坐标（原地修改并返回）
+
+        bbox 按 [x, y, width, height]，box/xyxy 按 [x1, y1, x2, y2]，
+        points/landmarks 按点列表处理。
+        """
+        if self.full_frame:
+            return detection
+        dx, dy = self.bbox[0], self.bbox[1]
+        bbox = detection.get('bbox')
+        if bbox and len(bbox) >= 2:
+            detection['bbox'] = [bbox[0] + dx, bbox[1] + dy, *bbox[2:]]
+        for key in ('box', 'xyxy'):
+            box = detection.get(key)
+            if box and len(box) >= 4:
+                detection[key] = [box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy, *box[4:]]
+        for key in ('points', 'landmarks'):
+            points = detection.get(key)
+            if points:
+                detection[key] = [[point[0] + dx, point[1] + dy, *point[2:]] for point in points]
+        return detection
+
+    @staticmethod
+    def _center(detection: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        bbox = detection.get('bbox')
+        if bbox and len(bbox) >= 4:
+            return bbox[0] + bbox[2] / 2.0, bbox[1] + bbox[3] / 2.0
+        box = detection.get('box') or detection.get('xyxy')
+        if box and len(box) >= 4:
+            return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+        return None
+
+    def map_detections(self, detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """映射回整帧坐标，丢弃中心点落在多边形外的目标并标注所在ROI名称"""
+        if self.full_frame:
+            return detections
+        kept = []
+        for detection in detections:
+            self.to_frame(detection)
+            center = self._center(detection)
+            region = self.region_at(*center) if center else 1
+            if not region:
+                continue
+            name = self.names[region - 1] if region <= len(self.names) else None
+            if name and 'roi_name' not in detection:
+                detection['roi_name'] = name
+            kept.append(detection)
+        return kept
+
+    def map_result(self, result: Any) -> Any:
+        """对算法原始输出中的检测列表（DETECTION_KEYS 或顶层列表）做 map_detections"""
+        if self.full_frame:
+            return result
+        if isinstance(result, list):
+            return self.map_detections([item for item in result if isinstance(item, dict)])
+        if isinstance(result, dict):
+            for key in DETECTION_KEYS:
+                if isinstance(result.get(key), list):
+                    result[key] = self.map_detections([item for item in result[key] if isinstance(item, dict)])
+        return result
+
+
+def compile_roi(roi_areas: Optional[Sequence[Dict[str, Any]]], width: int, height: int) -> CompiledRoi:
+    """将ROI配置编译为指定分辨率下的外接矩形和标签图
+
+    顶点坐标全部不超过1时按归一化坐标处理；无有效ROI时返回整帧透传。
+    """
+    polygons = []
+    names = []
+    for roi in roi_areas or []:
+        if not isinstance(roi, dict) or roi.get('enabled') is False:
+            continue
+        try:
+            points = _parse_points(roi)
+        except (KeyError, TypeError, ValueError, IndexError):
+            logger.warning(f"忽略无效的ROI配置: {roi}")
+            continue
+        if len(points) < 3:
+            continue
+        array = np.array(points, dtype=np.float64)
+        if array.max() <= 1.0:
+            array *= (width, height)
+        polygons.append(array)
+        names.append(roi.get('name'))
+
+    full = CompiledRoi(width, height, (0, 0, width, height), None, [])
+    if not polygons:
+        return full
+
+    stacked = np.vstack(polygons)
+    x0 = int(max(0, np.floor(stacked[:, 0].min())))
+    y0 = int(max(0, np.floor(stacked[:, 1].min())))
+    x1 = int(min(width, np.ceil(stacked[:, 0].max())))
+    y1 = int(min(height, np.ceil(stacked[:, 1].max())))
+    if x1 <= x0 or y1 <= y0:
+        return full
+
+    labels = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    # 后面的ROI覆盖前面的重叠部分，最多支持255个区域
+    for index, polygon in enumerate(polygons[:255], start=1):
+        shifted = np.round(polygon - (x0, y0)).astype(np.int32)
+        cv2.fillPoly(labels, [shifted], index)
+    return CompiledRoi(width, height, (x0, y0, x1, y1), labels, names[:255])
+
+
+class RoiEngine:
+    """ROI编译缓存
+
+    按 (作用域键, ROI签名, 宽, 高) 缓存编译结果，同一摄像头同一分辨率只编译一次；
+    作用域键通常为摄像头ID，ROI配置或分辨率变化时签名/键不同，旧条目按LRU淘汰。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, CompiledRoi]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'pixels_total': 0, 'pixels_processed': 0}
+
+    def get(self, scope: Hashable, roi_areas: Optional[Sequence[Dict[str, Any]]],
+            width: int, height: int) -> CompiledRoi:
+        key = (scope, roi_signature(roi_areas), width, height)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return compiled
+        compiled = compile_roi(roi_areas, width, height)
+        with self._lock:
+            self.stats['misses'] += 1
+            self._cache[key] = compiled
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def for_frame(self, scope: Hashable, roi_areas: Optional[Sequence[Dict[str, Any]]],
+                  frame: np.ndarray) -> CompiledRoi:
+        """按帧的实际分辨率取编译结果，并累计推理像素统计"""
+        height, width = frame.shape[:2]
+        compiled = self.get(scope, roi_areas, width, height)
+        x0, y0, x1, y1 = compiled.bbox
+        self.stats['pixels_total'] += width * height
+        self.stats['pixels_processed'] += (x1 - x0) * (y1 - y0)
+        return compiled
+
+    def invalidate(self, scope: Hashable):
+        """清除某个作用域（摄像头）的全部编译结果"""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == scope]:
+                del self._cache[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats['pixels_total']
+        return {
+            **self.stats,
+            'entries': len(self._cache),
+            'pixel_ratio': round(self.stats['pixels_processed'] / total, 4) if total else None
+        }
+
+
+# 全局ROI引擎实例
+roi_engine = RoiEngine()
@@ -0,0 +1,227 @@
+import asyncio
+import base64
+import bisect
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+USER_AGENT = "EasySight-Probe/1.0"
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+
+@dataclass
+class RtspProbeResult:
+    """RTSP探测结果"""
+    reachable: bool                      # TCP连接是否成功
+    status_code: Optional[int] = None    # 最后一个RTSP请求的状态码
+    connect_ms: Optional[float] = None
+    options_ms: Optional[float] = None
+    describe_ms: Optional[float] = None
+    auth_required: bool = False          # 服务器要求认证但未提供/认证失败
+    error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        """流媒体服务正常应答（需要认证也说明编码器在工作）"""
+        if self.error is not None:
+            return False
+        return self.status_code == 200 or self.auth_required
+
+
+class RtspProtocolError(Exception):
+    """RTSP应答格式错误"""
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+    """读取一个RTSP应答，返回 (状态码, 小写头部)，应答体读取后丢弃"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    if len(head) > MAX_HEADER_BYTES:
+        raise RtspProtocolError("应答头过大")
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("RTSP/"):
+        raise RtspProtocolError(f"无效的状态行: {lines[0][:80]}")
+    status_code = int(parts[1])
+
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_BYTES:
+        raise RtspProtocolError("应答体过大")
+    if length:
+        await reader.readexactly(length)
+    return status_code, headers
+
+
+def _parse_challenge(header: str) -> Tuple[str, Dict[str, str]]:
+    scheme, _, params = header.partition(" ")
+    values = {}
+    for item in params.split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            values[key.strip().lower()] = value.strip().strip('"')
+    return scheme.lower(), values
+
+
+def _authorization(challenge: str, method: str, uri: str, username: str, password: str) -> Optional[str]:
+    """根据 WWW-Authenticate 构造 Authorization 头（支持Basic和MD5 Digest）"""
+    scheme, params = _parse_challenge(challenge)
+    if scheme == "basic":
+        token = base64.b64encode(f"{username}:{password}".encode()).decode()
+        return f"Basic {token}"
+    if scheme == "digest" and params.get("algorithm", "MD5").upper() == "MD5":
+        realm, nonce = params.get("realm", ""), params.get("nonce", "")
+        ha1 = hashlib.md5(f"{username}:{realm}:{password}".encode()).hexdigest()
+        ha2 = hashlib.md5(f"{method}:{uri}".encode()).hexdigest()
+        response = hashlib.md5(f"{ha1}:{nonce}:{ha2}".encode()).hexdigest()
+        return (f'Digest username="{username}", realm="{realm}", nonce="{nonce}", '
+                f'uri="{uri}", response="{response}"')
+    return None
+
+
+async def probe_rtsp(url: str, timeout: float = 3.0, describe: bool = True) -> RtspProbeResult:
+    """轻量RTSP探测: TCP连接后发送 OPTIONS 和 DESCRIBE，只读取应答头，不拉流不解码
+
+    URL中带用户名密码时，遇到401会按服务器挑战（Basic/Digest）重发一次DESCRIBE。
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != "rtsp" or not parsed.hostname:
+        return RtspProbeResult(reachable=False, error="无效的RTSP地址")
+
+    port = parsed.port or 554
+    netloc = parsed.hostname if parsed.port is None else f"{parsed.hostname}:{parsed.port}"
+    # 请求URI不携带认证信息
+    uri = parsed._replace(netloc=netloc).geturl()
+    username = unquote(parsed.username) if parsed.username else None
+    password = unquote(parsed.password) if parsed.password else ""
+
+    result = RtspProbeResult(reachable=False)
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parsed.hostname, port), timeout=timeout)
+    except (asyncio.TimeoutError, OSError) as e:
+        result.error = f"连接失败: {e or type(e).__name__}"
+        return result
+    result.reachable = True
+    result.connect_ms = (time.perf_counter() - start) * 1000
+
+    cseq = 0
+
+    async def request(method: str, extra: str = "") -> Tuple[int, Dict[str, str], float]:
+        nonlocal cseq
+        cseq += 1
+        message = (f"{method} {uri} RTSP/1.0\r\nCSeq: {cseq}\r\n"
+                   f"User-Agent: {USER_AGENT}\r\n{extra}\r\n")
+        sent = time.perf_counter()
+        writer.write(message.encode("latin-1"))
+        await writer.drain()
+        status_code, headers = await asyncio.wait_for(_read_response(reader), timeout=timeout)
+        return status_code, headers, (time.perf_counter() - sent) * 1000
+
+    try:
+        result.status_code, _, result.options_ms = await request("OPTIONS")
+        if describe:
+            # DESCRIBE 超时/中断时不能沿用 OPTIONS 的状态码
+            result.status_code = None
+            accept = "Accept: application/sdp\r\n"
+            status_code, headers, elapsed = await request("DESCRIBE", accept)
+            if status_code == 401 and username and "www-authenticate" in headers:
+                auth = _authorization(headers["www-authenticate"], "DESCRIBE", uri, username, password)
+                if auth:
+                    status_code, headers, elapsed = await request("DESCRIBE", f"{accept}Authorization: {auth}\r\n")
+            result.status_code, result.describe_ms = status_code, elapsed
+        result.auth_required = result.status_code == 401
+    except asyncio.TimeoutError:
+        result.error = "RTSP应答超时"
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError) as e:
+        result.error = f"连接中断: {e or type(e).__name__}"
+    except (RtspProtocolError, ValueError) as e:
+        result.error = f"无效应答: {e}"
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+    return result
+
+
+# 延迟直方图分桶上界(毫秒)，最后一个桶收纳更大的值
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+@dataclass
+class LatencyHistogram:
+    """固定分桶的延迟直方图（每个摄像头每项指标十余个整数）"""
+    counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    total: int = 0
+    sum_ms: float = 0.0
+    max_ms: float = 0.0
+    last_ms: Optional[float] = None
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.total += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+        self.last_ms = value_ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """按分桶上界估算分位数"""
+        if not self.total:
+            return None
+        rank = p / 100 * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 2) if self.total else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": round(self.max_ms, 2),
+            "last_ms": round(self.last_ms, 2) if self.last_ms is not None else None,
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS_MS), "inf"], self.counts)),
+        }
+
+
+@dataclass
+class CameraProbeMetrics:
+    """单个摄像头的探测延迟统计"""
+    connect: LatencyHistogram = field(default_factory=LatencyHistogram)
+    describe: LatencyHistogram = field(default_factory=LatencyHistogram)
+    failures: int = 0
+    last_error: Optional[str] = None
+    last_status_code: Optional[int] = None
+
+    def record(self, result: RtspProbeResult):
+        if result.connect_ms is not None:
+            self.connect.observe(result.connect_ms)
+        latency = result.describe_ms if result.describe_ms is not None else result.options_ms
+        if latency is not None:
+            self.describe.observe(latency)
+        self.last_status_code = result.status_code
+        self.last_error = result.error
+        if not result.healthy:
+            self.failures += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "connect": self.connect.to_dict(),
+            "describe": self.describe.to_dict(),
+            "failures": self.failures,
+            "last_status_code": self.last_status_code,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# 不统计的特殊文件系统
+IGNORED_FSTYPES = {'', 'tmpfs', 'devtmpfs', 'squashfs'}
+
+
+@dataclass
+class SystemSample:
+    """一次系统资源采样"""
+    timestamp: float
+    cpu_percent: float
+    memory_percent: float
+    memory_total: int
+    memory_used: int
+    memory_available: int
+    disk_percent: float                 # 根目录使用率
+    network_sent_rate: float            # KB/s
+    network_recv_rate: float            # KB/s
+    network_bytes_sent: int             # 累计字节
+    network_bytes_recv: int
+    process_count: int
+    disks: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class SystemSampler:
+    """后台系统资源采样线程
+
+    单个守护线程每 interval 秒采样一次CPU、内存、磁盘和网络速率，写入环形缓冲区。
+    CPU使用 cpu_percent(interval=None) 计算两次采样之间的平均值，不会阻塞；
+    磁盘分区遍历开销较大，按 disk_interval 降频刷新。
+    接口通过 latest() 以O(1)读取最新快照，指标收集器通过 window() 读取一段时间内的采样做降采样。
+    """
+
+    def __init__(self, interval: float = 1.0, history_size: int = 600, disk_interval: float = 30.0):
+        self.interval = interval
+        self.disk_interval = disk_interval
+        self._samples: Deque[SystemSample] = deque(maxlen=history_size)
+        self._latest: Optional[SystemSample] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._last_net = None
+        self._last_net_time = None
+        self._disks: List[Dict[str, Any]] = []
+        self._root_disk_percent = 0.0
+        self._last_disk_time = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动采样线程（重复调用无副作用）"""
+        with self._lock:
+            if self.is_running:
+                return
+            self._stop_event.clear()
+            # 初始化CPU计数基线并同步采一次，启动后立即有快照可读
+            psutil.cpu_percent(interval=None)
+            self._sample_once()
+            self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+            self._thread.start()
+        logger.info(f"系统资源采样线程已启动 - 间隔: {self.interval}s, 缓冲: {self._samples.maxlen} 条")
+
+    def stop(self):
+        """停止采样线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+        logger.info("系统资源采样线程已停止")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._sample_once()
+            except Exception as e:
+                logger.error(f"系统资源采样失败: {e}")
+
+    def _refresh_disks(self, now: float):
+        disks = []
+        for partition in psutil.disk_partitions():
+            if partition.fstype in IGNORED_FSTYPES:
+                continue
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except (PermissionError, OSError):
+                continue
+            disks.append({
+                "device": partition.device,
+                "mountpoint": partition.mountpoint,
+                "fstype": partition.fstype,
+                "total": usage.total,
+                "used": usage.used,
+                "free": usage.free,
+                "percent": usage.percent
+            })
+        self._disks = disks
+        self._root_disk_percent = psutil.disk_usage('/').percent
+        self._last_disk_time = now
+
+    def _sample_once(self):
+        now = time.time()
+        if now - self._last_disk_time >= self.disk_interval:
+            self._refresh_disks(now)
+
+        memory = psutil.virtual_memory()
+        net = psutil.net_io_counters()
+
+        sent_rate = recv_rate = 0.0
+        if self._last_net is not None and now > self._last_net_time:
+            elapsed = now - self._last_net_time
+            sent_rate = max(0, net.bytes_sent - self._last_net.bytes_sent) / elapsed / 1024
+            recv_rate = max(0, net.bytes_recv - self._last_net.bytes_recv) / elapsed / 1024
+        self._last_net, self._last_net_time = net, now
+
+        sample = SystemSample(
+            timestamp=now,
+            cpu_percent=psutil.cpu_percent(interval=None),
+            memory_percent=memory.percent,
+            memory_total=memory.total,
+            memory_used=memory.used,
+            memory_available=memory.available,
+            disk_percent=self._root_disk_percent,
+            network_sent_rate=sent_rate,
+            network_recv_rate=recv_rate,
+            network_bytes_sent=net.bytes_sent,
+            network_bytes_recv=net.bytes_recv,
+            process_count=len(psutil.pids()),
+            disks=self._disks
+        )
+        # deque.append 与属性赋值都是原子操作，读取方无需加锁
+        self._samples.append(sample)
+        self._latest = sample
+
+    def latest(self) -> SystemSample:
+        """最新采样（采样线程未启动时先启动）"""
+        if self._latest is None or not self.is_running:
+            self.start()
+        return self._latest
+
+    def window(self, seconds: float) -> List[SystemSample]:
+        """最近 seconds 秒内的采样（按时间顺序）"""
+        cutoff = time.time() - seconds
+        return [sample for sample in list(self._samples) if sample.timestamp >= cutoff]
+
+
+# 全局采样器实例
+system_sampler = SystemSampler()
@@ -0,0 +1,300 @@
+"""事件任务租约
+
+所有状态迁移都是单条带条件的 UPDATE ... RETURNING，候选行通过
+SELECT ... FOR UPDATE SKIP LOCKED 选出，多个Worker/管理器副本并发执行时
+同一行只会被其中一个拿到，其余的直接跳过而不是等待锁。
+
+- 领取(claim): PENDING -> RUNNING，写入租约到期时间并把 fencing_token 加一
+- 续约(renew)/完成(finish): 必须携带领取时得到的 fencing_token，令牌不匹配
+  （租约已被回收并重新领取）时更新0行，旧执行者的结果被丢弃；不回传令牌的旧版
+  Worker按 assigned_worker 匹配，租约被回收后同样更新0行
+- 回收(reclaim): 租约过期的 RUNNING 任务按重试配置回到 PENDING 或置为 FAILED，
+  同时递增令牌使原执行者失效
+- 重置(reset_for_requeue): 死信重新投递前把 FAILED 任务改回 PENDING 并清零重试次数，
+  否则投递的消息会因任务不可领取而被丢弃
+
+失败重试的 next_retry_at 按与 TaskQueueManager.retry_delay 相同的指数退避计算，
+队列消费方由延迟队列按时投递；拉取式Worker按 next_retry_at 判断是否可领取。
+"""
+
+import logging
+from datetime import timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Row, and_, case, func, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.event_task import EventTask, EventTaskStatus
+
+logger = logging.getLogger(__name__)
+
+# 默认租约时长(秒)，执行方需在到期前续约
+DEFAULT_LEASE_SECONDS = 120
+# 升级前遗留的无租约RUNNING任务，按心跳/启动时间加该宽限期判定过期
+LEGACY_LEASE_GRACE = timedelta(seconds=1800)
+
+
+def _status(value: EventTaskStatus):
+    return literal(value, EventTask.status.type)
+
+
+def _retry_delay():
+    """第 retry_count+1 次重试的延迟: min(最长延迟, 基数*2^retry_count) 秒"""
+    seconds = func.least(
+        settings.TASK_RETRY_MAX_DELAY,
+        settings.TASK_RETRY_BASE_DELAY * func.power(2, EventTask.retry_count)
+    )
+    return func.make_interval(0, 0, 0, 0, 0, 0, seconds)
+
+
+def _can_retry():
+    return and_(EventTask.auto_recovery == True, EventTask.retry_count < EventTask.max_retry_count)
+
+
+def _claimable():
+    return and_(EventTask.is_active == True, EventTask.status == EventTaskStatus.PENDING)
+
+
+def _claim_values(worker_id: str, lease_seconds: int) -> dict:
+    return dict(
+        status=EventTaskStatus.RUNNING,
+        assigned_worker=worker_id,
+        worker_heartbeat=func.now(),
+        lease_expires_at=func.now() + timedelta(seconds=lease_seconds),
+        fencing_token=EventTask.fencing_token + 1,
+        started_at=func.now(),
+        next_retry_at=None,
+    )
+
+
+async def claim_tasks(db: AsyncSession, worker_id: str, limit: int = 1,
+                      lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[EventTask]:
+    """领取最多 limit 个待执行任务（未分配或预分配给该Worker）"""
+    candidates = (
+        select(EventTask.id)
+        .where(
+            _claimable(),
+            or_(EventTask.next_retry_at.is_(None), EventTask.next_retry_at <= func.now()),
+            or_(EventTask.assigned_worker.is_(None), EventTask.assigned_worker == worker_id)
+        )
+        .order_by(EventTask.next_retry_at.nulls_first(), EventTask.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(EventTask)
+        .where(EventTask.id.in_(candidates.scalar_subquery()))
+        .values(**_claim_values(worker_id, lease_seconds))
+        .returning(EventTask)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return list(result.scalars().all())
+
+
+async def claim_task(db: AsyncSession, task_id: int, worker_id: str,
+                     lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[EventTask]:
+    """领取指定任务（队列消息投递时使用），已被其他执行者领取或不可执行时返回None
+
+    延迟队列按时投递即代表重试已到期，因此不再检查 next_retry_at。
+    """
+    candidate = (
+        select(EventTask.id)
+        .where(EventTask.id == task_id, _claimable(),
+               or_(EventTask.assigned_worker.is_(None), EventTask.assigned_worker == worker_id))
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(EventTask)
+        .where(EventTask.id.in_(candidate.scalar_subquery()))
+        .values(**_claim_values(worker_id, lease_seconds))
+        .returning(EventTask)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return result.scalars().first()
+
+
+def _fenced(task_id: int, fencing_token: int):
+    return and_(
+        EventTask.id == task_id,
+        EventTask.status == EventTaskStatus.RUNNING,
+        EventTask.fencing_token == fencing_token
+    )
+
+
+def _held_by(task_id: int, worker_id: str):
+    """旧版Worker不回传令牌，按当前持有者判断（回收时会清空 assigned_worker）"""
+    return and_(
+        EventTask.id == task_id,
+        EventTask.status == EventTaskStatus.RUNNING,
+        EventTask.assigned_worker == worker_id
+    )
+
+
+async def renew_lease(db: AsyncSession, task_id: int, fencing_token: int,
+                      lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """续约，返回False表示租约已失效（应立即停止执行）"""
+    return await _renew(db, _fenced(task_id, fencing_token), lease_seconds)
+
+
+async def renew_worker_lease(db: AsyncSession, task_id: int, worker_id: str,
+                             lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """不带令牌的续约（旧版Worker心跳），任务不再由该Worker持有时返回False"""
+    return await _renew(db, _held_by(task_id, worker_id), lease_seconds)
+
+
+async def _renew(db: AsyncSession, condition, lease_seconds: int) -> bool:
+    result = await db.execute(
+        update(EventTask)
+        .where(condition)
+        .values(
+            worker_heartbeat=func.now(),
+            lease_expires_at=func.now() + timedelta(seconds=lease_seconds)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def finish_task(db: AsyncSession, task_id: int, fencing_token: int, success: bool,
+                      error: Optional[str] = None, **values) -> Optional[Row]:
+    """结束一次执行并释放租约，返回 (id, status, retry_count)，令牌已过期、结果未写入时返回None
+
+    成功置为 STOPPED；失败时按 auto_recovery/max_retry_count 回到 PENDING 并设置
+    next_retry_at，重试次数用尽则置为 FAILED。values 为需要一并写入的其他字段。
+    """
+    return await _finish(db, _fenced(task_id, fencing_token), success, error, **values)
+
+
+async def finish_worker_task(db: AsyncSession, task_id: int, worker_id: str, success: bool,
+                             error: Optional[str] = None, **values) -> Optional[Row]:
+    """不带令牌的结束（旧版Worker完成回调），任务不再由该Worker持有时返回None"""
+    return await _finish(db, _held_by(task_id, worker_id), success, error, **values)
+
+
+async def _finish(db: AsyncSession, condition, success: bool, error: Optional[str], **values) -> Optional[Row]:
+    if success:
+        values.update(status=EventTaskStatus.STOPPED, stopped_at=func.now(), retry_count=0)
+    else:
+        values.update(
+            status=case((_can_retry(), _status(EventTaskStatus.PENDING)), else_=_status(EventTaskStatus.FAILED)),
+            next_retry_at=case((_can_retry(), func.now() + _retry_delay()), else_=None),
+            stopped_at=case((_can_retry(), None), else_=func.now()),
+            retry_count=EventTask.retry_count + 1,
+            error_count=func.coalesce(EventTask.error_count, 0) + 1,
+            last_error=error,
+        )
+    result = await db.execute(
+        update(EventTask)
+        .where(condition)
+        .values(assigned_worker=None, lease_expires_at=None, **values)
+        .returning(EventTask.id, EventTask.status, EventTask.retry_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first()
+
+
+async def reclaim_expired(db: AsyncSession, batch_size: int = 500) -> Sequence:
+    """回收一批租约已过期的RUNNING任务，返回 (id, status, retry_count) 行
+
+    调用方循环调用直到返回不足 batch_size 行，每批单独提交以缩短锁持有时间。
+    """
+    expires_at = func.coalesce(
+        EventTask.lease_expires_at,
+        EventTask.worker_heartbeat + LEGACY_LEASE_GRACE,
+        EventTask.started_at + LEGACY_LEASE_GRACE
+    )
+    candidates = (
+        select(EventTask.id)
+        .where(EventTask.status == EventTaskStatus.RUNNING, expires_at < func.now())
+        .order_by(EventTask.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(EventTask)
+        .where(EventTask.id.in_(candidates.scalar_subquery()))
+        .values(
+            status=case((_can_retry(), _status(EventTaskStatus.PENDING)), else_=_status(EventTaskStatus.FAILED)),
+            next_retry_at=case((_can_retry(), func.now() + _retry_delay()), else_=None),
+            stopped_at=case((_can_retry(), None), else_=func.now()),
+            retry_count=EventTask.retry_count + 1,
+            error_count=func.coalesce(EventTask.error_count, 0) + 1,
+            last_error="执行租约过期",
+            assigned_worker=None,
+            lease_expires_at=None,
+            # 使原执行者持有的令牌失效
+            fencing_token=EventTask.fencing_token + 1,
+        )
+        .returning(EventTask.id, EventTask.status, EventTask.retry_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+
+async def reset_for_requeue(db: AsyncSession, task_id: int) -> bool:
+    """将重试次数用尽的FAILED任务重置为PENDING（重试次数清零），用于死信重新投递
+
+    next_retry_at 设为当前时间: 投递成功后由领取清除；投递失败时由补发遗漏重试的
+    巡检重新投递。任务不存在、已停用或不是FAILED状态时返回False，调用方不应投递。
+    """
+    result = await db.execute(
+        update(EventTask)
+        .where(EventTask.id == task_id, EventTask.is_active == True,
+               EventTask.status == EventTaskStatus.FAILED)
+        .values(
+            status=EventTaskStatus.PENDING,
+            retry_count=0,
+            next_retry_at=func.now(),
+            stopped_at=None,
+            assigned_worker=None,
+            lease_expires_at=None,
+        )
+        .returning(EventTask.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def take_due_retries(db: AsyncSession, batch_size: int = 500, overdue_seconds: int = 0) -> Sequence:
+    """取出一批重试时间已过 overdue_seconds 的PENDING任务并清除其 next_retry_at，返回 (id, retry_count) 行
+
+    正常情况下重试由延迟队列按时投递，这里只用于补发延迟消息发布失败等遗漏的任务。
+    清除后任务仍为PENDING，可被队列消费者或拉取式Worker直接领取；
+    调用方重新投递失败时应调用 defer_retries 恢复重试时间。
+    """
+    candidates = (
+        select(EventTask.id)
+        .where(
+            EventTask.is_active == True,
+            EventTask.status == EventTaskStatus.PENDING,
+            EventTask.next_retry_at <= func.now() - timedelta(seconds=overdue_seconds)
+        )
+        .order_by(EventTask.next_retry_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(EventTask)
+        .where(EventTask.id.in_(candidates.scalar_subquery()))
+        .values(next_retry_at=None)
+        .returning(EventTask.id, EventTask.retry_count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.all()
+
+
+async def defer_retries(db: AsyncSession, task_ids: List[int], delay_seconds: int = 30):
+    """重新投递失败的任务延后再试（只处理仍为PENDING且未被领取的任务）"""
+    if not task_ids:
+        return
+    await db.execute(
+        update(EventTask)
+        .where(
+            EventTask.id.in_(task_ids),
+            EventTask.status == EventTaskStatus.PENDING,
+            EventTask.next_retry_at.is_(None)
+        )
+        .values(next_retry_at=func.now() + timedelta(seconds=delay_seconds))
+        .execution_options(synchronize_session=False)
+    )
@@ -35,6 +35,16 @@ class WorkerConfig(BaseSettings):
     task_poll_interval: int = 5   # 秒
     task_batch_size: int = 1      # 每次拉取的任务数量
     
+    # 批量推理配置（算法包声明process_batch时生效）
+    batch_max_size: int = 8       # 单批最大帧数
+    batch_max_wait_ms: int = 20   # 凑批最大等待时间(毫秒)
+    
+    # 算法包本地缓存配置
+    algorithm_cache_dir: str = "algorithms_cache/.store"
+    algorithm_cache_max_mb: int = 10240     # 磁盘预算(MB)，超出后按LRU淘汰
+    algorithm_sync_interval: int = 60       # 算法包同步间隔(秒)
+    algorithm_sync_concurrency: int = 4     # 并发下载数
+    
     # 日志配置
     log_level: str = "INFO"
     log_file: Optional[str] = None
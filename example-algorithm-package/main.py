@@ -143,6 +143,50 @@ class FaceDetectionAlgorithm:
         except Exception as e:
             logger.error(f"图像处理失败: {e}")
             raise
+    
+    def process_batch(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        批量处理图像（可选的EasySight批量推理接口）
+        
+        Haar级联分类器不支持真正的批量推理，这里逐张处理以演示接口约定；
+        基于ONNX Runtime或OpenCV DNN的模型可在此处将整批图像合并为一个输入张量。
+        
+        Args:
+            images: 已解码的图像列表
+            
+        Returns:
+            与输入顺序一致的处理结果列表
+        """
+        start_time = time.time()
+        
+        results = [{'faces': self.detect_faces(image)} for image in images]
+        
+        processing_time = (time.time() - start_time) * 1000
+        for result in results:
+            result['processing_time'] = processing_time / max(len(images), 1)
+        
+        logger.info(f"批量处理 {len(images)} 张图像，处理时间: {processing_time:.2f}ms")
+        return results
+
+
+_batch_instances: Dict[str, FaceDetectionAlgorithm] = {}
+
+
+def process_batch(images: List[np.ndarray], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    批量推理入口（EasySight插件接口，在algorithm.json的batch字段中声明）
+    
+    Args:
+        images: 已解码的图像列表
+        config: 算法配置
+        
+    Returns:
+        与输入顺序一致的处理结果列表
+    """
+    key = json.dumps(config, sort_keys=True)
+    if key not in _batch_instances:
+        _batch_instances[key] = FaceDetectionAlgorithm(config)
+    return _batch_instances[key].process_batch(images)
 
 
 def create_algorithm(config: Dict[str, Any]) -> FaceDetectionAlgorithm: